@@ -0,0 +1,557 @@
+"""Time the core operations of Wax on a synthetic catalog.
+
+    python3 -m common.benchmark --works 20000 --output bench.json
+
+generates a catalog with the requested number of works in a temporary
+directory (or in --dir, which gets reused if it already holds a catalog of
+that size and seed; a --dir that holds a catalog not made by the benchmark
+gets refused rather than overwritten), times each operation --repeat times, and prints the
+results as JSON (or writes them to --output). The catalog is in the format
+that Wax uses:
+
+    recordings/metadata/config    the config pickle (genre spec, random
+                                  config)
+    recordings/metadata/long      the LONG shelf of RecordingTuples
+    recordings/metadata/short/*   a SHORT file of pickles for each genre
+    recordings/sound/<uuid>       an empty directory for each recording (so
+                                  that queue files find it playable)
+
+Recordings have one to three discs and works with one to twelve tracks.
+Classical works have track groups (movements) and nonce metadata (a
+soloist) some of the time. Names come from pools sized relative to the
+number of works so that name groups repeat the way composers and
+performers do in a real catalog. The same --seed always generates the same
+catalog.
+
+The operations are those of Select mode and Edit mode that do not need
+GTK. Where the code lives in a widget (which cannot be constructed without
+a display), the benchmark does what the widget does with the same files:
+
+    short_load_sort         ShortStore.load and the sort of
+                            RecordingModel.load_sorted_data for the largest
+                            genre
+    filter_column_data      RecordingModel.get_column_data for the first
+                            column and the filtering of its visible_func
+    incremental_search      SearchIncremental.yield_matches (reads LONG)
+    index_build             SearchIndex.build
+    index_search            SearchIndex.search
+    discid_lookup           RipCD.check_for_discid for the last disc
+    random_pick             a pick of the Random page
+    save_work, delete_work  EditNotebook writing (then deleting) the SHORT
+                            and LONG metadata of one work (each run of one
+                            gets undone or prepared by the other outside
+                            the timing, so every run starts from the
+                            catalog as generated)
+    queue_file_load         QueueFiles reading a queue file of QUEUE_SETS
+                            sets and the current metadata of each set
+
+Each result gives the fastest, median, and slowest of the runs in ms. The
+output also records the parameters, the size of the catalog, the Python
+version, and the git commit (when there is one) so that runs on different
+commits can be compared."""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import shelve
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import unicodedata
+from itertools import groupby
+from pathlib import Path
+
+from .constants import CONFIG, LONG, SHORT, SOUND, COMPLETERS, QUEUEFILES
+from .types import RecordingTuple, WorkTuple, TrackTuple
+
+BENCHMARK_VERSION = 1
+
+# genre: (share of works, primary keys, secondary keys)
+GENRES = {
+    'Classical': (0.6, ['composer', 'work', 'performer'],
+            ['conductor', 'orchestra']),
+    'Jazz': (0.25, ['artist', 'album'], ['label']),
+    'Rock': (0.15, ['artist', 'album'], ['label']),
+}
+
+N_MATCHES_MAX = 299  # as in SearchIncremental
+QUEUE_SETS = 50
+CATALOG_STAMP = 'benchmark.json'
+
+SYLLABLES = ['ba', 'ber', 'chi', 'da', 'del', 'ein', 'fa', 'gor', 'ha',
+        'ins', 'jo', 'ka', 'lem', 'ma', 'mo', 'ne', 'no', 'pa', 'ri',
+        'ro', 'sa', 'sch', 'ta', 'ti', 'va', 'vel', 'wa', 'ze']
+
+# -Catalog---------------------------------------------------------------------
+class NamePool:
+    def __init__(self, rng: random.Random, size: int, n_words: int):
+        self.rng = rng
+        self.names = [self.make_name(n_words) for _ in range(max(size, 1))]
+
+    def make_name(self, n_words: int) -> str:
+        return ' '.join(''.join(self.rng.choices(SYLLABLES,
+                k=self.rng.randint(2, 4))).capitalize()
+                for _ in range(n_words))
+
+    # Names get drawn with a skew, so a few of them appear in many works.
+    def draw(self) -> str:
+        i = int(len(self.names) * self.rng.random() ** 2)
+        return self.names[i]
+
+def short_name(name: str) -> str:
+    return name.split()[-1]
+
+class CatalogGenerator:
+    def __init__(self, n_works: int, seed: int):
+        self.n_works = n_works
+        self.rng = rng = random.Random(seed)
+        self.people = NamePool(rng, n_works // 10, 2)
+        self.composers = NamePool(rng, n_works // 40, 2)
+        self.titles = NamePool(rng, n_works // 2, 3)
+        self.groups = NamePool(rng, n_works // 50, 2)
+        self.uuid_base = 1_600_000_000_000_000_000
+
+    def disc_id(self) -> str:
+        chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+        return ''.join(self.rng.choices(chars, k=27)) + '-'
+
+    def names(self, genre: str, key: str) -> tuple[str, ...]:
+        match key:
+            case 'composer':
+                return (self.composers.draw(),)
+            case 'work' | 'album':
+                return (self.titles.draw(),)
+            case 'orchestra' | 'label':
+                return (self.groups.draw(),)
+            case _:
+                n = self.rng.choice([1, 1, 1, 2, 3])
+                return tuple(dict.fromkeys(self.people.draw()
+                        for _ in range(n)))
+
+    # Return the recording and the SHORT row of each of its works.
+    def make_recording(self, index: int, genre: str, n_works: int):
+        share, primary, secondary = GENRES[genre]
+        rng = self.rng
+        uuid = str(self.uuid_base + index * 1_000_000_007)
+        n_discs = rng.choices([1, 2, 3], [85, 12, 3])[0]
+
+        tracks, works, shorts = [], {}, []
+        disc_num = track_num = 0
+        for work_num in range(n_works):
+            n_tracks = rng.randint(1, 12)
+            track_ids = []
+            for _ in range(n_tracks):
+                if track_num >= 20 and disc_num < n_discs - 1:
+                    disc_num, track_num = disc_num + 1, 0
+                tracks.append(TrackTuple(disc_num, track_num,
+                        self.titles.make_name(2),
+                        rng.uniform(60.0, 900.0)))
+                track_ids.append((disc_num, track_num))
+                track_num += 1
+
+            metadata = [self.names(genre, key)
+                    for key in primary + secondary]
+            short = tuple(tuple(short_name(n) if key == 'composer' else n
+                    for n in name_group)
+                    for key, name_group in zip(primary, metadata))
+
+            nonce, trackgroups = [], []
+            if genre == 'Classical':
+                if rng.random() < 0.3:
+                    nonce.append(('soloist', (self.people.draw(),)))
+                if n_tracks > 2 and rng.random() < 0.5:
+                    trackgroups.append((self.titles.make_name(2),
+                            track_ids[:3], []))
+
+            props = [('times played', (str(rng.randint(0, 20)),)),
+                    ('date played', ('',))]
+            works[work_num] = WorkTuple(genre, metadata, nonce, props,
+                    track_ids, trackgroups)
+            shorts.append((short, uuid, work_num))
+
+        props = [('source', ('CD',)), ('codec', ('flac',)),
+                ('sample rate', ('44100',)), ('resolution', ('16',)),
+                ('date created', ('2020 Jan 01',))]
+        discids = [self.disc_id() for _ in range(n_discs)]
+        return RecordingTuple(works, tracks, props, discids, uuid), shorts
+
+    def generate(self):
+        for path in (SHORT, SOUND, COMPLETERS, QUEUEFILES):
+            path.mkdir(parents=True, exist_ok=True)
+
+        genre_spec = {genre: {'primary': primary, 'secondary': secondary}
+                for genre, (share, primary, secondary) in GENRES.items()}
+        with open(CONFIG, 'wb') as config_fo:
+            pickle.dump({'genre spec': genre_spec,
+                    'random config': {genre: [1, True] for genre in GENRES},
+                    'filter config': {genre: [] for genre in GENRES}},
+                    config_fo)
+
+        genres = list(GENRES)
+        shares = [share for share, primary, secondary in GENRES.values()]
+        short_fos = {genre: open(Path(SHORT, genre), 'wb')
+                for genre in genres}
+        n_works = index = 0
+        with shelve.open(LONG, 'n') as recording_shelf:
+            while n_works < self.n_works:
+                genre = self.rng.choices(genres, shares)[0]
+                n = self.rng.randint(1, 4) if genre == 'Classical' else 1
+                n = min(n, self.n_works - n_works)
+                recording, shorts = self.make_recording(index, genre, n)
+                recording_shelf[recording.uuid] = recording
+                for short_row in shorts:
+                    pickle.dump(short_row, short_fos[genre])
+                Path(SOUND, recording.uuid).mkdir(exist_ok=True)
+                n_works += n
+                index += 1
+        for short_fo in short_fos.values():
+            short_fo.close()
+        return index
+
+# -Operations------------------------------------------------------------------
+# As RecordingModel.sort_key.
+def sort_key(row, column_indexes):
+    def get_sort_t(name_groups, column_index):
+        val = name_groups[column_index][0]
+        val_split = val.split()
+        val_str = [unicodedata.normalize('NFKD', v.lower())
+                for v in val_split if not v.isdigit()]
+        val_num = [int(v) for v in val_split if v.isdigit()]
+        return (val_str, val_num)
+    return [get_sort_t(row[0], i) for i in column_indexes]
+
+# As RecordingModel.get_column_data.
+def get_column_data(rows, index):
+    def make_key(val):
+        val_split = val.split()
+        val_str = [unicodedata.normalize('NFKD', v.lower())
+                for v in val_split if not v.isdigit()]
+        val_num = [int(v) for v in val_split if v.isdigit()]
+        return (val_str, val_num)
+    short_values = (v for row in rows for v in row[0][index])
+    return [k for k, g in groupby(sorted(short_values, key=make_key))]
+
+class Benchmarks:
+    def __init__(self, seed: int):
+        # These modules read the config (or the files of the catalog) when
+        # they are imported, so they get imported only once the catalog
+        # exists.
+        from .config import config
+        from .searchindex import SearchIndex, match_work, splitter
+        from .searchindex import work_values
+        from .shortstore import ShortStore
+        self.config = config
+        self.SearchIndex = SearchIndex
+        self.ShortStore = ShortStore
+        self.match_work, self.splitter = match_work, splitter
+        self.work_values = work_values
+
+        self.rng = random.Random(seed)
+        self.genre = max(GENRES, key=lambda g: Path(SHORT, g).stat().st_size)
+        rows = list(ShortStore.load(self.genre))
+        self.sample_row = rows[len(rows) // 2]
+        self.search_text = self.sample_row[0][0][0][:5]
+
+        with shelve.open(LONG, 'r') as recording_shelf:
+            self.last_recording = recording_shelf[
+                    max(recording_shelf.keys())]
+
+    def short_load_sort(self):
+        primary = self.config.genre_spec[self.genre]['primary']
+        column_indexes = list(range(len(primary)))
+        rows = list(self.ShortStore.load(self.genre))
+        rows.sort(key=lambda row: sort_key(row, column_indexes))
+        return rows
+
+    def filter_column_data(self):
+        rows = list(self.ShortStore.load(self.genre))
+        column_data = get_column_data(rows, 0)
+        label = self.sample_row[0][0][0]
+        visible = [row for row in rows if label in row[0][0]]
+        return column_data, visible
+
+    def incremental_search(self):
+        search_text_values = self.splitter(self.search_text)
+        matches = {}
+        with shelve.open(LONG, 'r') as recording_shelf:
+            for uuid, recording in recording_shelf.items():
+                for work_num, work in recording.works.items():
+                    values, track_values = self.work_values(recording, work)
+                    track_ids = self.match_work(values, track_values,
+                            search_text_values)
+                    if track_ids is None:
+                        continue
+                    matches[(uuid, work_num)] = (values,
+                            {t_id: track_values[t_id] for t_id in track_ids})
+                    if len(matches) >= N_MATCHES_MAX:
+                        return {}  # too many matches
+        return matches
+
+    def index_build(self):
+        self.search_index = self.SearchIndex.build()
+
+    def index_search(self):
+        if not hasattr(self, 'search_index'):
+            self.index_build()
+        return self.search_index.search(self.search_text)
+
+    def discid_lookup(self):
+        disc_id = self.last_recording.discids[-1]
+        with shelve.open(LONG, 'r') as recording_shelf:
+            for uuid, recording in recording_shelf.items():
+                if disc_id in recording.discids:
+                    return recording
+
+    def random_pick(self):
+        genre = self.rng.choice(list(GENRES))
+        count, tells = 0, [0]
+        with open(Path(SHORT, genre), 'rb') as short_fo:
+            while True:
+                try:
+                    pickle.load(short_fo)
+                except EOFError:
+                    break
+                count += 1
+                tells.append(short_fo.tell())
+            short_fo.seek(tells[self.rng.randrange(count)])
+            short_metadata, uuid, work_num = pickle.load(short_fo)
+        with shelve.open(LONG, 'r') as recording_shelf:
+            recording = recording_shelf[uuid]
+        return recording.works[work_num]
+
+    # As EditNotebook.write_short_metadata (a rewrite of the SHORT file of
+    # the genre) and write_long_metadata.
+    def save_work(self):
+        recording = self.last_recording
+        work_num = max(recording.works) + 1
+        work = recording.works[0]
+        recording.works[work_num] = work
+        n_primary = len(self.config.genre_spec[work.genre]['primary'])
+        short = tuple(work.metadata[:n_primary])
+
+        short_path = Path(SHORT, work.genre)
+        tmp_path = Path(str(short_path) + '.tmp')
+        with open(short_path, 'rb') as short_fo, \
+                open(tmp_path, 'wb') as tmp_fo:
+            new_data_out = (short, recording.uuid, work_num)
+            while True:
+                try:
+                    data_in = pickle.load(short_fo)
+                except EOFError:
+                    break
+                if data_in[1:] == new_data_out[1:]:
+                    pickle.dump(new_data_out, tmp_fo)
+                    new_data_out = ()
+                else:
+                    pickle.dump(data_in, tmp_fo)
+            if new_data_out:
+                pickle.dump(new_data_out, tmp_fo)
+        tmp_path.rename(short_path)
+
+        with shelve.open(LONG, 'w') as recording_shelf:
+            recording_shelf[recording.uuid] = recording
+        self.saved_work = (work.genre, work_num)
+
+    # As EditNotebook.delete_short_metadata_for_work and the write of the
+    # recording without the work to LONG (of the work that save_work added).
+    def delete_work(self):
+        genre, work_num = self.saved_work
+        recording = self.last_recording
+
+        short_path = Path(SHORT, genre)
+        tmp_path = Path(str(short_path) + '.tmp')
+        with open(short_path, 'rb') as short_fo, \
+                open(tmp_path, 'wb') as tmp_fo:
+            while True:
+                try:
+                    data_in = pickle.load(short_fo)
+                except EOFError:
+                    break
+                if data_in[1:] != (recording.uuid, work_num):
+                    pickle.dump(data_in, tmp_fo)
+        tmp_path.rename(short_path)
+
+        del recording.works[work_num]
+        with shelve.open(LONG, 'w') as recording_shelf:
+            recording_shelf[recording.uuid] = recording
+        del self.saved_work
+
+    # Write a queue file (in the format of widgets.select.left.pages.
+    # queuefiles) for queue_file_load.
+    def make_queue_file(self) -> Path:
+        path = Path(QUEUEFILES, 'benchmark')
+        rows = []
+        with shelve.open(LONG, 'r') as recording_shelf:
+            uuids = sorted(recording_shelf.keys())
+            for uuid in self.rng.sample(uuids, min(QUEUE_SETS, len(uuids))):
+                recording = recording_shelf[uuid]
+                work = recording.works[0]
+                tracks = [t for t in recording.tracks
+                        if t.track_id in work.track_ids]
+                rows.append((uuid, ('',), tracks, {}, work.genre, uuid, 0,
+                        False, recording.props, True, tracks))
+        duration = sum(t.duration for row in rows for t in row[2])
+        with open(path, 'wb') as queue_fo:
+            pickle.dump({'version': 2, 'duration': duration,
+                    'n_sets': len(rows), 'saved': time.time()}, queue_fo)
+            for row in rows:
+                pickle.dump(row, queue_fo)
+        return path
+
+    # As QueueFiles.on_queuefiles_load_button_clicked (read_queue_file,
+    # read_recordings, and get_current for each set) without the play
+    # queue.
+    def queue_file_load(self):
+        if not hasattr(self, 'queue_file'):
+            self.queue_file = self.make_queue_file()
+        header, rows = None, []
+        with open(self.queue_file, 'rb') as queue_fo:
+            while True:
+                try:
+                    data = pickle.load(queue_fo)
+                except EOFError:
+                    break
+                if header is None and isinstance(data, dict):
+                    header = data
+                else:
+                    rows.append(data)
+
+        uuids = {row[5] for row in rows if Path(SOUND, row[5]).exists()}
+        with shelve.open(LONG, 'r') as long_shelf:
+            recordings = {uuid: long_shelf[uuid] for uuid in uuids}
+
+        current = []
+        for row in rows:
+            if (recording := recordings.get(row[5])) is not None:
+                work = recording.works[row[6]]
+                primary = self.config.genre_spec[row[4]]['primary']
+                current.append('\n'.join(name_group[0]
+                        for name_group in work.metadata[:len(primary)]))
+        return current
+
+OPERATIONS = ['short_load_sort', 'filter_column_data', 'incremental_search',
+        'index_build', 'index_search', 'discid_lookup', 'random_pick',
+        'save_work', 'delete_work', 'queue_file_load']
+
+# operation: (setup, teardown), run outside the timing of each run of an
+# operation that changes the catalog to leave it as it was.
+FIXTURES = {
+    'save_work': (None, 'delete_work'),
+    'delete_work': ('save_work', None),
+}
+
+# -Harness---------------------------------------------------------------------
+def time_operation(operation, repeat: int, setup=None,
+        teardown=None) -> dict:
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter_ns()
+        operation()
+        times.append((time.perf_counter_ns() - start) / 1e6)
+        if teardown:
+            teardown()
+    return {'runs': repeat, 'min_ms': round(min(times), 3),
+            'median_ms': round(statistics.median(times), 3),
+            'max_ms': round(max(times), 3)}
+
+def git_commit(path: Path) -> str | None:
+    try:
+        return subprocess.run(['git', '-C', str(path), 'rev-parse', 'HEAD'],
+                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def catalog_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.parent.glob(f'{path.name}*')
+            if p.is_file())
+
+def run(n_works: int, seed: int, repeat: int, operations: list[str],
+        catalog_dir: Path) -> dict:
+    stamp = {'works': n_works, 'seed': seed}
+    stamp_path = Path(catalog_dir, CATALOG_STAMP)
+    os.chdir(catalog_dir)
+
+    # Never delete a catalog that the benchmark did not generate (such as
+    # that of wax itself).
+    if Path('recordings').exists() and not stamp_path.exists():
+        raise ValueError(f'{catalog_dir} holds a catalog not generated by '
+                f'the benchmark')
+
+    start = time.perf_counter()
+    if stamp_path.exists() and json.loads(stamp_path.read_text()) == stamp:
+        with shelve.open(LONG, 'r') as recording_shelf:
+            n_recordings = len(recording_shelf)
+        generate_s = None
+    else:
+        if Path('recordings').exists():
+            shutil.rmtree('recordings')
+        n_recordings = CatalogGenerator(n_works, seed).generate()
+        stamp_path.write_text(json.dumps(stamp))
+        generate_s = round(time.perf_counter() - start, 3)
+
+    benchmarks = Benchmarks(seed)
+    results = {}
+    for name in operations:
+        setup_name, teardown_name = FIXTURES.get(name, (None, None))
+        setup = setup_name and getattr(benchmarks, setup_name)
+        teardown = teardown_name and getattr(benchmarks, teardown_name)
+        results[name] = time_operation(getattr(benchmarks, name), repeat,
+                setup, teardown)
+
+    return {
+        'version': BENCHMARK_VERSION,
+        'commit': git_commit(Path(__file__).parent),
+        'python': sys.version.split()[0],
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': {'works': n_works, 'seed': seed, 'repeat': repeat},
+        'catalog': {'recordings': n_recordings,
+                'largest genre': benchmarks.genre,
+                'long_bytes': catalog_bytes(LONG),
+                'short_bytes': sum(p.stat().st_size
+                        for p in SHORT.iterdir()),
+                'generate_s': generate_s},
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+            description='Time core operations on a synthetic catalog.')
+    parser.add_argument('--works', type=int, default=1000,
+            help='number of works in the catalog (default 1000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5,
+            help='runs of each operation (default 5)')
+    parser.add_argument('--only', action='append', choices=OPERATIONS,
+            help='run only this operation (may be repeated)')
+    parser.add_argument('--dir', type=Path,
+            help='directory for the catalog (kept between runs)')
+    parser.add_argument('--output', type=Path,
+            help='file for the JSON results (default stdout)')
+    args = parser.parse_args()
+
+    output = args.output.resolve() if args.output else None
+    if args.dir:
+        args.dir.mkdir(parents=True, exist_ok=True)
+        try:
+            report = run(args.works, args.seed, args.repeat,
+                    args.only or OPERATIONS, args.dir.resolve())
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        with tempfile.TemporaryDirectory(prefix='wax-benchmark-') as tmp_dir:
+            report = run(args.works, args.seed, args.repeat,
+                    args.only or OPERATIONS, Path(tmp_dir))
+
+    report_json = json.dumps(report, indent=2)
+    if output:
+        output.write_text(report_json + '\n')
+    else:
+        print(report_json)
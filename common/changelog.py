@@ -0,0 +1,100 @@
+"""Record changes to the catalog so that other programs can follow them.
+
+Wax appends an entry to CHANGELOG whenever it saves a recording or deletes
+a work or a recording. Each entry is a line of JSON:
+
+    {"event": "recording-saved", "genre": ..., "uuid": ..., "work_num": ...}
+    {"event": "work-deleted", "genre": ..., "uuid": ..., "work_num": ...}
+    {"event": "recording-deleted", "uuid": ...}
+
+MiniWax watches CHANGELOG (see ChangeReader) to update its display as soon
+as the catalog changes instead of polling the database. Once CHANGELOG
+exceeds MAX_CHANGELOG_BYTES, the next entry starts a new file; a reader
+that notices that the file got shorter reads it from the beginning."""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from .connector import register_connect_request
+from .constants import CONFIG_DIR
+
+CHANGELOG = Path(CONFIG_DIR, 'changes')
+
+MAX_CHANGELOG_BYTES = 256 * 1024
+
+def log_change(event: str, **fields):
+    entry = json.dumps(dict(event=event, time=time.time_ns(), **fields))
+    try:
+        too_big = (CHANGELOG.stat().st_size > MAX_CHANGELOG_BYTES)
+    except FileNotFoundError:
+        too_big = False
+
+    if too_big:
+        tmp_fn = CHANGELOG.with_suffix('.tmp')
+        with open(tmp_fn, 'w') as changelog_fo:
+            changelog_fo.write(entry + '\n')
+        os.replace(tmp_fn, CHANGELOG)
+    else:
+        # Each entry is a single write to a file opened for appending, so
+        # a reader never sees part of one unless the write is still going.
+        with open(CHANGELOG, 'a') as changelog_fo:
+            changelog_fo.write(entry + '\n')
+
+# ChangeLogger writes the entries for the signals from the edit notebook.
+# Wax creates it; MiniWax imports this module only for ChangeReader.
+class ChangeLogger:
+    def __init__(self):
+        register_connect_request('edit-left-notebook', 'recording-saved',
+                self.on_recording_saved)
+        register_connect_request('edit-left-notebook', 'work-deleted',
+                self.on_work_deleted)
+        register_connect_request('edit-left-notebook', 'recording-deleted',
+                self.on_recording_deleted)
+
+    def on_recording_saved(self, editnotebook, genre):
+        log_change('recording-saved', genre=genre,
+                uuid=editnotebook.recording.uuid,
+                work_num=editnotebook.work_num)
+
+    def on_work_deleted(self, editnotebook, genre, uuid, work_num):
+        log_change('work-deleted', genre=genre, uuid=uuid, work_num=work_num)
+
+    def on_recording_deleted(self, editnotebook, uuid):
+        log_change('recording-deleted', uuid=uuid)
+
+# ChangeReader returns the entries added to CHANGELOG since the last call
+# to read (or since the reader was created).
+class ChangeReader:
+    def __init__(self):
+        try:
+            self.offset = CHANGELOG.stat().st_size
+        except FileNotFoundError:
+            self.offset = 0
+
+    def read(self) -> list[dict]:
+        try:
+            changelog_fo = open(CHANGELOG, 'rb')
+        except FileNotFoundError:
+            self.offset = 0
+            return []
+
+        with changelog_fo:
+            size = os.fstat(changelog_fo.fileno()).st_size
+            if size < self.offset:
+                self.offset = 0
+            changelog_fo.seek(self.offset)
+            data = changelog_fo.read()
+
+        # Leave an incomplete last line for the next read.
+        end = data.rfind(b'\n') + 1
+        self.offset += end
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
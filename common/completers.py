@@ -0,0 +1,288 @@
+"""The names that the completers of the work metadata editor know.
+
+Each file in COMPLETERS lists the names for one key (composer, conductor,
+...), one per line; lines starting with # are comments. The files remain
+the record (the user edits them and waxconfig checkpoints them), but
+reading one line by line for every lookup is slow once it holds thousands
+of names. Completer instead looks names up in an index in COMPLETER_INDEX:
+the names sorted by their normalized form in a file that gets mapped into
+memory, so a lookup is a binary search that touches only a few pages:
+
+    MAGIC, the st_mtime_ns of the completer file, and the number of names n
+    n + 1 offsets of the records (the last is the end of the last record)
+    the records, each the normalized name, a tab, and the name (UTF-8)
+
+The index gets rebuilt when the completer file is newer than the index.
+append adds a line to the completer file (instead of rewriting it) and
+keeps the names added since the index was mapped in a short sorted list
+that lookups also search. Each lookup checks the st_mtime_ns of the
+completer file, so a file edited (or checkpointed back) while the index is
+mapped gets indexed again rather than hiding its changes. The names get appended to any completion model
+through append_callbacks.
+
+fuzzy_candidates narrows the names that map_metadata (in the work metadata
+editor) scores with fuzz.token_set_ratio. Scoring every name of a
+completer against every imported name is slow with thousands of composers
+or performers. Instead, a name is scored only against the names that share
+at least half of the character trigrams of the shorter of the two (after
+first_last). A pair that scores over 90 differs by an edit or two or
+shares a whole word, so it also shares most trigrams. The trigram index
+gets built the first time it is needed."""
+
+import bisect
+import mmap
+import os
+import re
+import struct
+from array import array
+from collections import defaultdict
+from collections.abc import Iterator
+from pathlib import Path
+
+from unidecode import unidecode
+
+from .constants import CACHE, COMPLETERS
+
+COMPLETER_INDEX = Path(CACHE, 'completers')
+
+MAGIC = b'WAXC'
+HEADER = struct.Struct('=4sqI')
+
+def normalize(text: str) -> str:
+    return unidecode(text.lower())
+
+# Fuzzy matches consider only the first and last components of names
+# with more than two components (e.g., First Middle Last).
+def first_last(name: str) -> str:
+    name_split = name.split()
+    if len(name_split) > 1:
+        if name_split[0] == 'Sir' and len(name_split) > 2:
+            return f'{name_split[1]} {name_split[-1]}'
+        else:
+            return f'{name_split[0]} {name_split[-1]}'
+    else:
+        return name
+
+# The trigrams of the words of name (as first_last reduces it), each word
+# padded with spaces so that short words have trigrams too.
+def trigrams(name: str) -> set[str]:
+    words = re.sub(r'[^a-z0-9]+', ' ', normalize(first_last(name))).split()
+    return {word[i:i + 3] for word in (f' {w} ' for w in words)
+            for i in range(len(word) - 2)}
+
+def read_names(path: Path) -> list[str]:
+    with open(path, 'rt', encoding='utf-8') as completer_fo:
+        return [line for line in completer_fo.read().splitlines()
+                if line and not line.startswith('#')]
+
+def write_index(index_path: Path, names: list[str], mtime_ns: int):
+    records = sorted(f'{normalize(name)}\t{name}'.encode() for name in names)
+    offsets = array('I', [0])
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(str(index_path) + '.tmp')
+    with open(tmp_path, 'wb') as index_fo:
+        index_fo.write(HEADER.pack(MAGIC, mtime_ns, len(records)))
+        index_fo.write(offsets.tobytes())
+        index_fo.write(b''.join(records))
+    os.replace(tmp_path, index_path)
+
+class Completer:
+    def __init__(self, key: str):
+        self.key = key
+        self.path = Path(COMPLETERS, key)
+        self.index_path = Path(COMPLETER_INDEX, key)
+        self.mm = None
+        self.offsets = None
+        self.n_names = 0
+
+        # The st_mtime_ns of the completer file as of the mapped index and
+        # the appends since.
+        self.mtime_ns = None
+
+        # (normalized name, name) of the names appended since the index
+        # got mapped.
+        self.added: list[tuple[str, str]] = []
+
+        # Functions called with each name appended (to update a model for
+        # completions, for example).
+        self.append_callbacks = []
+
+        # The trigram index for fuzzy_candidates: the names, the number of
+        # trigrams of each, and the names (by index) with each trigram.
+        self.fuzzy_names: list[str] | None = None
+        self.fuzzy_n_trigrams = array('H')
+        self.fuzzy_postings: dict[str, array] = defaultdict(
+                lambda: array('I'))
+
+    def open_index(self):
+        mtime_ns = self.path.stat().st_mtime_ns
+        if self.mm is not None:
+            if mtime_ns == self.mtime_ns:
+                return
+            self.close_index()
+
+        try:
+            with open(self.index_path, 'rb') as index_fo:
+                magic, index_mtime_ns, n = HEADER.unpack(
+                        index_fo.read(HEADER.size))
+        except (OSError, struct.error):
+            magic = None
+        if magic != MAGIC or index_mtime_ns != mtime_ns:
+            write_index(self.index_path, read_names(self.path), mtime_ns)
+
+        with open(self.index_path, 'rb') as index_fo:
+            self.mm = mmap.mmap(index_fo.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        magic, index_mtime_ns, self.n_names = HEADER.unpack_from(self.mm)
+        start = HEADER.size
+        self.records_start = start + 4 * (self.n_names + 1)
+        self.offsets = memoryview(self.mm)[start:self.records_start].cast('I')
+        self.mtime_ns = mtime_ns
+
+    # Unmap the index, forgetting the names appended since it got mapped
+    # (the rebuilt index has them) and the trigram index.
+    def close_index(self):
+        self.offsets.release()
+        self.mm.close()
+        self.mm = self.offsets = self.mtime_ns = None
+        self.n_names = 0
+        self.added.clear()
+        self.fuzzy_names = None
+        self.fuzzy_n_trigrams = array('H')
+        self.fuzzy_postings.clear()
+
+    def record(self, i: int) -> tuple[str, str]:
+        start = self.records_start + self.offsets[i]
+        end = self.records_start + self.offsets[i + 1]
+        normalized, name = self.mm[start:end].decode().split('\t', 1)
+        return normalized, name
+
+    # The index of the first record whose normalized name is not less than
+    # text.
+    def bisect(self, text: str) -> int:
+        lo, hi = 0, self.n_names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.record(mid)[0] < text:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # Yield (normalized name, name) for the names whose normalized form
+    # starts with text (a normalized text) in sorted order.
+    def yield_prefixed(self, text: str) -> Iterator[tuple[str, str]]:
+        self.open_index()
+        i = self.bisect(text)
+        while i < self.n_names:
+            normalized, name = self.record(i)
+            if not normalized.startswith(text):
+                break
+            yield normalized, name
+            i += 1
+
+        i = bisect.bisect_left(self.added, (text,))
+        while i < len(self.added) and self.added[i][0].startswith(text):
+            yield self.added[i]
+            i += 1
+
+    # The names whose normalized form starts with text.
+    def prefix(self, text: str) -> list[str]:
+        return [name for normalized, name
+                in self.yield_prefixed(normalize(text))]
+
+    # The names whose normalized form is the normalized form of text.
+    def lookup(self, text: str) -> list[str]:
+        text = normalize(text)
+        return [name for normalized, name in self.yield_prefixed(text)
+                if normalized == text]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.lookup(name)
+
+    def __iter__(self) -> Iterator[str]:
+        self.open_index()
+        for i in range(self.n_names):
+            yield self.record(i)[1]
+        for normalized, name in self.added:
+            yield name
+
+    def __len__(self) -> int:
+        self.open_index()
+        return self.n_names + len(self.added)
+
+    def append(self, name: str):
+        self.open_index()
+        # A file edited by hand might not end with a newline.
+        with open(self.path, 'rb') as completer_fo:
+            if completer_fo.seek(0, os.SEEK_END) > 0:
+                completer_fo.seek(-1, os.SEEK_END)
+                newline = '' if completer_fo.read(1) == b'\n' else '\n'
+            else:
+                newline = ''
+        with open(self.path, 'a', encoding='utf-8') as completer_fo:
+            completer_fo.write(f'{newline}{name}\n')
+        self.mtime_ns = self.path.stat().st_mtime_ns
+        bisect.insort(self.added, (normalize(name), name))
+        if self.fuzzy_names is not None:
+            self.add_fuzzy_name(name)
+        for callback in self.append_callbacks:
+            callback(name)
+
+    def add_fuzzy_name(self, name: str):
+        name_trigrams = trigrams(name)
+        index = len(self.fuzzy_names)
+        self.fuzzy_names.append(name)
+        self.fuzzy_n_trigrams.append(min(len(name_trigrams), 0xffff))
+        for trigram in name_trigrams:
+            self.fuzzy_postings[trigram].append(index)
+
+    # The names that might score over 90 against name.
+    def fuzzy_candidates(self, name: str) -> list[str]:
+        self.open_index()
+        if self.fuzzy_names is None:
+            self.fuzzy_names = []
+            for match_name in self:
+                self.add_fuzzy_name(match_name)
+
+        name_trigrams = trigrams(name)
+        n_shared = defaultdict(int)
+        for trigram in name_trigrams:
+            for index in self.fuzzy_postings.get(trigram, ()):
+                n_shared[index] += 1
+
+        return [self.fuzzy_names[index]
+                for index, n in n_shared.items()
+                if 2 * n >= min(len(name_trigrams),
+                        self.fuzzy_n_trigrams[index])]
+
+# Completers maps each key with a file in COMPLETERS to its Completer.
+# Completers get created (and their indexes mapped) on first use.
+class Completers:
+    def __init__(self):
+        self.completers: dict[str, Completer] = {}
+
+    def keys(self) -> set[str]:
+        return {p.name for p in COMPLETERS.iterdir()}
+
+    def __contains__(self, key: str) -> bool:
+        return Path(COMPLETERS, key).is_file()
+
+    def __getitem__(self, key: str) -> Completer:
+        if (completer := self.completers.get(key)) is None:
+            if key not in self:
+                raise KeyError(key)
+            self.completers[key] = completer = Completer(key)
+        return completer
+
+    def get(self, key: str) -> Completer | None:
+        try:
+            return self[key]
+        except KeyError:
+            return None
+
+
+completers = Completers()
@@ -12,24 +12,47 @@
 'trackmetadata keys': list
 
 The values can be accessed either as config['genre spec'] or config.genre_spec.
-A write to either of those triggers a write to disk of the pickle for the
-entire config dict. As with shelve, updating a mutable within one of the dicts
+A write to either of those marks the key dirty and schedules a write to disk
+of the pickle for the entire config dict. Writes get coalesced: the pickle
+gets written FLUSH_DELAY ms after the last change (but no more than
+MAX_FLUSH_DELAY ms after the first unwritten change), so dragging a column
+divider or the volume slider writes the file once. flush writes any pending
+changes immediately; it runs at exit. The pickle goes to a temporary file
+that replaces CONFIG only once it is complete, so a crash never leaves a
+truncated config. As with shelve, updating a mutable within one of the dicts
 will not update the pickle. To update the pickle, there must be a statement
 like config.filter_config = val."""
 
+import atexit
 import contextlib
+import os
 import pickle
+import time
 from copy import copy
 from pprint import pformat
 
+import gi
+gi.require_version('GLib', '2.0')
+from gi.repository import GLib
+
 from .constants import CONFIG
 
+FLUSH_DELAY = 1000  # ms
+MAX_FLUSH_DELAY = 5000  # ms
+
 class Config:
     def __init__(self):
         with open(CONFIG, 'rb') as config_fo:
             # Like self.config = pickle.load(config_fo).
             self.__dict__['config'] = pickle.load(config_fo)
 
+        # The keys changed since the last write, when the first of those
+        # changes happened, and the source of the pending write.
+        self.__dict__['dirty'] = set()
+        self.__dict__['dirty_since'] = 0.0
+        self.__dict__['flush_source'] = None
+        atexit.register(self.flush)
+
     def __getattr__(self, attr):
         key = attr.replace('_', ' ')
         val = self.__dict__['config'].get(key, {})
@@ -37,9 +60,7 @@ class Config:
 
     def __setattr__(self, attr, val):
         key = attr.replace('_', ' ')
-        self.__dict__['config'][key] = val
-        with open(CONFIG, 'wb') as config_fo:
-            pickle.dump(self.__dict__['config'], config_fo)
+        self[key] = val
 
     def __getitem__(self, key):
         val = self.__dict__['config'].get(key, {})
@@ -47,8 +68,46 @@ class Config:
 
     def __setitem__(self, key, val):
         self.__dict__['config'][key] = val
-        with open(CONFIG, 'wb') as config_fo:
-            pickle.dump(self.__dict__['config'], config_fo)
+        self.mark_dirty(key)
+
+    def is_dirty(self, key) -> bool:
+        return key in self.__dict__['dirty']
+
+    def mark_dirty(self, key):
+        d = self.__dict__
+        if not d['dirty']:
+            d['dirty_since'] = time.monotonic()
+        d['dirty'].add(key)
+
+        # Postpone the write with each change until changes stop coming or
+        # the oldest unwritten change is MAX_FLUSH_DELAY ms old.
+        if d['flush_source'] is not None:
+            elapsed = (time.monotonic() - d['dirty_since']) * 1000
+            if elapsed >= MAX_FLUSH_DELAY - FLUSH_DELAY:
+                return
+            GLib.source_remove(d['flush_source'])
+        d['flush_source'] = GLib.timeout_add(FLUSH_DELAY, self.on_flush_timeout)
+
+    def on_flush_timeout(self):
+        self.__dict__['flush_source'] = None
+        self.flush()
+        return GLib.SOURCE_REMOVE
+
+    def flush(self):
+        d = self.__dict__
+        if d['flush_source'] is not None:
+            GLib.source_remove(d['flush_source'])
+            d['flush_source'] = None
+        if not d['dirty']:
+            return
+
+        tmp_fn = CONFIG.with_suffix('.tmp')
+        with open(tmp_fn, 'wb') as config_fo:
+            pickle.dump(d['config'], config_fo)
+            config_fo.flush()
+            os.fsync(config_fo.fileno())
+        os.replace(tmp_fn, CONFIG)
+        d['dirty'].clear()
 
     def __str__(self):
         return pformat(self.__dict__['config'])
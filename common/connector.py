@@ -3,6 +3,7 @@
 import logging
 import itertools
 import functools
+from collections import defaultdict
 
 from .utilities import debug
 
@@ -31,6 +32,11 @@ def traverse_widgets(tops):
     for top in tops:
         get_children(top)
 
+    # Connect the requests that were waiting for the objects just found.
+    for name in [n for n in _deferred_requests if n in object_dict]:
+        for request in _deferred_requests.pop(name):
+            connect_request(*request)
+
     # Ignore object names that are used more than once, but list them in
     # the warning only once. Names might be used more than once for css.
     if ignored_names:
@@ -44,38 +50,65 @@ def traverse_widgets(tops):
 #    source    the name of the object that sends the signal (in the form a.b.c)
 #    signal    the name of the signal
 #    handler   the handler in the receiver object
+# Requests registered before connect_signals runs get connected then.
+# Requests registered afterward (by a page constructed lazily, for example)
+# get connected immediately. A request whose source is the name of an
+# object in a page constructed lazily (declared with declare_lazy_names)
+# waits until traverse_widgets finds the object. Any other source that does
+# not exist is an error, so misspelled sources still get caught.
 _connection_requests = []
+_deferred_requests: dict[str, list] = defaultdict(list)
+_lazy_names: set[str] = set()
+_signals_connected = False
 def register_connect_request(*args):
-    _connection_requests.append(args)
+    if _signals_connected:
+        connect_request(*args)
+    else:
+        _connection_requests.append(args)
+
+def declare_lazy_names(*names):
+    _lazy_names.update(names)
 
 def connect_signals():
-    for source, signal, handler in _connection_requests:
-        obj_name, *attr_names = source.split('.')
-        try:
-            obj = object_dict[obj_name]
-        except KeyError:
-            raise ValueError(f'Cannot connect signal \'{signal}\' from '
-                    f'\'{obj_name}\' to '
-                    f'\'{handler.__qualname__}\': '
-                    f'Source object not found') from None
-        try:
-            obj = functools.reduce(getattr, attr_names, obj)
-        except AttributeError:
-            raise ValueError(f'Cannot connect signal \'{signal}\' from '
-                    f'\'{source}\' to '
-                    f'\'{handler.__qualname__}\''
-                    f': Some attribute in {attr_names} does not exist') \
-                from None
-        try:
-            obj.connect(signal, handler)
-        except TypeError:
-            raise ValueError(f'Object \'{source}\' does not produce signal '
-                    f'\'{signal}\' sought by '
-                    f'\'{handler.__qualname__}\'') \
-                from None
-        logging.info(f'Connected signal \'{signal}\' '
-                f'from object \'{obj_name}\' to '
-                f'\'{handler.__qualname__}\'')
+    global _signals_connected
+    for request in _connection_requests:
+        connect_request(*request)
+    _connection_requests.clear()
+    _signals_connected = True
+
+def connect_request(source, signal, handler):
+    obj_name, *attr_names = source.split('.')
+    try:
+        obj = object_dict[obj_name]
+    except KeyError:
+        if obj_name in _lazy_names:
+            _deferred_requests[obj_name].append((source, signal, handler))
+            logging.info(f'Deferred signal \'{signal}\' '
+                    f'from object \'{obj_name}\' to '
+                    f'\'{handler.__qualname__}\'')
+            return
+        raise ValueError(f'Cannot connect signal \'{signal}\' from '
+                f'\'{obj_name}\' to '
+                f'\'{handler.__qualname__}\': '
+                f'Source object not found') from None
+    try:
+        obj = functools.reduce(getattr, attr_names, obj)
+    except AttributeError:
+        raise ValueError(f'Cannot connect signal \'{signal}\' from '
+                f'\'{source}\' to '
+                f'\'{handler.__qualname__}\''
+                f': Some attribute in {attr_names} does not exist') \
+            from None
+    try:
+        obj.connect(signal, handler)
+    except TypeError:
+        raise ValueError(f'Object \'{source}\' does not produce signal '
+                f'\'{signal}\' sought by '
+                f'\'{handler.__qualname__}\'') \
+            from None
+    logging.info(f'Connected signal \'{signal}\' '
+            f'from object \'{obj_name}\' to '
+            f'\'{handler.__qualname__}\'')
 
 # The qual_name is obj_name.attr_name1.attr_name2... Replace obj_name with
 # the actual object and then apply the attr_names to its attributes.
@@ -3,6 +3,13 @@ from pathlib import Path
 CONFIG_DIR = Path('.config')
 QUEUEFILES = Path(CONFIG_DIR, 'queuefiles')
 
+# Other controllers (MiniWax) connect to the play engine at this socket.
+PLAYER_SOCKET = Path(CONFIG_DIR, 'player.sock')
+
+# Derived data that can always be regenerated from DATABASE.
+CACHE = Path(CONFIG_DIR, 'cache')
+COVERS_CACHE = Path(CACHE, 'covers')
+
 DATABASE = Path('recordings')
 DOCUMENTS = Path(DATABASE, 'documents')
 IMAGES = Path(DATABASE, 'images')
@@ -3,18 +3,38 @@ it."""
 
 import json
 import sys
+import time
+from pathlib import Path
 
 import gi
 gi.require_version('Gio', '2.0')
 gi.require_version('GLib', '2.0')
 from gi.repository import Gio, GLib
 
+from .metrics import ENABLED as METRICS_ENABLED, count, observe, span
+
 PRIORITY = GLib.PRIORITY_DEFAULT
 
 class EngineLauncher:
     def __init__(self, engine_path, reply_handler):
         self.reply_handler = reply_handler
 
+        # The metrics for the engine (named for its directory) count the
+        # commands, time their round trips, and time the handling of
+        # replies. With metrics on, a ping with a sequence number follows
+        # each command. The engine handles commands in order and answers a
+        # ping with a pong carrying the same number, so the time from a
+        # command to its pong is the time for the engine to receive and
+        # handle the command and for its answer to come back (unlike the
+        # time to the next reply, which might be a position reply on a
+        # timer). pong replies go no further than here.
+        name = Path(engine_path).parent.name
+        self.commands_metric = f'ipc.{name}.commands'
+        self.round_trip_metric = f'ipc.{name}.round_trip'
+        self.handle_metric = f'ipc.{name}.handle'
+        self.seq = 0
+        self.sent_ns: dict[int, int] = {}
+
         self.cancellable = Gio.Cancellable()
         try:
             flags = (Gio.SubprocessFlags.STDOUT_PIPE |
@@ -32,6 +52,16 @@ class EngineLauncher:
             print(e, file=sys.stderr)
 
     def send_command(self, *args):
+        sent_ns = time.perf_counter_ns() if METRICS_ENABLED else 0
+        self.write_command(args)
+
+        count(self.commands_metric)
+        if METRICS_ENABLED:
+            self.seq += 1
+            self.sent_ns[self.seq] = sent_ns
+            self.write_command(('ping', self.seq))
+
+    def write_command(self, args):
         arg_str = json.dumps(args)
         self.data_stream_out.put_string(arg_str, self.cancellable)
         self.data_stream_out.put_string('\n', self.cancellable)
@@ -50,7 +80,14 @@ class EngineLauncher:
         try:
             message, length = source.read_line_finish_utf8(result)
             command, *args = json.loads(message)
-            self.reply_handler(command, args)
+            if command == 'pong':
+                seq, = args
+                if (sent_ns := self.sent_ns.pop(seq, None)) is not None:
+                    observe(self.round_trip_metric,
+                            (time.perf_counter_ns() - sent_ns) / 1e6)
+            else:
+                with span(self.handle_metric):
+                    self.reply_handler(command, args)
         except GLib.GError as e:
             print('error: ', e, file=sys.stderr)
             self.reply_handler('error', e)
@@ -0,0 +1,178 @@
+"""Count and time what happens on the hot paths.
+
+Set WAX_METRICS in the environment to turn metrics on:
+
+    WAX_METRICS=1 ./wax.py
+
+There are three kinds of metric:
+
+    count(name, n=1)        add n to a counter
+    observe(name, value)    add a value to a histogram
+    span(name)              a context manager that adds the time (in ms)
+                            spent in its block to the histogram name
+
+Histograms keep the number of values, their sum, minimum, and maximum, and
+the number of values in each power-of-2 bucket (the value 3 goes in bucket
+2, meaning (2, 4]), which is enough to estimate quantiles (see quantile).
+
+Every FLUSH_INTERVAL seconds (checked as metrics get recorded) and when the
+program exits, a snapshot of all the metrics of the process goes to
+METRICS_LOG (a rotating file beside wax.log, one per program) as a line of
+JSON:
+
+    {"time": ..., "process": ..., "pid": ...,
+            "counters": {name: n, ...},
+            "histograms": {name: {"n": ..., "sum": ..., "min": ...,
+                    "max": ..., "buckets": {exponent: n, ...}}, ...}}
+
+Snapshots hold the totals since the program started. The metrics page in
+Play mode shows the latest snapshot of each program.
+
+Metrics get recorded from worker threads too (MiniWax loads SHORT in a
+thread pool), so a lock guards the updates and the copy that a snapshot
+takes.
+
+Without WAX_METRICS, count and observe do nothing and span returns a
+shared context manager that does nothing, so the hooks cost a function
+call."""
+
+import atexit
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from logging import handlers
+from pathlib import Path
+
+from .constants import CONFIG_DIR
+
+ENABLED = bool(os.environ.get('WAX_METRICS'))
+
+LOG_DIR = Path(CONFIG_DIR, 'log')
+PROCESS = Path(sys.argv[0]).stem.lstrip('-') or 'python'
+METRICS_LOG = Path(LOG_DIR, f'metrics.{PROCESS}.log')
+
+FLUSH_INTERVAL = 60.0
+MAX_LOG_BYTES = 200000
+
+class Histogram:
+    def __init__(self):
+        self.n = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets: dict[int, int] = {}
+
+    def add(self, value: float):
+        self.n += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        exponent = math.ceil(math.log2(value)) if value > 0 else -1000
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def as_dict(self) -> dict:
+        return dict(n=self.n, sum=self.sum, min=self.min, max=self.max,
+                buckets=dict(self.buckets))
+
+# Estimate quantile q (0 < q <= 1) of a histogram in a snapshot as the
+# upper bound of the bucket that holds it (clipped to the maximum).
+def quantile(histogram: dict, q: float) -> float:
+    rank = q * histogram['n']
+    n_seen = 0
+    for exponent, n in sorted((int(e), n)
+            for e, n in histogram['buckets'].items()):
+        n_seen += n
+        if n_seen >= rank:
+            return min(2.0 ** exponent, histogram['max'])
+    return histogram['max']
+
+class Metrics:
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        self.logger = logging.getLogger(f'wax.metrics.{PROCESS}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        file_handler = handlers.RotatingFileHandler(filename=METRICS_LOG,
+                maxBytes=MAX_LOG_BYTES, backupCount=1)
+        file_handler.setFormatter(logging.Formatter('{message}', style='{'))
+        self.logger.addHandler(file_handler)
+
+        atexit.register(self.flush)
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float):
+        with self.lock:
+            if (histogram := self.histograms.get(name)) is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+        self.maybe_flush()
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter_ns() - start) / 1e6)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.counters and not self.histograms:
+                return
+            snapshot = dict(time=time.time_ns(), process=PROCESS,
+                    pid=os.getpid(), counters=dict(self.counters),
+                    histograms={name: histogram.as_dict()
+                        for name, histogram in self.histograms.items()})
+        self.logger.info(json.dumps(snapshot))
+
+# Return the latest snapshot in each metrics log.
+def read_snapshots() -> list[dict]:
+    snapshots = []
+    for path in sorted(LOG_DIR.glob('metrics.*.log')):
+        with open(path, 'rb') as log_fo:
+            lines = log_fo.read().splitlines()
+        for line in reversed(lines):
+            try:
+                snapshots.append(json.loads(line))
+            except ValueError:
+                continue
+            break
+    return snapshots
+
+
+if ENABLED:
+    metrics = Metrics()
+    count = metrics.count
+    observe = metrics.observe
+    span = metrics.span
+else:
+    metrics = None
+    _null_span = nullcontext()
+
+    def count(name: str, n: int = 1):
+        pass
+
+    def observe(name: str, value: float):
+        pass
+
+    def span(name: str):
+        return _null_span
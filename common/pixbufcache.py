@@ -0,0 +1,200 @@
+"""In-memory caches for decoded pixbufs."""
+
+from collections import OrderedDict
+from pathlib import Path
+
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+gi.require_version('Gio', '2.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GdkPixbuf, Gio, GLib
+from gi.repository.GdkPixbuf import PixbufLoader
+
+from .constants import IMAGES, IMAGES_DIR
+from .metrics import count, span
+from .thumbnailatlas import thumbnail_atlas
+
+# The number of bytes occupied by the pixel data of pb. The rowstride
+# includes any padding at the end of each row.
+def pixbuf_n_bytes(pb: GdkPixbuf.Pixbuf) -> int:
+    return pb.props.rowstride * pb.props.height
+
+# PixbufLRU maps keys to pixbufs and evicts the least recently used pixbufs
+# once the pixel data of all the pixbufs it holds exceeds max_bytes. Keys
+# are tuples whose first element is the uuid of the recording to which the
+# pixbuf belongs so that all the pixbufs for a recording can be invalidated
+# at once.
+class PixbufLRU:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.pixbufs: OrderedDict[tuple, GdkPixbuf.Pixbuf] = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self.pixbufs
+
+    def __len__(self) -> int:
+        return len(self.pixbufs)
+
+    def get(self, key) -> GdkPixbuf.Pixbuf | None:
+        try:
+            self.pixbufs.move_to_end(key)
+        except KeyError:
+            return None
+        return self.pixbufs[key]
+
+    def put(self, key, pb: GdkPixbuf.Pixbuf):
+        self.discard(key)
+        self.pixbufs[key] = pb
+        self.n_bytes += pixbuf_n_bytes(pb)
+
+        # Always keep the pixbuf just added, even if it alone exceeds
+        # max_bytes.
+        while self.n_bytes > self.max_bytes and len(self.pixbufs) > 1:
+            old_key, old_pb = self.pixbufs.popitem(last=False)
+            self.n_bytes -= pixbuf_n_bytes(old_pb)
+
+    def discard(self, key):
+        pb = self.pixbufs.pop(key, None)
+        if pb is not None:
+            self.n_bytes -= pixbuf_n_bytes(pb)
+
+    def invalidate(self, uuid: str):
+        for key in [k for k in self.pixbufs if k[0] == uuid]:
+            self.discard(key)
+
+    def clear(self):
+        self.pixbufs.clear()
+        self.n_bytes = 0
+
+# Enough for several full searches' worth of 74x74 thumbnails.
+MAX_THUMBNAIL_BYTES = 8 * 1024 * 1024
+
+# ThumbnailCache holds the decoded thumbnail-00.jpg of recordings so that
+# the views that display thumbnails (incremental search, sibling search,
+# and the play queue) share one copy of each thumbnail. Recordings without
+# a thumbnail get the noimage thumbnail.
+class ThumbnailCache:
+    def __init__(self):
+        self.pixbufs = PixbufLRU(MAX_THUMBNAIL_BYTES)
+        self._noimage_pb = None
+
+        # pending maps a uuid to the callbacks waiting for its thumbnail
+        # so that concurrent requests for the same thumbnail decode it once.
+        self.pending: dict[str, list] = {}
+
+        # Thumbnails that changed while they were being decoded.
+        self.stale: set[str] = set()
+
+    @property
+    def noimage_pb(self) -> GdkPixbuf.Pixbuf:
+        if self._noimage_pb is None:
+            filename = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
+            self._noimage_pb = GdkPixbuf.Pixbuf.new_from_file(str(filename))
+        return self._noimage_pb
+
+    def thumbnail_path(self, uuid: str) -> Path:
+        return Path(IMAGES, uuid, 'thumbnail-00.jpg')
+
+    def get(self, uuid: str) -> GdkPixbuf.Pixbuf:
+        if (pb := self.pixbufs.get((uuid,))) is not None:
+            count('pixbuf.hit')
+            return pb
+        count('pixbuf.miss')
+
+        if (data := thumbnail_atlas.get_bytes(uuid)) is not None:
+            pb = self._load_pixbuf(data)
+        else:
+            filename = self.thumbnail_path(uuid)
+            if not filename.exists():
+                return self.noimage_pb
+            with span('pixbuf.decode_file'):
+                pb = GdkPixbuf.Pixbuf.new_from_file(str(filename))
+        self.pixbufs.put((uuid,), pb)
+        return pb
+
+    # Call callback(pb, *args) with the thumbnail for uuid. If the thumbnail
+    # is not in the cache, it gets read and decoded without blocking the
+    # main loop.
+    def get_async(self, uuid: str, callback, *args):
+        if (pb := self.pixbufs.get((uuid,))) is not None:
+            count('pixbuf.hit')
+            callback(pb, *args)
+            return
+        count('pixbuf.miss')
+
+        if uuid in self.pending:
+            self.pending[uuid].append((callback, args))
+            return
+
+        # Decoding JPEG data already mapped into memory is quick, but do it
+        # from the idle loop so that a view requesting many thumbnails
+        # still fills progressively.
+        if (data := thumbnail_atlas.get_bytes(uuid)) is not None:
+            self.pending[uuid] = [(callback, args)]
+            GLib.idle_add(self._load_atlas_pixbuf, uuid, data)
+            return
+
+        filename = self.thumbnail_path(uuid)
+        if not filename.exists():
+            callback(self.noimage_pb, *args)
+            return
+        self.pending[uuid] = [(callback, args)]
+
+        thumbnail_file = Gio.File.new_for_path(str(filename))
+        thumbnail_file.read_async(GLib.PRIORITY_DEFAULT, None,
+                self._read_async_cb, uuid)
+
+    def _load_atlas_pixbuf(self, uuid, data):
+        try:
+            pb = self._load_pixbuf(data)
+        except GLib.Error:
+            pb = self.noimage_pb
+        else:
+            if uuid not in self.stale:
+                self.pixbufs.put((uuid,), pb)
+        self.stale.discard(uuid)
+        self._finish(uuid, pb)
+        return False
+
+    def _load_pixbuf(self, data):
+        with span('pixbuf.decode'):
+            pb_loader = PixbufLoader.new_with_type('jpeg')
+            pb_loader.write(data)
+            pb_loader.close()
+            return pb_loader.get_pixbuf()
+
+    def _read_async_cb(self, thumbnail_file, result, uuid):
+        try:
+            input_stream = thumbnail_file.read_finish(result)
+        except GLib.Error:
+            self.stale.discard(uuid)
+            self._finish(uuid, self.noimage_pb)
+            return
+        GdkPixbuf.Pixbuf.new_from_stream_async(input_stream, None,
+                self._new_from_stream_cb, uuid)
+
+    def _new_from_stream_cb(self, input_stream, result, uuid):
+        try:
+            pb = GdkPixbuf.Pixbuf.new_from_stream_finish(result)
+        except GLib.Error:
+            pb = self.noimage_pb
+        else:
+            if uuid not in self.stale:
+                self.pixbufs.put((uuid,), pb)
+        self.stale.discard(uuid)
+        self._finish(uuid, pb)
+
+    def _finish(self, uuid, pb):
+        for callback, args in self.pending.pop(uuid, []):
+            callback(pb, *args)
+
+    # Called after the images of uuid change.
+    def invalidate(self, uuid: str):
+        self.pixbufs.invalidate(uuid)
+        thumbnail_atlas.update(uuid)
+        if uuid in self.pending:
+            self.stale.add(uuid)
+
+
+thumbnail_cache = ThumbnailCache()
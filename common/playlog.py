@@ -0,0 +1,303 @@
+"""Keep the play statistics of works in a log beside the catalog.
+
+Every time a set starts playing, PlayLog appends an entry to PLAYLOG
+instead of rewriting the recording in LONG to bump the times played and
+date played props of the work. It also appends an entry every time a track
+finishes playing. Each entry is a line of JSON:
+
+    {"event": "set-started", "uuid": ..., "work_num": ..., "time": ...,
+            "tracks": [[disc_num, track_num], ...]}
+    {"event": "track-finished", "uuid": ..., "work_num": ...,
+            "track_id": [disc_num, track_num], "time": ...}
+    {"event": "reset", "uuid": ..., "work_num": ..., "time": ...}
+    {"event": "compacted", "time": ...}
+
+time is in ns since the epoch. A reset entry records that the props of
+work work_num of uuid in LONG are up to date (the work got deleted) or,
+without work_num, that the props of all the works of uuid are (the editor
+wrote the recording, see refresh, or deleted it), so plays of those works
+logged before it are already in LONG. A compacted entry records the same
+for every work.
+
+PlayLog holds two aggregates of the entries: pending, the plays not yet in
+LONG (which work_props adds to the props read from LONG), and stats, all
+the plays ever logged (for most_played, least_played, and
+not_played_since). work_history and track_history keep the time of every
+play of each work and of each track (the history that the Random page
+queries to rediscover works). compact folds pending into LONG, appends a
+compacted entry, moves the entries of PLAYLOG to the end of
+PLAYLOG_HISTORY, and starts PLAYLOG afresh. Wax compacts the log when it
+quits once the log holds COMPACT_ENTRIES entries."""
+
+import json
+import os
+import shelve
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from .connector import register_connect_request
+from .constants import CONFIG_DIR, LONG, SHORT
+from .shortstore import yield_short_rows
+from .types import RecordingTuple, TrackID
+
+PLAYLOG = Path(CONFIG_DIR, 'playlog')
+PLAYLOG_HISTORY = Path(CONFIG_DIR, 'playlog.history')
+PLAYLOG_COMPACTED = Path(CONFIG_DIR, 'playlog.compacted')
+
+COMPACT_ENTRIES = 100
+
+DATE_FORMAT = '%Y %b %d'
+DAYS_PER_MONTH = 30.44
+
+type WorkID = tuple[str, int]  # (uuid, work_num)
+
+class PlayStats(NamedTuple):
+    times_played: int
+    last_played: int  # ns since the epoch
+
+def yield_entries(path: Path):
+    try:
+        log_fo = open(path, 'rt', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with log_fo:
+        for line in log_fo:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def date_played(time_ns: int) -> str:
+    return datetime.fromtimestamp(time_ns / 1e9).strftime(DATE_FORMAT)
+
+# The inverse of date_played for the date played prop in LONG (None if it
+# is empty or unreadable).
+def parse_date_played(date: str) -> int | None:
+    try:
+        return int(datetime.strptime(date, DATE_FORMAT).timestamp() * 1e9)
+    except ValueError:
+        return None
+
+def months_ago(n_months: float) -> int:
+    return time.time_ns() - int(n_months * DAYS_PER_MONTH * 86400 * 1e9)
+
+class PlayLog:
+    def __init__(self):
+        self.pending: dict[WorkID, PlayStats] = {}
+        self.stats: dict[WorkID, PlayStats] = {}
+        self.work_history: dict[WorkID, list[int]] = defaultdict(list)
+        self.track_history: dict[tuple[str, TrackID], list[int]] = \
+                defaultdict(list)
+        self.n_entries = 0
+
+        # The works of each genre read from SHORT, with the st_mtime_ns of
+        # the file they were read from, for not_played_since.
+        self.genre_works: dict[str, tuple[int, list[WorkID]]] = {}
+
+        # Finish a compaction that got interrupted.
+        self.move_compacted()
+
+        for entry in yield_entries(PLAYLOG_HISTORY):
+            self.add_history(entry)
+        for entry in yield_entries(PLAYLOG):
+            self.add_entry(entry)
+
+        register_connect_request('player', 'set-started',
+                self.on_set_started)
+        register_connect_request('player', 'track-finished',
+                self.on_track_finished)
+        register_connect_request('edit-left-notebook', 'work-deleted',
+                self.on_work_deleted)
+        register_connect_request('edit-left-notebook', 'recording-deleted',
+                self.on_recording_deleted)
+
+    def add_to(self, aggregate: dict[WorkID, PlayStats], entry: dict):
+        work_id = (entry['uuid'], entry['work_num'])
+        times_played, last_played = aggregate.get(work_id, (0, 0))
+        aggregate[work_id] = PlayStats(times_played + 1,
+                max(last_played, entry['time']))
+
+    # Add entry to the aggregates of all the plays ever logged.
+    def add_history(self, entry: dict):
+        match entry['event']:
+            case 'set-started':
+                self.add_to(self.stats, entry)
+                work_id = (entry['uuid'], entry['work_num'])
+                self.work_history[work_id].append(entry['time'])
+            case 'track-finished':
+                track_key = (entry['uuid'], tuple(entry['track_id']))
+                self.track_history[track_key].append(entry['time'])
+
+    def add_entry(self, entry: dict):
+        self.n_entries += 1
+        match entry['event']:
+            case 'reset' if 'work_num' in entry:
+                self.pending.pop((entry['uuid'], entry['work_num']), None)
+            case 'reset':
+                for work_id in [w for w in self.pending
+                        if w[0] == entry['uuid']]:
+                    del self.pending[work_id]
+            case 'compacted':
+                self.pending.clear()
+            case 'set-started':
+                self.add_to(self.pending, entry)
+        self.add_history(entry)
+
+    def log(self, event: str, **fields):
+        entry = dict(event=event, time=time.time_ns(), **fields)
+        with open(PLAYLOG, 'a', encoding='utf-8') as log_fo:
+            log_fo.write(json.dumps(entry) + '\n')
+        self.add_entry(entry)
+
+    # -Handlers----------------------------------------------------------------
+    def on_set_started(self, player, uuid, work_num):
+        tracks: list[TrackID] = list(player.trackid_map)
+        self.log('set-started', uuid=uuid, work_num=work_num, tracks=tracks)
+
+    def on_track_finished(self, player, n_tracks, track_id, uuid, work_num):
+        # (-1, -1) is the alert sound.
+        if tuple(track_id) != (-1, -1):
+            self.log('track-finished', uuid=uuid, work_num=work_num,
+                    track_id=list(track_id))
+
+    # Deleting a work rewrites the recording in LONG with the props of the
+    # other works as they were there, so only the plays of the deleted
+    # work go.
+    def on_work_deleted(self, editnotebook, genre, uuid, work_num):
+        self.log('reset', uuid=uuid, work_num=work_num)
+
+    def on_recording_deleted(self, editnotebook, uuid):
+        self.log('reset', uuid=uuid)
+
+    # -Editing-----------------------------------------------------------------
+    # The editor holds the props of the works of recording as they were when
+    # it read the recording (with the plays then pending added), plus the
+    # plays of work work_num since. Bring the props of the other works up to
+    # date (the props in LONG plus the plays pending now) before the editor
+    # writes recording to LONG and calls reset, so that no play logged while
+    # editing gets lost.
+    def refresh(self, recording: RecordingTuple,
+            work_num: int | None) -> RecordingTuple:
+        with shelve.open(LONG, 'r') as recording_shelf:
+            stored = recording_shelf.get(recording.uuid)
+        for n, work in recording.works.items():
+            if n == work_num:
+                continue
+            props = work.props
+            if stored is not None and n in stored.works:
+                props = stored.works[n].props
+            props = self.work_props(recording.uuid, n, props)
+            recording.works[n] = work._replace(props=props)
+        return recording
+
+    # Record that the props of all the works of uuid in LONG are up to date.
+    def reset(self, uuid: str):
+        self.log('reset', uuid=uuid)
+
+    # -Queries-----------------------------------------------------------------
+    # Return props (the props of work work_num of uuid in LONG) with the
+    # plays not yet in LONG added.
+    def work_props(self, uuid: str, work_num: int,
+            props: list[tuple[str, tuple[str, ...]]]) -> list:
+        stats = self.pending.get((uuid, work_num))
+        if stats is None:
+            return props
+
+        props_d = dict(props)
+        times_played, = props_d.get('times played', ('0',))
+        times_played = int(times_played or 0) + stats.times_played
+        props_d['times played'] = (str(times_played),)
+        props_d['date played'] = (date_played(stats.last_played),)
+        return list(props_d.items())
+
+    # Return recording with the props of each work brought up to date.
+    def apply(self, recording: RecordingTuple) -> RecordingTuple:
+        for work_num, work in recording.works.items():
+            props = self.work_props(recording.uuid, work_num, work.props)
+            if props is not work.props:
+                recording.works[work_num] = work._replace(props=props)
+        return recording
+
+    def most_played(self, n: int) -> list[tuple[WorkID, PlayStats]]:
+        return sorted(self.stats.items(),
+                key=lambda item: item[1], reverse=True)[:n]
+
+    def least_played(self, n: int) -> list[tuple[WorkID, PlayStats]]:
+        return sorted(self.stats.items(), key=lambda item: item[1])[:n]
+
+    # The times (ns since the epoch) of the logged plays of a work or of a
+    # track, oldest first.
+    def work_plays(self, uuid: str, work_num: int) -> list[int]:
+        return self.work_history.get((uuid, work_num), [])
+
+    def track_plays(self, uuid: str, track_id: TrackID) -> list[int]:
+        return self.track_history.get((uuid, tuple(track_id)), [])
+
+    def last_played(self, uuid: str, work_num: int) -> int | None:
+        stats = self.stats.get((uuid, work_num))
+        return stats and stats.last_played
+
+    # The works of genre with no logged play since cutoff (ns since the
+    # epoch). Works played before the log began have only the date played
+    # prop in LONG to go by, so the caller should check it too.
+    def not_played_since(self, genre: str, cutoff: int) -> list[WorkID]:
+        return [work_id for work_id in self.works_of_genre(genre)
+                if self.stats.get(work_id, (0, 0))[1] < cutoff]
+
+    # The works of genre, read again from SHORT only when it changed.
+    def works_of_genre(self, genre: str) -> list[WorkID]:
+        mtime_ns = Path(SHORT, genre).stat().st_mtime_ns
+        cached = self.genre_works.get(genre)
+        if cached is None or cached[0] != mtime_ns:
+            works = [(uuid, work_num)
+                    for short, uuid, work_num in yield_short_rows(genre)]
+            self.genre_works[genre] = cached = (mtime_ns, works)
+        return cached[1]
+
+    # -Compaction--------------------------------------------------------------
+    def compact_if_due(self):
+        if self.n_entries >= COMPACT_ENTRIES:
+            self.compact()
+
+    # Once LONG has the pending plays, the compacted entry clears pending
+    # when the log gets read again, so a crash from here on never counts
+    # the plays twice in LONG. PLAYLOG then becomes PLAYLOG_COMPACTED (in
+    # one step) for move_compacted to append to PLAYLOG_HISTORY.
+    def compact(self):
+        if self.pending:
+            with shelve.open(LONG, 'w') as recording_shelf:
+                for uuid in {uuid for uuid, work_num in self.pending}:
+                    recording = recording_shelf.get(uuid)
+                    if recording is not None:
+                        recording_shelf[uuid] = self.apply(recording)
+        self.log('compacted')
+
+        os.replace(PLAYLOG, PLAYLOG_COMPACTED)
+        self.move_compacted()
+        self.n_entries = 0
+
+    # Append PLAYLOG_COMPACTED to PLAYLOG_HISTORY and remove it. If a crash
+    # interrupted this after the append, PLAYLOG_HISTORY already ends with
+    # the entries (the compacted entry last, unique by its time), so they
+    # do not get appended again.
+    def move_compacted(self):
+        try:
+            data = PLAYLOG_COMPACTED.read_bytes()
+        except FileNotFoundError:
+            return
+
+        with open(PLAYLOG_HISTORY, 'a+b') as history_fo:
+            size = history_fo.seek(0, os.SEEK_END)
+            appended = False
+            if size >= len(data):
+                history_fo.seek(size - len(data))
+                appended = (history_fo.read() == data)
+            if not appended:
+                history_fo.seek(0, os.SEEK_END)
+                history_fo.write(data)
+        PLAYLOG_COMPACTED.unlink()
+
+play_log = PlayLog()
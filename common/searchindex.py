@@ -0,0 +1,270 @@
+"""Word matching for searches and a prebuilt index of the words of every
+work.
+
+Incremental search (widgets.select.left.pages.search.incremental) and the
+search of MiniWax match text the same way: the text is normalized and
+split into words (splitter), and every word must match the start of a word
+of the work or, failing that, the words left over must all match the start
+of words of one of its tracks. The words of a work or track are kept
+sorted (prepare_values) so that bisect finds a match.
+
+Incremental search reads LONG to collect the words of each work. MiniWax
+instead uses SearchIndex, which holds the words of every work along with
+postings that map each word to the works that contain it. The vocabulary
+(all the words, sorted) lets bisect find every word that starts with a
+search word, so only works that contain some word starting with each of
+the search words get matched in full. The index is saved in SEARCH_INDEX
+and rebuilt only when LONG changes behind its back; update_recording keeps
+it current as individual recordings change."""
+
+import bisect
+import pickle
+import shelve
+import string
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from unidecode import unidecode
+
+from .constants import CACHE, LONG
+from .metrics import span
+from .types import GroupTuple, RecordingTuple, TrackID, WorkTuple
+
+SEARCH_INDEX = Path(CACHE, 'search.index')
+
+type WorkID = tuple[str, int]  # (uuid, work_num)
+type MatchValues = list[str]
+type TrackMatchValues = dict[TrackID, MatchValues]
+
+def normalize(text: str) -> str:
+    text = text.strip()
+    text = text.strip(string.punctuation)
+    text = text.lower()
+    # return unicodedata.normalize('NFKD', text)
+    # Slightly slower, but unidecode will find étude when the user types etude.
+    return unidecode(text)
+
+# Normalize text, split it, and discard short values and numbers.
+def splitter(text: str) -> list:
+    return [t.strip(string.punctuation) for t in normalize(text).split()
+            if len(t) > 2 and not t.isdigit()]
+
+def prepare_values(values_set: set) -> list:
+    values_str = ' '.join(values_set)
+
+    # Normalize names and discard short values and numbers; remove
+    # redundancies; and sort values to permit binary search for matches.
+    values = splitter(values_str)
+    values = list(set(values))
+    values.sort()
+
+    return values
+
+def match(values: MatchValues, search_text_values: list) -> bool:
+    def bin_search(values, text):
+        i = bisect.bisect_left(values, text)
+        if i == len(values):
+            return False
+        if values[i].startswith(text):
+            return True
+        return False
+
+    # Every word in search_text_values must match the start of some word
+    # in values.
+    return all(bin_search(values, text) for text in search_text_values)
+
+# Return the words of work and of each of its tracks.
+def work_values(recording: RecordingTuple,
+        work: WorkTuple) -> tuple[MatchValues, TrackMatchValues]:
+    # Assemble values from long work metadata. Any name in short metadata
+    # will also be in long metadata.
+    work_values_set = {name for namegroup in work.metadata
+            for name in namegroup}
+
+    # work.metadata has only primary and secondary. Add nonce names to
+    # work_values_set.
+    for key, namegroup in work.nonce:
+        work_values_set.update(namegroup)
+
+    # Assemble values for individual tracks.
+    group_map = {t: GroupTuple(g_title, g_metadata)
+        for g_title, track_ids, g_metadata in work.trackgroups
+            for t in track_ids}
+
+    track_values = {}
+    for track in recording.tracks:
+        values_set = set()
+        if track.track_id in work.track_ids:
+            values_set.add(track.title)
+            if track.metadata:
+                values_set.update(v for k, vals in track.metadata
+                        for v in vals)
+
+            # If track in track group, append values_set for track group.
+            group_tuple = group_map.get(track.track_id, None)
+            if group_tuple:
+                values_set.add(group_tuple.title)
+                for key, val in group_tuple.metadata:
+                    values_set.update(val)
+
+            track_values[track.track_id] = prepare_values(values_set)
+
+    return prepare_values(work_values_set), track_values
+
+# Return the tracks of a work that match search_text_values, all of them if
+# the work itself matches, or None if neither the work nor any of its
+# tracks match.
+def match_work(values: MatchValues, track_values: TrackMatchValues,
+        search_text_values: list) -> list[TrackID] | None:
+    search_text_values = [v for v in search_text_values
+            if not match(values, [v])]
+    if not search_text_values:
+        return list(track_values)
+
+    track_matches = [t_id for t_id, t_vals in track_values.items()
+            if match(t_vals, search_text_values)]
+    return track_matches or None
+
+# The modification time of the files of the LONG shelf (the dbm module
+# might add a suffix to the name).
+def long_mtime_ns() -> int:
+    return max((path.stat().st_mtime_ns
+            for path in LONG.parent.glob(f'{LONG.name}*')), default=0)
+
+class WorkEntry(NamedTuple):
+    genre: str
+    title: str  # the first name of each primary key, for display
+    values: MatchValues
+    track_values: TrackMatchValues
+
+class SearchResult(NamedTuple):
+    uuid: str
+    work_num: int
+    genre: str
+    title: str
+    track_ids: list[TrackID]  # matching tracks (all if the work matched)
+    work_match: bool
+
+class SearchIndex:
+    def __init__(self):
+        self.long_mtime_ns = 0
+        self.works: dict[WorkID, WorkEntry] = {}
+        self.postings: dict[str, set[WorkID]] = defaultdict(set)
+        self.vocabulary: list[str] = []
+
+    @classmethod
+    def load(cls) -> 'SearchIndex':
+        try:
+            with open(SEARCH_INDEX, 'rb') as index_fo:
+                search_index = pickle.load(index_fo)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            search_index = cls()
+
+        if search_index.long_mtime_ns != long_mtime_ns():
+            search_index = cls.build()
+            search_index.save()
+        return search_index
+
+    @classmethod
+    def build(cls) -> 'SearchIndex':
+        search_index = cls()
+        search_index.long_mtime_ns = long_mtime_ns()
+        with shelve.open(LONG, 'r') as recording_shelf:
+            for uuid, recording in recording_shelf.items():
+                search_index.add_recording(uuid, recording)
+        search_index.vocabulary = sorted(search_index.postings)
+        return search_index
+
+    def save(self):
+        SEARCH_INDEX.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fn = SEARCH_INDEX.with_suffix('.tmp')
+        with open(tmp_fn, 'wb') as index_fo:
+            pickle.dump(self, index_fo)
+        tmp_fn.replace(SEARCH_INDEX)
+
+    def add_recording(self, uuid: str, recording: RecordingTuple):
+        for work_num, work in recording.works.items():
+            values, track_values = work_values(recording, work)
+            title = ' - '.join(namegroup[0]
+                    for namegroup in work.metadata if namegroup[0])
+            work_id = (uuid, work_num)
+            self.works[work_id] = WorkEntry(work.genre, title,
+                    values, track_values)
+
+            for value in values:
+                self.postings[value].add(work_id)
+            for t_vals in track_values.values():
+                for value in t_vals:
+                    self.postings[value].add(work_id)
+
+    def remove_recording(self, uuid: str):
+        for work_id in [w for w in self.works if w[0] == uuid]:
+            entry = self.works.pop(work_id)
+            for value in entry.values:
+                self.postings[value].discard(work_id)
+            for t_vals in entry.track_values.values():
+                for value in t_vals:
+                    self.postings[value].discard(work_id)
+
+    # Bring the index up to date with the recording uuid in LONG.
+    def update_recording(self, uuid: str):
+        self.remove_recording(uuid)
+        with span('long.read'), shelve.open(LONG, 'r') as recording_shelf:
+            recording = recording_shelf.get(uuid)
+        if recording is not None:
+            self.add_recording(uuid, recording)
+            for value in self.postings.keys() - set(self.vocabulary):
+                bisect.insort(self.vocabulary, value)
+        self.long_mtime_ns = long_mtime_ns()
+
+    # Return the works that contain a word starting with text.
+    def prefix_postings(self, text: str) -> set[WorkID]:
+        work_ids = set()
+        i = bisect.bisect_left(self.vocabulary, text)
+        while i < len(self.vocabulary) \
+                and self.vocabulary[i].startswith(text):
+            work_ids |= self.postings[self.vocabulary[i]]
+            i += 1
+        return work_ids
+
+    # Return the works that match text ranked by the quality of the match:
+    # works that match before works with only matching tracks, then works
+    # with more search words matching whole words, then works with more
+    # matching tracks.
+    def search(self, text: str) -> list[SearchResult]:
+        with span('search.index'):
+            return self._search(text)
+
+    def _search(self, text: str) -> list[SearchResult]:
+        search_text_values = splitter(text)
+        if not search_text_values:
+            return []
+
+        candidates = None
+        for value in sorted(search_text_values, key=len, reverse=True):
+            work_ids = self.prefix_postings(value)
+            candidates = work_ids if candidates is None \
+                    else candidates & work_ids
+            if not candidates:
+                return []
+
+        ranked = []
+        for work_id in candidates:
+            entry = self.works[work_id]
+            track_ids = match_work(entry.values, entry.track_values,
+                    search_text_values)
+            if track_ids is None:
+                continue
+
+            work_match = all(match(entry.values, [v])
+                    for v in search_text_values)
+            n_exact = sum(v in self.postings and work_id in self.postings[v]
+                    for v in search_text_values)
+            result = SearchResult(*work_id, entry.genre, entry.title,
+                    track_ids, work_match)
+            ranked.append(((not work_match, -n_exact, -len(track_ids),
+                    normalize(entry.title)), result))
+
+        ranked.sort(key=lambda item: item[0])
+        return [result for rank, result in ranked]
@@ -0,0 +1,150 @@
+"""Hold the SHORT metadata of a genre in a few compact columns.
+
+Unpickling a SHORT file creates a tuple for every work, a tuple for every
+name group, and a str for every name, although most names (composers,
+performers) appear in many works. ShortStore keeps one copy of each
+distinct name group (interned, so equal names are also one str) and
+describes each work with integers in array buffers:
+
+    cells       the id of each name group of each work, one after another
+    row_starts  where the name groups of work i start in cells (the last
+                item is len(cells), so work i has
+                cells[row_starts[i]:row_starts[i + 1]])
+    uuids       the uuid of each work as an int (uuids are time_ns values
+                formatted as 19 digits); a uuid that is not in that form
+                goes in odd_uuids and is stored as -(index + 1)
+    work_nums   the work number of each work
+
+Rows are materialized only when asked for: store[i] returns
+(name_groups, uuid, work_num) like the pickles in SHORT, and the name
+groups it returns are the shared ones, so a RecordingModel filled from a
+ShortStore also holds each name group once.
+
+    python3 -m common.shortstore <genre>
+
+reports the memory used by the unpickled rows and by the ShortStore."""
+
+import pickle
+import sys
+from array import array
+from collections.abc import Iterator
+from pathlib import Path
+
+from .constants import SHORT
+from .metrics import count, span
+from .types import NameGroup
+
+type ShortRow = tuple[tuple[NameGroup, ...], str, int]
+
+def encode_uuid(uuid: str) -> int | None:
+    if uuid.isdigit() and len(uuid) == 19:
+        return int(uuid)
+    return None
+
+def yield_short_rows(genre: str) -> Iterator[ShortRow]:
+    with open(Path(SHORT, genre), 'rb') as fo:
+        while True:
+            try:
+                yield pickle.load(fo)
+            except EOFError:
+                return
+
+class ShortStore:
+    def __init__(self):
+        self.groups: list[NameGroup] = []
+        self.group_ids: dict[NameGroup, int] = {}
+        self.cells = array('I')
+        self.row_starts = array('I', [0])
+        self.uuids = array('q')
+        self.odd_uuids: list[str] = []
+        self.work_nums = array('I')
+
+    @classmethod
+    def load(cls, genre: str) -> 'ShortStore':
+        store = cls()
+        with span('short.load'):
+            for name_groups, uuid, work_num in yield_short_rows(genre):
+                store.append(name_groups, uuid, work_num)
+        count('short.works', len(store))
+        return store
+
+    def append(self, name_groups, uuid: str, work_num: int):
+        for name_group in name_groups:
+            self.cells.append(self.intern_group(name_group))
+        self.row_starts.append(len(self.cells))
+
+        uuid_int = encode_uuid(uuid)
+        if uuid_int is None:
+            self.odd_uuids.append(uuid)
+            uuid_int = -len(self.odd_uuids)
+        self.uuids.append(uuid_int)
+        self.work_nums.append(work_num)
+
+    def intern_group(self, name_group) -> int:
+        name_group = tuple(name_group)
+        group_id = self.group_ids.get(name_group)
+        if group_id is None:
+            name_group = tuple(sys.intern(name) for name in name_group)
+            group_id = len(self.groups)
+            self.groups.append(name_group)
+            self.group_ids[name_group] = group_id
+        return group_id
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+    def __getitem__(self, index: int) -> ShortRow:
+        return self.short(index), self.uuid(index), self.work_num(index)
+
+    def __iter__(self) -> Iterator[ShortRow]:
+        return (self[i] for i in range(len(self)))
+
+    def short(self, index: int) -> tuple[NameGroup, ...]:
+        start, end = self.row_starts[index], self.row_starts[index + 1]
+        return tuple(self.groups[group_id]
+                for group_id in self.cells[start:end])
+
+    # The first name group of a work (its subgenre in genres that have one)
+    # without materializing the rest of the row.
+    def first_group(self, index: int) -> NameGroup:
+        return self.groups[self.cells[self.row_starts[index]]]
+
+    def uuid(self, index: int) -> str:
+        uuid_int = self.uuids[index]
+        if uuid_int < 0:
+            return self.odd_uuids[-uuid_int - 1]
+        return f'{uuid_int:019d}'
+
+    def work_num(self, index: int) -> int:
+        return self.work_nums[index]
+
+    def n_bytes(self) -> int:
+        seen = set()
+        return sum(sizeof(part, seen) for part in (self.cells,
+                self.row_starts, self.uuids, self.work_nums, self.groups,
+                self.group_ids, self.odd_uuids))
+
+# The memory used by obj and everything it refers to, counting shared
+# objects once.
+def sizeof(obj, seen: set | None = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen)
+                for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, seen) for item in obj)
+    return size
+
+
+if __name__ == '__main__':
+    genre, = sys.argv[1:]
+    rows = list(yield_short_rows(genre))
+    store = ShortStore.load(genre)
+    print(f'{genre}: {len(rows)} works, {len(store.groups)} name groups')
+    print(f'unpickled rows: {sizeof(rows):10,d} bytes')
+    print(f'ShortStore:     {store.n_bytes():10,d} bytes')
@@ -0,0 +1,72 @@
+"""Time the steps of starting Wax.
+
+Set WAX_STARTUP_TRACE in the environment to have Wax report how long each
+traced step took once the main window first goes idle:
+
+    WAX_STARTUP_TRACE=1 ./wax.py
+
+Steps are traced with
+
+    with trace('label'):
+        ...
+
+and steps traced inside other steps get indented under them. Each line of
+the report gives the time since this module was imported when the step
+started, the time the step took, and the label. Pages that get constructed
+lazily (see widgets.lazypage) also get traced when they first appear, and
+their times are reported as they happen. Without WAX_STARTUP_TRACE, trace
+does nothing."""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+ENABLED = bool(os.environ.get('WAX_STARTUP_TRACE'))
+
+START_NS = time.perf_counter_ns()
+
+# (depth, label, start, elapsed) of each step in the order they started.
+_steps: list[list] = []
+_depth = 0
+_reported = False
+
+@contextmanager
+def trace(label: str):
+    global _depth
+    if not ENABLED:
+        yield
+        return
+
+    step = [_depth, label, time.perf_counter_ns(), None]
+    _steps.append(step)
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        step[3] = time.perf_counter_ns() - step[2]
+        if _reported and _depth == 0:
+            report()
+
+def format_step(depth: int, label: str, start: int, elapsed: int) -> str:
+    return (f'{(start - START_NS) / 1e6:9.1f} ms '
+            f'{elapsed / 1e6:9.1f} ms  {"  " * depth}{label}')
+
+# Print the steps not yet reported. Returns False so that it can be called
+# from GLib.idle_add.
+def report() -> bool:
+    global _reported
+    if not ENABLED:
+        return False
+
+    if not _reported:
+        print(f'{"start":>12} {"elapsed":>12}  step', file=sys.stderr)
+    for depth, label, start, elapsed in _steps:
+        print(format_step(depth, label, start, elapsed), file=sys.stderr)
+    if not _reported:
+        ready = time.perf_counter_ns() - START_NS
+        print(f'{ready / 1e6:9.1f} ms  ready', file=sys.stderr)
+    _steps.clear()
+    _reported = True
+    return False
@@ -0,0 +1,187 @@
+"""Pack the thumbnails of all recordings into a single file.
+
+Views that display many thumbnails at once (incremental search, sibling
+search, the play queue) would otherwise open one small JPEG per recording.
+The atlas concatenates the JPEG data of every thumbnail-00.jpg in IMAGES
+into ATLAS, and INDEX maps each uuid to (offset, length, mtime_ns) of its
+JPEG data in ATLAS. The atlas is memory-mapped, so fetching a thumbnail
+is a slice of the map.
+
+build_atlas brings the atlas up to date with IMAGES. It reuses the data
+for thumbnails whose mtime and size did not change, so after the first
+build it reads only new or changed thumbnails. Run it with
+
+    python3 -m common.thumbnailatlas
+
+or let wax run it in a worker subprocess at startup. When wax writes new
+images for a recording, ThumbnailAtlas.update appends the new thumbnail
+to ATLAS; the space occupied by the old one is reclaimed by the next
+build."""
+
+import logging
+import mmap
+import os
+import pickle
+from pathlib import Path
+
+from .constants import CACHE, IMAGES
+
+ATLAS = Path(CACHE, 'thumbnails.atlas')
+INDEX = Path(CACHE, 'thumbnails.index')
+
+type AtlasIndex = dict[str, tuple[int, int, int]]  # offset, length, mtime_ns
+
+# build_atlas runs in a worker subprocess (see worker.worker), which
+# receives only the code of the function, so it must import everything it
+# needs and its arguments must be marshalable (hence str, not Path).
+def build_atlas(atlas_fn: str, index_fn: str, images_dir: str) -> int:
+    import os
+    import pickle
+
+    try:
+        with open(index_fn, 'rb') as index_fo:
+            old_index = pickle.load(index_fo)
+        with open(atlas_fn, 'rb') as atlas_fo:
+            old_atlas = atlas_fo.read()
+    except (OSError, EOFError, pickle.UnpicklingError):
+        old_index, old_atlas = {}, b''
+
+    os.makedirs(os.path.dirname(atlas_fn), exist_ok=True)
+    new_index = {}
+    offset = 0
+    with open(atlas_fn + '.tmp', 'wb') as atlas_fo:
+        for uuid in sorted(os.listdir(images_dir)):
+            thumbnail_fn = os.path.join(images_dir, uuid, 'thumbnail-00.jpg')
+            try:
+                st = os.stat(thumbnail_fn)
+            except OSError:
+                continue
+
+            old_entry = old_index.get(uuid)
+            if old_entry is not None \
+                    and old_entry[1:] == (st.st_size, st.st_mtime_ns):
+                old_offset, length, mtime_ns = old_entry
+                data = old_atlas[old_offset:old_offset + length]
+            else:
+                with open(thumbnail_fn, 'rb') as thumbnail_fo:
+                    data = thumbnail_fo.read()
+            atlas_fo.write(data)
+            new_index[uuid] = (offset, len(data), st.st_mtime_ns)
+            offset += len(data)
+
+    with open(index_fn + '.tmp', 'wb') as index_fo:
+        pickle.dump(new_index, index_fo)
+
+    # Replace the atlas before the index. A reader that has not yet
+    # reloaded still has the old atlas mapped (renaming does not affect
+    # an open file).
+    os.replace(atlas_fn + '.tmp', atlas_fn)
+    os.replace(index_fn + '.tmp', index_fn)
+    return len(new_index)
+
+class ThumbnailAtlas:
+    def __init__(self):
+        self.index: AtlasIndex = {}
+        self.map = None
+        self.loaded = False
+
+        # Recordings whose thumbnails were updated while a rebuild was
+        # running. The rebuild might have missed them.
+        self.updated_during_rebuild: set[str] | None = None
+
+    def load(self):
+        self.close()
+        self.loaded = True
+        try:
+            with open(INDEX, 'rb') as index_fo:
+                self.index = pickle.load(index_fo)
+            with open(ATLAS, 'rb') as atlas_fo:
+                self.map = mmap.mmap(atlas_fo.fileno(), 0,
+                        access=mmap.ACCESS_READ)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            # No atlas yet (or an empty one).
+            self.index, self.map = {}, None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.map = None
+        self.index = {}
+        self.loaded = False
+
+    # Return the JPEG data of the thumbnail for uuid or None if the atlas
+    # does not have it.
+    def get_bytes(self, uuid: str) -> bytes | None:
+        if not self.loaded:
+            self.load()
+        try:
+            offset, length, mtime_ns = self.index[uuid]
+        except KeyError:
+            return None
+        if self.map is None or offset + length > len(self.map):
+            return None
+        return self.map[offset:offset + length]
+
+    # Called when the thumbnail of uuid changes. Append the new thumbnail
+    # to the atlas (or forget it if the recording no longer has one).
+    def update(self, uuid: str):
+        if self.updated_during_rebuild is not None:
+            self.updated_during_rebuild.add(uuid)
+
+        if not self.loaded:
+            self.load()
+
+        thumbnail_fn = Path(IMAGES, uuid, 'thumbnail-00.jpg')
+        try:
+            st = thumbnail_fn.stat()
+            data = thumbnail_fn.read_bytes()
+        except OSError:
+            if self.index.pop(uuid, None) is not None:
+                self._write_index()
+            return
+
+        ATLAS.parent.mkdir(parents=True, exist_ok=True)
+        with open(ATLAS, 'ab') as atlas_fo:
+            offset = atlas_fo.tell()
+            atlas_fo.write(data)
+        self.index[uuid] = (offset, len(data), st.st_mtime_ns)
+        self._write_index()
+
+        # The map does not cover the data just appended, so map the atlas
+        # again.
+        self.load()
+
+    def _write_index(self):
+        tmp_fn = INDEX.with_suffix('.tmp')
+        with open(tmp_fn, 'wb') as index_fo:
+            pickle.dump(self.index, index_fo)
+        os.replace(tmp_fn, INDEX)
+
+    # Rebuild the atlas in a worker subprocess and then map the new atlas.
+    # The images updated meanwhile get updated again whether or not the
+    # rebuild succeeded: a successful rebuild might have read them before
+    # they changed, and a failed one might have left an atlas or index
+    # without them.
+    def refresh(self):
+        from worker.worker import Worker
+
+        def reply_handler(success, result):
+            updated = self.updated_during_rebuild
+            self.updated_during_rebuild = None
+            if not success:
+                logging.warning(f'Rebuilding {ATLAS} failed: {result}')
+            self.load()
+            for uuid in updated:
+                self.update(uuid)
+
+        self.updated_during_rebuild = set()
+        self.worker = Worker()
+        self.worker.do_in_subprocess(build_atlas, reply_handler,
+                str(ATLAS), str(INDEX), str(IMAGES))
+
+
+thumbnail_atlas = ThumbnailAtlas()
+
+if __name__ == '__main__':
+    n_thumbnails = build_atlas(str(ATLAS), str(INDEX), str(IMAGES))
+    print(f'Packed {n_thumbnails} thumbnails into {ATLAS}')
@@ -1,11 +1,14 @@
 """Utility functions."""
 
 import sys
+from pathlib import Path
 
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk
 
+from .constants import DOCUMENTS
+
 def debug(arg, comment=''):
     if comment:
         comment += ': '
@@ -33,3 +36,8 @@ def css_load_from_data(css_data):
 def playable_tracks(tracks, track_ids):
     return [t for t in tracks if t.track_id in track_ids]
 
+# Whether the recording uuid has documents (answered here so that Play
+# mode need not construct its docs page to find out).
+def has_docs(uuid):
+    documents_dir = Path(DOCUMENTS, uuid)
+    return any(documents_dir.iterdir())
@@ -1,24 +1,28 @@
 """Provide play functionality for recordings in the Wax database from a
 web page, thereby enabling control from any platform with a browser."""
 
-import os
-import pickle
+import asyncio
 import shelve
-import string
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
 from functools import partial
-from nicegui import ui, run
+from nicegui import app, background_tasks, core, ui, run
 from pathlib import Path
-from typing import NamedTuple, Iterator
-from unidecode import unidecode
-
-import gi
-gi.require_version('Gio', '2.0')
-gi.require_version('Gst', '1.0')
-from gi.repository import Gio, Gst
+from typing import NamedTuple
+from watchfiles import awatch
 
+from common.changelog import CHANGELOG, ChangeReader
 from common.config import config
-from common.constants import LONG, IMAGES, SHORT, SOUND
+from common.constants import LONG, SHORT
 from common.genrespec import genre_spec
+from common.searchindex import SearchIndex, SearchResult
+from common.searchindex import long_mtime_ns, normalize
+from common.shortstore import ShortStore
+from common.types import RecordingTuple
+import miniwaxsound  # adds the /sound endpoint to app
+from miniwaxcovers import cover_srcset
+from miniwaxplayer import PlayTrack, connect_playback, resolve_track_paths
 
 type NameGroup = tuple[str, ...]  # could be only 1 str
 
@@ -27,12 +31,6 @@ class ShortMetadata(NamedTuple):
     uuid: str
     work_num: int
 
-def normalize(text: str) -> str:
-    text = text.strip()
-    text = text.strip(string.punctuation)
-    text = text.lower()
-    return unidecode(text)
-
 def joiner(name_group: tuple) -> str:
     return ', '.join(name_group)
 
@@ -42,10 +40,190 @@ def sort_key(short_metadata: ShortMetadata) -> tuple[str, ...]:
 def ellipsize(val: str, max_len: int) -> str:
     return val if len(val) < max_len else f'{val[:max_len-1]}\u2026'
 
+# Transform (('name1',), ('name2a', 'name2b'), ('name3',)) to ('name1',
+# 'name2a, name2b', 'name3') and ellipsize the resulting name strings.
+def short_metadata(store: ShortStore, index: int) -> ShortMetadata:
+    names = tuple(ellipsize(joiner(name_group), 30)
+            for name_group in store.short(index))
+    return ShortMetadata(names, store.uuid(index), store.work_num(index))
+
+def short_mtime_ns(genre: str) -> int:
+    try:
+        return Path(SHORT, genre).stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+# The number of rows sent to the browser at a time. The table requests the
+# next page when the user scrolls near the end of the rows it has.
+ROWS_PER_PAGE = 100
+
+# ShortRows is a sorted sequence of the works in a ShortStore. It holds only
+# their indexes in the store and materializes the ShortMetadata of a work
+# when it is asked for (in practice, a page of rows at a time).
+class ShortRows(Sequence):
+    def __init__(self, store: ShortStore, indexes: array):
+        self.store = store
+        self.indexes = indexes
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [short_metadata(self.store, index)
+                    for index in self.indexes[i]]
+        return short_metadata(self.store, self.indexes[i])
+
+# GenreIndex holds the SHORT metadata of a genre sorted once on the server.
+# rows maps each subgenre (or None if the genre has no subgenres) to the
+# sorted ShortRows of its works, so row i of the table is rows[key][i]. The
+# metadata itself stays in the compact columns of a ShortStore.
+class GenreIndex:
+    def __init__(self, genre: str, has_subgenre: bool):
+        # A genre whose last work got deleted has no SHORT file.
+        self.mtime_ns = short_mtime_ns(genre)
+        if self.mtime_ns:
+            store = ShortStore.load(genre)
+        else:
+            store = ShortStore()
+        order = sorted(range(len(store)),
+                key=lambda index: sort_key(short_metadata(store, index)))
+
+        indexes: dict[str | None, array] = defaultdict(partial(array, 'I'))
+        if has_subgenre:
+            for index in order:
+                subgenre = ellipsize(joiner(store.first_group(index)), 30)
+                indexes[subgenre].append(index)
+        else:
+            indexes[None] = array('I', order)
+        self.rows = {key: ShortRows(store, key_indexes)
+                for key, key_indexes in indexes.items()}
+
+    def is_current(self, genre: str) -> bool:
+        return short_mtime_ns(genre) == self.mtime_ns
+
+    @property
+    def subgenres(self) -> list[str]:
+        return sorted(self.rows)
+
+def read_recording(uuid: str) -> RecordingTuple:
+    with shelve.open(LONG, 'r') as recording_shelf:
+        return recording_shelf[uuid]
+
+MAX_CACHED_RECORDINGS = 64
+
+# The number of search results per page.
+SEARCH_PAGE_SIZE = 25
+MAX_CACHED_SEARCHES = 16
+
+# The displayed width of the cover image (class w-80).
+COVER_SIZES = '320px'
+
+# Catalog reads the database without blocking the event loop of nicegui,
+# which serves every connected browser. Reads run in a thread (run.io_bound)
+# while the event loop continues. Decoded recordings stay in an LRU cache
+# until LONG changes, and concurrent requests for the same recording share
+# one read.
+class Catalog:
+    def __init__(self):
+        self.genre_indexes: dict[str, GenreIndex] = {}
+        self.recordings: OrderedDict[str, RecordingTuple] = OrderedDict()
+        self.pending: dict[str, asyncio.Task] = {}
+        self.mtime_ns = long_mtime_ns()
+
+        # The search index gets loaded (or built) on the first search.
+        # searches holds the ranked results of recent searches so that
+        # further pages of results cost nothing.
+        self.search_index: SearchIndex | None = None
+        self.search_index_lock = asyncio.Lock()
+        self.searches: OrderedDict[str, list[SearchResult]] = OrderedDict()
+
+    async def get_genre_index(self, genre: str,
+            has_subgenre: bool) -> GenreIndex:
+        genre_index = self.genre_indexes.get(genre)
+        if genre_index is None or not genre_index.is_current(genre):
+            genre_index = await run.io_bound(GenreIndex, genre, has_subgenre)
+            self.genre_indexes[genre] = genre_index
+        return genre_index
+
+    async def get_recording(self, uuid: str) -> RecordingTuple:
+        if (mtime_ns := long_mtime_ns()) != self.mtime_ns:
+            self.recordings.clear()
+            self.mtime_ns = mtime_ns
+
+        if uuid in self.recordings:
+            self.recordings.move_to_end(uuid)
+            return self.recordings[uuid]
+
+        if (task := self.pending.get(uuid)) is None:
+            task = asyncio.ensure_future(run.io_bound(read_recording, uuid))
+            self.pending[uuid] = task
+        try:
+            recording = await task
+        finally:
+            self.pending.pop(uuid, None)
+
+        self.recordings[uuid] = recording
+        while len(self.recordings) > MAX_CACHED_RECORDINGS:
+            self.recordings.popitem(last=False)
+        return recording
+
+    def forget_recording(self, uuid: str):
+        self.recordings.pop(uuid, None)
+
+    # Return one page of the results for text and the number of results.
+    # The lock keeps updates to the index from running during a search.
+    async def search(self, text: str, offset: int = 0,
+            limit: int = SEARCH_PAGE_SIZE) -> tuple[list[SearchResult], int]:
+        text = normalize(text)
+        if (results := self.searches.get(text)) is None:
+            async with self.search_index_lock:
+                if self.search_index is None:
+                    self.search_index = await run.io_bound(SearchIndex.load)
+                results = await run.io_bound(self.search_index.search, text)
+            self.searches[text] = results
+            while len(self.searches) > MAX_CACHED_SEARCHES:
+                self.searches.popitem(last=False)
+        else:
+            self.searches.move_to_end(text)
+        return results[offset:offset + limit], len(results)
+
+    # Bring the search index up to date with changes to recordings.
+    async def update_search_index(self, uuids: set[str]):
+        async with self.search_index_lock:
+            if self.search_index is None:
+                return
+            def update():
+                for uuid in uuids:
+                    self.search_index.update_recording(uuid)
+                self.search_index.save()
+            await run.io_bound(update)
+        self.searches.clear()
+
+
+catalog = Catalog()
+
+# Search the catalog: GET /search?q=<text>&offset=<n>&limit=<n>.
+@app.get('/search')
+async def search(q: str, offset: int = 0, limit: int = SEARCH_PAGE_SIZE):
+    limit = max(1, min(limit, 100))
+    results, total = await catalog.search(q, max(0, offset), limit)
+    return {'total': total, 'offset': offset,
+            'results': [result._asdict() for result in results]}
+
+
 class MiniWax:
     def __init__(self):
-        Gst.init(None)
-        self.position = 0
+        self.playback = connect_playback(self.on_playback_event)
+        self.catalog = catalog
+
+        # rows is the list of ShortMetadata displayed in the table; only
+        # the first n_rows_sent of them have been sent to the browser.
+        self.rows: Sequence[ShortMetadata] = []
+        self.n_rows_sent = 0
+
+        # The work displayed by details_view.
+        self.uuid = self.work_num = None
 
         # Initialize volume control from .miniwax file.
         with open('.minimax', 'r') as fo:
@@ -77,6 +255,26 @@ class MiniWax:
                             show_value=False).props('instant-feedback')
         self.track_title = ui.label('').style('white-space: pre-wrap')
 
+        # Search results replace the genre table while there is search text.
+        self.search_input = ui.input(placeholder='Search').props(
+                'dense dark clearable').classes('w-80')
+        self.search_input.on('update:model-value', self.on_search_changed,
+                throttle=0.3, leading_events=False)
+        self.search_results: list[SearchResult] = []
+        self.search_table = ui.table(rows=[], row_key='index', columns=[
+                {'name': 'title', 'label': 'Work', 'field': 'title',
+                    'align': 'left'},
+                {'name': 'genre', 'label': 'Genre', 'field': 'genre',
+                    'align': 'left'},
+                {'name': 'tracks', 'label': 'Tracks', 'field': 'tracks'}],
+                pagination=0).props('dense hide-bottom').classes('-ms-4')
+        self.search_table.style('background-color: #777777; color: #eeeeee')
+        self.search_table.on('rowClick', self.on_search_table_row_click)
+        self.search_table.visible = False
+        self.more_button = ui.button('More', color='#777777',
+                on_click=self.on_more_button_click).props('flat no-caps')
+        self.more_button.visible = False
+
         with ui.button_group():
             with ui.dropdown_button('', auto_close=True, color='#777777'
                         ).classes('mt-4').props('no-caps size=13px'
@@ -90,179 +288,154 @@ class MiniWax:
                         auto_close=True, color='#777777'
                     ).classes('mt-4').props('no-caps size=13px')
 
-        with ui.scroll_area().classes('-ms-4 -my-2') as self.scroll_area:
-            self.table = ui.table(rows=[]).props('dense').classes('-mt-4')
-            self.table.style('background-color: #777777; color: #eeeeee')
-            self.table.on('rowClick', self.on_table_row_click)
-
-        # Initialize the display by pretending that the user selected a
-        # genre and a work.
-        self.on_genre_button_click('Anthology')
-        self.details_view(0)
-
-        self.pause_button.disable()
-
-    def get_progress(self) -> float:
-        success, position = self.playbin.query_position(Gst.Format.TIME)
-        success, duration = self.playbin.query_duration(Gst.Format.TIME)
-
-        if not success:
-            # If the user clicks play while play is in progress, both
-            # queries are unsuccessful.
-            return 0.0
-        elif position == duration and not self.track_ids:
-            # Detect EOS. Normally, we would get an EOS message from the
-            # bus, but running the bus requires a GLib.mainloop.
-            self.playbin.set_state(Gst.State.NULL)
-            del self.playbin
-
-            self.timer.cancel()
-            self.pause_button.disable()
-            self.track_title.text = ''
-            return 0.0
-        else:
-            return float(position) / float(duration)
-
-    def start_gstreamer(self):
-        try:
-            file_name = self.next_track()
-        except (IndexError, ValueError):
-            self.play_button.disable()
-            return
-        fo = Gio.File.new_for_path(file_name)
-
-        self.playbin = playbin = Gst.ElementFactory.make('playbin', None)
-        playbin.set_property('uri', fo.get_uri())
-        playbin.set_property('volume', float(self.slider.value)/100.0)
-        playbin.connect('about-to-finish', self.on_about_to_finish)
-
-        playbin.set_state(Gst.State.PLAYING)
+        # The table renders only the rows in view (virtual-scroll) and asks
+        # for more rows as the user approaches the end of the ones it has.
+        self.table = ui.table(rows=[], row_key='index', pagination=0).props(
+                'dense virtual-scroll hide-bottom').classes('-ms-4 mt-0')
+        self.table.style('background-color: #777777; color: #eeeeee; '
+                'height: 60vh')
+        self.table.on('rowClick', self.on_table_row_click)
+        self.table.on('virtual-scroll', self.on_table_virtual_scroll,
+                args=['to'], throttle=0.2)
 
-        self.timer = ui.timer(1.0,
-            callback=lambda: self.progressbar.set_value(self.get_progress()))
-        self.pause_button.enable()
+        # details_view counts its calls so that a slow read cannot
+        # overwrite the view of a work selected after it.
+        self.n_details_views = 0
 
-    def on_about_to_finish(self, playbin):
-        # about-to-finish occurs about 1.3s before the end of the track.
-        try:
-            file_name = self.next_track()
-        except (IndexError, ValueError):
-            self.play_button.disable()
-            return
+        # Initialize the display by pretending that the user selected a
+        # genre once the event loop is running.
+        app.on_startup(partial(self.on_genre_button_click, 'Anthology'))
 
-        fo = Gio.File.new_for_path(file_name)
-        self.playbin.set_property('uri', fo.get_uri())
+        # Follow changes that wax makes to the catalog.
+        self.change_reader = ChangeReader()
+        app.on_startup(lambda: background_tasks.create(self.watch_catalog()))
 
-    def next_track(self) -> str:
-        disc_num, track_num = track_id = self.track_ids.pop(0)
+        self.pause_button.disable()
 
+    # Called from the playback service thread. Handle the event in the
+    # event loop of nicegui.
+    def on_playback_event(self, event, *args):
+        core.loop.call_soon_threadsafe(self.handle_playback_event,
+                event, *args)
+
+    def handle_playback_event(self, event, *args):
+        match event:
+            case 'track-started':
+                track_index, = args
+                self.show_track_title(self.play_track_ids[track_index])
+                self.progressbar.set_value(0.0)
+            case 'position':
+                fraction, = args
+                self.progressbar.set_value(fraction)
+            case 'state':
+                state, = args
+                self.pause_button.set_enabled(state != 'NULL')
+            case 'set-finished':
+                self.progressbar.set_value(0.0)
+                self.track_title.text = ''
+
+    def show_track_title(self, track_id):
+        disc_num, track_num = track_id
         self.track_title.text = f'{track_num+1}: {self.trackid_map[track_id]}'
 
-        # Choose the highest quality sound file available.
-        root = os.path.join(SOUND, self.uuid, str(disc_num),
-                f'{track_num:02d}')
-        for ext in ['.wav', '.flac', '.ogg', '.m4a', '.mp3']:
-            file_name = root + ext
-            if os.path.exists(file_name):
-                return file_name
-        else:
-            raise ValueError
-
     def do_play(self):
-        if hasattr(self, 'playbin'):
-            self.playbin.set_state(Gst.State.NULL)
-            del self.playbin
-            self.timer.cancel()
-            self.progressbar.set_value(0.0)
-            self.pause_button.disable()
-            self.track_title.text = ''
-
-        ui.timer(0.1, self.start_gstreamer, once=True)
+        # The tracks being played stay the same even if the user selects
+        # another work while they play.
+        tracks = [PlayTrack(track_id, path, self.track_durations[track_id])
+                for track_id, path in zip(self.track_ids, self.track_paths)
+                    if path is not None]
+        self.play_track_ids = [track.track_id for track in tracks]
+        self.playback.play_set(self.uuid, tracks,
+                float(self.slider.value)/100.0)
 
     def do_pause(self):
-        if not self.playbin:
-            return
-        _, state, _ = self.playbin.get_state(Gst.CLOCK_TIME_NONE)
-        if state == Gst.State.PAUSED:
-            if self.position:
-                flag = Gst.SeekFlags.FLUSH
-                self.playbin.seek_simple(Gst.Format.TIME, flag, self.position)
-            self.playbin.set_state(Gst.State.PLAYING)
-        else:
-            gst_format = Gst.Format.TIME
-            success, self.position = self.playbin.query_position(gst_format)
-            self.playbin.set_state(Gst.State.PAUSED)
+        self.playback.pause()
 
     def do_volume(self, slider):
-        if hasattr(self, 'playbin'):
-            self.playbin.set_property('volume', float(slider.value)/100.0)
+        self.playback.set_volume(float(slider.value)/100.0)
 
         with open('.minimax', 'wt') as fo:
             fo.write(str(slider.value))
 
     def get_short_metadata_for_index(self, index):
-        if self.genre_has_subgenre:
-            subgenre = self.subgenre_button.text
-            i = -1
-            for short_metadata in self.short_metadata:
-                if short_metadata.names[0] == subgenre:
-                    i += 1
-                    if i == index:
-                        return short_metadata
-        else:
-            return self.short_metadata[index]
+        return self.rows[index]
 
-    def details_view(self, index):
+    async def details_view(self, index):
         short_metadata = self.get_short_metadata_for_index(index)
-        with shelve.open(LONG, 'r') as recording_shelf:
-            recording = recording_shelf[short_metadata.uuid]
+        await self.show_work(short_metadata.uuid, short_metadata.work_num)
+
+    async def show_work(self, uuid, work_num):
+        self.n_details_views += 1
+        n_details_views = self.n_details_views
+
+        recording = await self.catalog.get_recording(uuid)
+        work = recording.works[work_num]
+
+        # Resolve the sound files now so that playback never has to search
+        # for them.
+        track_paths = await run.io_bound(resolve_track_paths,
+                uuid, work.track_ids)
+        cover = await run.io_bound(cover_srcset, uuid)
+
+        if n_details_views != self.n_details_views:
+            return
 
-        work = recording.works[short_metadata.work_num]
         metadata = work.metadata
 
         self.track_ids = work.track_ids
-        self.uuid = short_metadata.uuid
+        self.uuid = uuid
+        self.work_num = work_num
+
+        self.track_paths = track_paths
+        self.play_button.set_enabled(
+                any(path is not None for path in self.track_paths))
 
         self.trackid_map = {
                 tracktuple.track_id: ellipsize(tracktuple.title, 58)
                     for tracktuple in recording.tracks}
-
-        cover_path = Path(IMAGES, short_metadata.uuid, 'image-00.jpg')
-        if not cover_path.is_file():
-            cover_path = Path('noimage.png')
-        self.cover_image.source = cover_path
+        self.track_durations = {tracktuple.track_id: tracktuple.duration
+                for tracktuple in recording.tracks}
+
+        # The browser chooses among the sizes in the srcset according to
+        # its viewport and pixel density (see miniwaxcovers).
+        if cover is None:
+            self.cover_image.props.pop('srcset', None)
+            self.cover_image.source = Path('noimage.png')
+        else:
+            src, srcset = cover
+            self.cover_image.props['srcset'] = srcset
+            self.cover_image.props['sizes'] = COVER_SIZES
+            self.cover_image.source = src
 
         lines = [', '.join(val) for val in metadata if val != ('',)]
         primary_vals_str = '\n'.join(ellipsize(line, 35) for line in lines)
         self.long_metadata_label.text = primary_vals_str
 
-        disc_num, track_num = track_id = self.track_ids[0]
-        self.track_title.text = f'{track_num+1}: {self.trackid_map[track_id]}'
+        self.show_track_title(self.track_ids[0])
+
+    # Show no work, as when the genre displayed has none left.
+    def clear_details(self):
+        # Drop any details_view still reading.
+        self.n_details_views += 1
+        self.uuid = self.work_num = None
+        self.track_ids = []
+        self.track_paths = []
+        self.play_button.disable()
+        self.cover_image.props.pop('srcset', None)
+        self.cover_image.source = Path('noimage.png')
+        self.long_metadata_label.text = ''
+        self.track_title.text = ''
+
+    async def on_genre_button_click(self, genre):
+        primary_keys = config.genre_spec[genre]['primary']
+        genre_has_subgenre = (primary_keys[0] == 'subgenre')
+        genre_index = await self.catalog.get_genre_index(genre,
+                genre_has_subgenre)
 
-    def yield_short_metadata(self, genre
-            ) -> Iterator[tuple[tuple[str, ...], str, int]]:
-        short_path = Path(SHORT, genre)
-        with open(short_path, 'rb') as fo:
-            while True:
-                try:
-                    name_groups, uuid, work_num = pickle.load(fo)
-                    # Transform (('name1',), ('name2a', 'name2b'), ('name3',))
-                    # to ('name1', 'name2a, name2b', 'name3') and ellipsize
-                    # the resulting name strings.
-                    names = tuple(ellipsize(joiner(name_group), 30) \
-                            for name_group in name_groups)
-                    yield ShortMetadata(names, uuid, work_num)
-                except EOFError:
-                    return
-
-    def on_genre_button_click(self, genre):
         self.genre_button.text = genre
-        self.primary_keys = primary_keys = config.genre_spec[genre]['primary']
-        self.genre_has_subgenre = (self.primary_keys[0] == 'subgenre')
-
-        # short_data is a list of ShortMetadata tuples.
-        self.short_metadata = list(self.yield_short_metadata(genre))
-        self.short_metadata.sort(key=sort_key)
+        self.primary_keys = primary_keys
+        self.genre_has_subgenre = genre_has_subgenre
+        self.genre_index = genre_index
 
         # If the first key is subgenre, leave that value out of the table.
         first_index = int(self.genre_has_subgenre)
@@ -275,61 +448,177 @@ class MiniWax:
         self.table.columns = columns
 
         if self.genre_has_subgenre:
-            self.activate_subgenre_button()
+            await self.activate_subgenre_button()
             self.subgenre_button.visible = True
         else:
             self.subgenre_button.visible = False
+            await self.show_rows(genre_index.rows[None])
 
-            rows = [dict(zip(primary_keys, short_metadata.names))
-                    for short_metadata in self.short_metadata]
-            self.table.rows = rows
-
-            self.details_view(0)
-            self.scroll_area.scroll_to(pixels=0)
+    async def activate_subgenre_button(self):
+        self.populate_subgenre_button()
+        await self.on_subgenre_button_click(self.genre_index.subgenres[0])
 
-    def activate_subgenre_button(self):
+    def populate_subgenre_button(self):
         # Remove all values from the subgenre_button.
         for element in reversed(list(self.subgenre_button.descendants())):
             self.subgenre_button.remove(element)
 
-        # Collect and order all the subgenre names.
-        subgenres = set()
-        subgenres.update(short_metadata.names[0]
-                for short_metadata in self.short_metadata)
-        subgenres = list(subgenres)
-        subgenres.sort()
-
         # Populate the subgenre menu with the subgenres in the genre.
         with self.subgenre_button:
-            for subgenre in subgenres:
+            for subgenre in self.genre_index.subgenres:
                 func = partial(self.on_subgenre_button_click,
                         subgenre=subgenre)
                 ui.item(subgenre, on_click=func).style(
                         'background-color: #777777; font-size: 12px;'
                         ).props('dense')
 
-        self.on_subgenre_button_click(subgenres[0])
-
-    def on_subgenre_button_click(self, subgenre):
+    async def on_subgenre_button_click(self, subgenre):
         self.subgenre_button.text = subgenre
+        await self.show_rows(self.genre_index.rows[subgenre])
+
+    # Display rows in the table starting with the first page.
+    async def show_rows(self, rows: Sequence[ShortMetadata]):
+        self.rows = rows
+        self.n_rows_sent = 0
+        self.table.rows = self.get_page(0)
+        self.n_rows_sent = len(self.table.rows)
+        self.table.run_method('scrollTo', 0)
+
+        if rows:
+            await self.details_view(0)
+
+    # Return the table rows for the page of rows starting at start. Each
+    # table row carries its index in self.rows so that a click maps back
+    # to its ShortMetadata without a search.
+    def get_page(self, start: int,
+            n_rows: int = ROWS_PER_PAGE) -> list[dict]:
+        return [dict(zip(self.primary_keys, short_metadata.names), index=i)
+                for i, short_metadata in enumerate(
+                    self.rows[start:start + n_rows], start)]
+
+    def on_table_virtual_scroll(self, msg):
+        # Send the next page once the user is within half a page of the
+        # last row sent.
+        last_row_visible = msg.args['to']
+        if self.n_rows_sent < len(self.rows) \
+                and last_row_visible >= self.n_rows_sent - ROWS_PER_PAGE // 2:
+            page = self.get_page(self.n_rows_sent)
+            self.table.add_rows(page)
+            self.n_rows_sent += len(page)
+
+    # -Catalog changes---------------------------------------------------------
+    # Wax records its changes in CHANGELOG (see common.changelog). Changes
+    # to SHORT also trigger an update, so MiniWax follows the catalog
+    # even if something other than wax changes it.
+    async def watch_catalog(self):
+        changelog_path = CHANGELOG.resolve()
+        short_path = SHORT.resolve()
+        def watch_filter(change, path):
+            path = Path(path)
+            return path == changelog_path or path.parent == short_path
+
+        # Watch only the directories themselves: CHANGELOG.parent is the
+        # whole configuration directory.
+        async for changes in awatch(CHANGELOG.parent, SHORT,
+                watch_filter=watch_filter, recursive=False):
+            genres = {Path(path).name for change, path in changes
+                    if Path(path).parent == short_path}
+            uuids = set()
+            for entry in self.change_reader.read():
+                uuids.add(entry['uuid'])
+                self.catalog.forget_recording(entry['uuid'])
+                if 'genre' in entry:
+                    genres.add(entry['genre'])
+            if uuids:
+                await self.catalog.update_search_index(uuids)
+
+            if self.genre_button.text in genres \
+                    or self.uuid in uuids:
+                await self.refresh_genre(uuids)
+
+    # Bring the displayed genre up to date with the catalog without
+    # resetting the selection. Only the rows already sent to the browser
+    # get recomputed, and they are sent again only if they changed.
+    async def refresh_genre(self, uuids: set[str]):
+        genre_index = await self.catalog.get_genre_index(
+                self.genre_button.text, self.genre_has_subgenre)
+        if genre_index is not self.genre_index:
+            self.genre_index = genre_index
+            if self.genre_has_subgenre:
+                subgenres = genre_index.subgenres
+                self.populate_subgenre_button()
+                if not subgenres:
+                    # The genre emptied out.
+                    self.subgenre_button.text = 'Subgenre'
+                    self.rows = []
+                else:
+                    if self.subgenre_button.text not in subgenres:
+                        self.subgenre_button.text = subgenres[0]
+                    self.rows = genre_index.rows[self.subgenre_button.text]
+            else:
+                self.rows = genre_index.rows[None]
+
+            n_rows = max(self.n_rows_sent, ROWS_PER_PAGE)
+            page = self.get_page(0, n_rows)
+            if page != list(self.table.rows):
+                self.table.rows = page
+            self.n_rows_sent = len(page)
+
+        # Show the work that was displayed in its new row, or the first
+        # work if it is gone.
+        work = (self.uuid, self.work_num)
+        for index, short_metadata in enumerate(self.rows):
+            if (short_metadata.uuid, short_metadata.work_num) == work:
+                if self.uuid in uuids:
+                    await self.details_view(index)
+                break
+        else:
+            self.playback.stop()
+            if self.rows:
+                await self.details_view(0)
+            else:
+                self.clear_details()
+
+    # -Search------------------------------------------------------------------
+    async def on_search_changed(self, msg):
+        text = self.search_input.value or ''
+        searching = bool(text.strip())
+        self.table.visible = not searching
+        self.search_table.visible = searching
+        self.search_results = []
+        self.search_table.rows = []
+        self.more_button.visible = False
+        if searching:
+            await self.show_more_results()
+
+    async def on_more_button_click(self):
+        await self.show_more_results()
+
+    async def show_more_results(self):
+        text = self.search_input.value
+        results, total = await self.catalog.search(text,
+                len(self.search_results))
+        if text != self.search_input.value:
+            return  # the search text changed during the search
+
+        start = len(self.search_results)
+        self.search_results.extend(results)
+        self.search_table.add_rows([{'index': i,
+                    'title': ellipsize(result.title, 40),
+                    'genre': result.genre,
+                    'tracks': len(result.track_ids)}
+                for i, result in enumerate(results, start)])
+        self.more_button.visible = len(self.search_results) < total
+
+    async def on_search_table_row_click(self, msg):
+        result = self.search_results[msg.args[1]['index']]
+        self.playback.stop()
+        await self.show_work(result.uuid, result.work_num)
+        self.progressbar.set_value(0.0)
 
-        rows = [dict(zip(self.primary_keys, short_metadata.names))
-                for short_metadata in self.short_metadata
-                    if short_metadata.names[0] == subgenre]
-        self.table.rows = rows
-
-        self.details_view(0)
-        self.scroll_area.scroll_to(pixels=0)
-
-    def on_table_row_click(self, msg):
-        self.details_view(msg.args[2])
-        self.play_button.enable()
-        if hasattr(self, 'playbin'):
-            self.playbin.set_state(Gst.State.NULL)
-            del self.playbin
-            self.timer.cancel()
-
-        self.pause_button.disable()
+    async def on_table_row_click(self, msg):
+        self.playback.stop()
+        await self.details_view(msg.args[1]['index'])
         self.progressbar.set_value(0.0)
 
 
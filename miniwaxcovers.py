@@ -0,0 +1,123 @@
+"""Serve cover art from MiniWax in sizes that suit the browser.
+
+Covers (image-00.jpg) are often several megabytes, far more than a phone
+needs to fill the 320-pixel-wide cover image of MiniWax. cover_srcset
+creates scaled variants of a cover in COVERS_CACHE (alongside the covers
+scaled for CoverArtViewer, which get removed with them when the images of
+a recording change) and returns a srcset listing every variant with its
+width. The browser then downloads only the variant that suits its
+viewport and pixel density.
+
+GET /cover/<uuid>/<variant> serves a variant (thumb, medium, or full). The
+URLs in the srcset carry the modification time of the cover, so a URL
+never refers to different data and browsers may cache it indefinitely.
+The ETag lets a browser revalidate a cover without downloading it again.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+gi.require_version('GLib', '2.0')
+from gi.repository import GdkPixbuf, GLib
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from nicegui import app, run
+
+from common.constants import COVERS_CACHE, IMAGES
+
+# Widths in pixels of the scaled variants. The full variant is the cover
+# itself.
+VARIANT_WIDTHS = {'thumb': 160, 'medium': 640}
+VARIANTS = (*VARIANT_WIDTHS, 'full')
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def cover_path(uuid: str) -> Path:
+    return Path(IMAGES, uuid, 'image-00.jpg')
+
+# Return the path of the file for variant of the cover of uuid, creating
+# it if it does not exist or is older than the cover. A variant that would
+# be no smaller than the cover is the cover.
+def make_variant(uuid: str, variant: str) -> Path:
+    source_path = cover_path(uuid)
+    if variant == 'full':
+        return source_path
+
+    variant_width = VARIANT_WIDTHS[variant]
+    path = Path(COVERS_CACHE, uuid, f'image-00-{variant_width}w.jpg')
+    try:
+        if path.stat().st_mtime_ns >= source_path.stat().st_mtime_ns:
+            return path
+    except OSError:
+        pass
+
+    file_format, width, height = \
+            GdkPixbuf.Pixbuf.get_file_info(str(source_path))
+    if width <= variant_width:
+        return source_path
+
+    pb = GdkPixbuf.Pixbuf.new_from_file_at_scale(str(source_path),
+            variant_width, -1, True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Each request writes its own temporary file, since two requests for
+    # the same variant might both get here.
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp',
+            delete=False) as tmp_fo:
+        tmp_path = Path(tmp_fo.name)
+    try:
+        pb.savev(str(tmp_path), 'jpeg', ['quality'], ['90'])
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+# Return (src, srcset) for the cover of uuid or None if it has no cover.
+# It creates any missing variants, so call it with run.io_bound.
+def cover_srcset(uuid: str) -> tuple[str, str] | None:
+    source_path = cover_path(uuid)
+    try:
+        st = source_path.stat()
+        file_format, width, height = \
+                GdkPixbuf.Pixbuf.get_file_info(str(source_path))
+        if file_format is None:
+            return None
+
+        candidates = {}
+        for variant, variant_width in VARIANT_WIDTHS.items():
+            if variant_width < width:
+                make_variant(uuid, variant)
+                candidates[variant] = variant_width
+        candidates['full'] = width
+    except (OSError, GLib.Error):
+        return None
+
+    version = f'{st.st_mtime_ns:x}'
+    urls = {variant: f'/cover/{uuid}/{variant}?v={version}'
+            for variant in candidates}
+    srcset = ', '.join(f'{urls[variant]} {variant_width}w'
+            for variant, variant_width in candidates.items())
+    src = urls.get('medium', urls['full'])
+    return src, srcset
+
+@app.get('/cover/{uuid}/{variant}')
+async def get_cover(request: Request, uuid: str, variant: str):
+    # uuid becomes part of a path, so accept only what wax generates.
+    if not uuid.isalnum() or variant not in VARIANTS:
+        raise HTTPException(status_code=404)
+
+    try:
+        path = await run.io_bound(make_variant, uuid, variant)
+        st = path.stat()
+    except (OSError, GLib.Error):
+        raise HTTPException(status_code=404)
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type='image/jpeg', headers=headers)
@@ -0,0 +1,335 @@
+"""Play sets of tracks for MiniWax.
+
+If wax is running, MiniWax attaches to its play engine (RemotePlayback) so
+that both share one pipeline, one queue, and one position stream.
+Otherwise MiniWax plays through a PlaybackService of its own.
+connect_playback returns whichever is available. Both have the same
+interface.
+
+PlaybackService runs one GStreamer playbin in a thread of its own with a
+GLib main loop, so the pipeline delivers bus messages (stream start, EOS,
+errors) as they happen instead of MiniWax polling it for the end of a
+track. The playbin is created once and reused for every set. MiniWax gives
+the service the paths of all the tracks in a set up front (see
+resolve_track_paths) and the service queues the next one on
+about-to-finish so that tracks play without a gap.
+
+Methods called from other threads hand their work to the service thread.
+The service (or RemotePlayback) reports back by calling listener(event, *args) from the
+service thread:
+
+    'track-started', index of the track in the set
+    'position', fraction of the track played
+    'state', 'PLAYING', 'PAUSED', or 'NULL'
+    'set-finished'
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+from collections.abc import Callable
+from typing import NamedTuple
+
+import gi
+gi.require_version('Gio', '2.0')
+gi.require_version('GLib', '2.0')
+gi.require_version('Gst', '1.0')
+from gi.repository import Gio, GLib, Gst
+
+from common.constants import PLAYER_SOCKET, SOUND
+
+type TrackID = tuple[int, int]
+
+class PlayTrack(NamedTuple):
+    track_id: TrackID
+    path: str
+    duration: float  # seconds
+
+# Sound file extensions in order of decreasing quality.
+CODECS = ['.wav', '.flac', '.ogg', '.m4a', '.mp3']
+
+POSITION_INTERVAL = 500  # ms
+
+# Return the path of the highest quality sound file for each track (None
+# for a track without one). Each disc directory is read once instead of
+# probing for every codec of every track.
+def resolve_track_paths(uuid: str,
+        track_ids: list[TrackID]) -> list[str | None]:
+    best_ext = {}
+    for disc_num in {disc_num for disc_num, track_num in track_ids}:
+        disc_dir = os.path.join(SOUND, uuid, str(disc_num))
+        try:
+            file_names = os.listdir(disc_dir)
+        except OSError:
+            continue
+        for file_name in file_names:
+            stem, ext = os.path.splitext(file_name)
+            if ext not in CODECS or not stem.isdigit():
+                continue
+            track_id = (disc_num, int(stem))
+            if track_id not in best_ext \
+                    or CODECS.index(ext) < CODECS.index(best_ext[track_id]):
+                best_ext[track_id] = ext
+
+    return [os.path.join(SOUND, uuid, str(disc_num),
+                f'{track_num:02d}{best_ext[(disc_num, track_num)]}')
+                    if (disc_num, track_num) in best_ext else None
+            for disc_num, track_num in track_ids]
+
+class PlaybackService(threading.Thread):
+    def __init__(self, listener: Callable[..., None]):
+        super().__init__(name='playback', daemon=True)
+        self.listener = listener
+
+        self.context = GLib.MainContext()
+        self.loop = GLib.MainLoop(self.context)
+
+        self.paths: list[str] = []
+        self.track_index = -1
+
+        # The index of the track whose uri was given to playbin last. It
+        # becomes track_index when playbin actually starts the track.
+        self.queued_index = -1
+
+        self.state = 'NULL'
+        self.position_source = None
+
+        # Wait for the thread to create the pipeline so that commands never
+        # arrive before there is a playbin to execute them.
+        self.ready = threading.Event()
+        self.start()
+        self.ready.wait()
+
+    def run(self):
+        # Sources created in this thread (notably the bus watch) attach to
+        # the context of this thread's loop.
+        self.context.push_thread_default()
+
+        Gst.init(None)
+        self.playbin = playbin = Gst.ElementFactory.make('playbin', None)
+        playbin.connect('about-to-finish', self.on_about_to_finish)
+
+        bus = playbin.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message::stream-start', self.on_stream_start)
+        bus.connect('message::eos', self.on_eos)
+        bus.connect('message::error', self.on_error)
+
+        self.ready.set()
+        self.loop.run()
+
+    # Run function(*args) in the service thread.
+    def call(self, function, *args):
+        def callback(*ignore):
+            function(*args)
+            return GLib.SOURCE_REMOVE
+        source = GLib.idle_source_new()
+        source.set_callback(callback)
+        source.attach(self.context)
+
+    # -Commands----------------------------------------------------------------
+    def play_set(self, uuid: str, tracks: list[PlayTrack], volume: float):
+        paths = [track.path for track in tracks]
+        self.call(self._play_set, paths, volume)
+
+    def pause(self):
+        self.call(self._pause)
+
+    def stop(self):
+        self.call(self._stop)
+
+    def set_volume(self, volume: float):
+        self.call(self.playbin.set_property, 'volume', volume)
+
+    def _play_set(self, paths, volume):
+        self._stop()
+        if not paths:
+            return
+
+        self.paths = paths
+        self.queue_track(0)
+        self.playbin.set_property('volume', volume)
+        self.set_state('PLAYING')
+        self.start_position_updates()
+
+    # Toggle between PLAYING and PAUSED.
+    def _pause(self):
+        match self.state:
+            case 'PLAYING':
+                self.stop_position_updates()
+                self.set_state('PAUSED')
+            case 'PAUSED':
+                self.set_state('PLAYING')
+                self.start_position_updates()
+
+    def _stop(self):
+        self.stop_position_updates()
+        if self.state != 'NULL':
+            self.set_state('NULL')
+        self.track_index = self.queued_index = -1
+
+    # -Pipeline----------------------------------------------------------------
+    def queue_track(self, index):
+        uri = Gio.File.new_for_path(self.paths[index]).get_uri()
+        self.playbin.set_property('uri', uri)
+        self.queued_index = index
+
+    def set_state(self, state):
+        self.playbin.set_state(getattr(Gst.State, state))
+        self.state = state
+        self.listener('state', state)
+
+    def on_about_to_finish(self, playbin):
+        # about-to-finish occurs in a streaming thread about 1.3s before the
+        # end of the track. Setting the uri now lets playbin continue
+        # seamlessly with the next track.
+        next_index = self.queued_index + 1
+        if next_index < len(self.paths):
+            self.queue_track(next_index)
+
+    def on_stream_start(self, bus, msg):
+        # playbin posts stream-start when it begins playing each track,
+        # including the ones it switches to without a gap.
+        self.track_index = self.queued_index
+        self.listener('track-started', self.track_index)
+
+    def on_eos(self, bus, msg):
+        self._stop()
+        self.listener('set-finished')
+
+    def on_error(self, bus, msg):
+        print('on_error():', msg.parse_error(), file=sys.stderr)
+        self._stop()
+        self.listener('set-finished')
+
+    def start_position_updates(self):
+        self.stop_position_updates()
+        self.position_source = source = GLib.timeout_source_new(
+                POSITION_INTERVAL)
+        source.set_callback(self.on_position_timeout)
+        source.attach(self.context)
+
+    def stop_position_updates(self):
+        if self.position_source is not None:
+            self.position_source.destroy()
+            self.position_source = None
+
+    def on_position_timeout(self, *ignore):
+        success_p, position = self.playbin.query_position(Gst.Format.TIME)
+        success_d, duration = self.playbin.query_duration(Gst.Format.TIME)
+        if success_p and success_d and duration > 0:
+            self.listener('position', position / duration)
+        return GLib.SOURCE_CONTINUE
+
+
+# RemotePlayback controls the play engine of wax through PLAYER_SOCKET (see
+# player.engine). It translates the replies of the engine to the events of
+# PlaybackService. Events about the set in the engine get reported only
+# while the set is the one that RemotePlayback queued.
+class RemotePlayback:
+    def __init__(self, listener: Callable[..., None]):
+        self.listener = listener
+        self.track_ids: list[TrackID] = []
+        self.state = 'NULL'
+        self.controller = None
+        self.own_set = False
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(str(PLAYER_SOCKET))
+        self.send_lock = threading.Lock()
+
+        self.reader = threading.Thread(target=self.read_replies,
+                name='playback', daemon=True)
+        self.reader.start()
+
+    def do(self, *args):
+        with self.send_lock:
+            self.socket.sendall(f'{json.dumps(args)}\n'.encode())
+
+    # -Commands----------------------------------------------------------------
+    def play_set(self, uuid: str, tracks: list[PlayTrack], volume: float):
+        self.track_ids = [track.track_id for track in tracks]
+
+        self.do('stop')
+        self.do('clear-queue')
+        self.do('random', False)
+        for track in tracks:
+            self.do('append-queue', uuid, track.track_id, track.duration * 1e9)
+        self.do('ready-play')
+        self.do('volume', volume)
+        self.do('play')
+
+    # Toggle between PLAYING and PAUSED.
+    def pause(self):
+        match self.state:
+            case 'PLAYING':
+                self.do('pause')
+            case 'PAUSED':
+                self.do('play')
+
+    def stop(self):
+        if self.own_set:
+            self.do('stop')
+
+    def set_volume(self, volume: float):
+        self.do('volume', volume)
+
+    # -Replies-----------------------------------------------------------------
+    def read_replies(self):
+        try:
+            with self.socket.makefile('r') as fo:
+                for line in fo:
+                    # Skip a partial line or a reply that is not a list
+                    # (json.JSONDecodeError is a ValueError).
+                    try:
+                        reply, *args = json.loads(line)
+                    except (ValueError, TypeError):
+                        print('read_replies(): bad reply:', repr(line),
+                                file=sys.stderr)
+                        continue
+                    self.on_reply(reply, args)
+        except OSError as e:
+            # The connection broke (the engine died).
+            print('read_replies():', e, file=sys.stderr)
+        finally:
+            # The engine exited (wax quit) or can no longer be reached.
+            self.state = 'NULL'
+            self.listener('state', 'NULL')
+            if self.own_set:
+                self.own_set = False
+                self.listener('set-finished')
+
+    def on_reply(self, reply, args):
+        match reply:
+            case 'hello':
+                self.controller, = args
+            case 'controller':
+                controller, = args
+                lost_set = self.own_set and controller != self.controller
+                self.own_set = (controller == self.controller)
+                if lost_set:
+                    self.listener('set-finished')
+            case 'state':
+                self.state, = args
+                self.listener('state', self.state)
+            case 'track-started' if self.own_set:
+                track_duration, more_tracks, *track_id = args
+                if (track_id := tuple(track_id)) in self.track_ids:
+                    self.listener('track-started',
+                            self.track_ids.index(track_id))
+            case 'position' if self.own_set:
+                track_position, track_duration, *set_args = args
+                if track_duration > 0:
+                    self.listener('position', track_position / track_duration)
+            case 'set-finished' if self.own_set:
+                self.listener('set-finished')
+
+# Attach to the play engine of wax if it is running; otherwise play locally.
+def connect_playback(listener: Callable[..., None]
+        ) -> RemotePlayback | PlaybackService:
+    try:
+        return RemotePlayback(listener)
+    except OSError:
+        return PlaybackService(listener)
@@ -0,0 +1,167 @@
+"""Serve sound files from MiniWax so that browsers can play them.
+
+GET /sound/<uuid>/<disc_num>/<track_num> returns the highest quality sound
+file of the track. FileResponse honors Range requests (so a browser can
+seek without downloading the whole file) and, with ASGI servers that
+support the pathsend extension, hands the file to the server to send
+without copying it through Python.
+
+GET /sound/<uuid>/<disc_num>/<track_num>?format=opus returns lossless
+files (WAV, FLAC) transcoded to Opus, which is much smaller for listeners
+on slow connections. Other files are returned as they are. A Transcode
+runs the transcoder for a track into a temporary file in OPUS_CACHE, which
+replaces the cached file once transcoding completes. Requests for the
+track in the meantime all stream from the temporary file as it grows, so
+there is only one transcoder per track. At most MAX_TRANSCODERS
+transcoders run at a time; further transcodes wait for one to finish. A
+transcoder runs to completion even if its listeners go away, and it holds
+its place among the MAX_TRANSCODERS only while it runs, not while slow
+listeners read. Later requests (including Range requests) are served from
+OPUS_CACHE.
+"""
+
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from nicegui import app
+
+from common.constants import CACHE
+from miniwaxplayer import resolve_track_paths
+
+OPUS_CACHE = Path(CACHE, 'opus')
+
+MAX_TRANSCODERS = 2
+transcoders = asyncio.Semaphore(MAX_TRANSCODERS)
+
+CHUNK_SIZE = 64 * 1024
+
+LOSSLESS_EXT = ('.wav', '.flac')
+
+MEDIA_TYPES = {
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+    '.m4a': 'audio/mp4',
+    '.mp3': 'audio/mpeg',
+    '.opus': 'audio/ogg',
+}
+
+@app.get('/sound/{uuid}/{disc_num}/{track_num}')
+async def get_sound(uuid: str, disc_num: int, track_num: int,
+        format: str | None = None):
+    # uuid becomes part of a path, so accept only what wax generates.
+    if not uuid.isalnum():
+        raise HTTPException(status_code=404)
+
+    path, = resolve_track_paths(uuid, [(disc_num, track_num)])
+    if path is None:
+        raise HTTPException(status_code=404)
+
+    ext = os.path.splitext(path)[1]
+    if format == 'opus' and ext in LOSSLESS_EXT:
+        opus_path = Path(OPUS_CACHE, uuid, str(disc_num),
+                f'{track_num:02d}.opus')
+        if not is_current(opus_path, path):
+            transcode = in_flight.get(opus_path) \
+                    or Transcode(path, opus_path)
+            # Open the file now: once transcoding completes, it gets
+            # renamed (and it gets removed if transcoding fails).
+            return StreamingResponse(transcode.stream(transcode.open()),
+                    media_type=MEDIA_TYPES['.opus'])
+        path, ext = str(opus_path), '.opus'
+
+    return FileResponse(path, media_type=MEDIA_TYPES[ext])
+
+# A transcoded file is current if it is newer than its source.
+def is_current(opus_path: Path, source_path: str) -> bool:
+    try:
+        return opus_path.stat().st_mtime_ns >= \
+                os.stat(source_path).st_mtime_ns
+    except OSError:
+        return False
+
+# The Transcodes still running, by the path of the file they produce.
+in_flight: dict[Path, 'Transcode'] = {}
+
+# Transcode the sound file at source_path to opus_path. The output goes to a
+# temporary file of its own (so a failed transcode cannot clobber another
+# one) that replaces opus_path only if the transcoder succeeds.
+class Transcode:
+    def __init__(self, source_path: str, opus_path: Path):
+        self.opus_path = opus_path
+        opus_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_fn = tempfile.mkstemp(suffix='.part', dir=opus_path.parent)
+        self.tmp_path = Path(tmp_fn)
+        self.tmp_fo = os.fdopen(fd, 'wb')
+
+        # The number of bytes written so far and whether the transcoder
+        # has finished (successfully or not).
+        self.size = 0
+        self.done = False
+        self.changed = asyncio.Condition()
+
+        in_flight[opus_path] = self
+        self.task = asyncio.create_task(self.run(source_path))
+
+    async def run(self, source_path: str):
+        succeeded = False
+        try:
+            async with transcoders:
+                process = await asyncio.create_subprocess_exec(
+                        'gst-launch-1.0', '-q',
+                        'filesrc', f'location={source_path}', '!',
+                        'decodebin', '!', 'audioconvert', '!',
+                        'audioresample', '!',
+                        'opusenc', 'bitrate=128000', '!', 'oggmux', '!',
+                        'fdsink', 'fd=1',
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.DEVNULL)
+                try:
+                    while chunk := await process.stdout.read(CHUNK_SIZE):
+                        self.tmp_fo.write(chunk)
+                        self.tmp_fo.flush()
+                        self.size += len(chunk)
+                        await self.notify()
+                    succeeded = (await process.wait() == 0)
+                finally:
+                    if process.returncode is None:
+                        process.kill()
+                        await process.wait()
+        finally:
+            # Leave in_flight and move the file in one step so that a
+            # request finds either the Transcode or the cached file.
+            self.tmp_fo.close()
+            del in_flight[self.opus_path]
+            if succeeded:
+                os.replace(self.tmp_path, self.opus_path)
+            else:
+                self.tmp_path.unlink(missing_ok=True)
+            self.done = True
+            await self.notify()
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    def open(self):
+        return open(self.tmp_path, 'rb', buffering=0)
+
+    # Yield the data in tmp_fo (opened by open) as the transcoder writes it.
+    async def stream(self, tmp_fo):
+        with tmp_fo:
+            position = 0
+            while True:
+                if position < self.size:
+                    chunk = tmp_fo.read(min(CHUNK_SIZE, self.size - position))
+                    position += len(chunk)
+                    yield chunk
+                elif self.done:
+                    return
+                else:
+                    async with self.changed:
+                        await self.changed.wait_for(
+                                lambda: self.done or self.size > position)
@@ -2,6 +2,14 @@
 The play engine is a subprocess for playing a sound file using GStreamer.
 PlayEngineLauncher starts it. It receives commands from PlayEngineLauncher
 over stdin and sends messages back over stdout.
+
+Other controllers (MiniWax) can connect to the engine at SOCKET. They send
+the same commands and receive the same replies as the launcher, so all
+controllers share one pipeline and one queue. Before set-ready, the engine
+sends a controller reply identifying the controller that queued the set
+(LAUNCHER for the launcher); each other controller learns its own number
+from a hello reply when it connects. Replies to these controllers are
+written asynchronously; one that stops reading them gets dropped.
 """
 
 import os
@@ -32,6 +40,17 @@ type TrackID = tuple[int, int]
 
 SOUND = Path('recordings', 'sound')
 
+# Same as PLAYER_SOCKET in common.constants (engine runs as a script, so it
+# cannot import common).
+SOCKET = Path('.config', 'player.sock')
+
+# The controller number of PlayEngineLauncher.
+LAUNCHER = 0
+
+# A controller that falls this many bytes of replies behind has stopped
+# reading, so the engine drops it.
+MAX_BACKLOG = 64 * 1024
+
 # Decorator to register methods that respond to commands from player.
 command_map = {}
 def command(f):
@@ -40,6 +59,19 @@ def command(f):
     return f
 
 
+# A controller connected at SOCKET. Replies go out asynchronously so that a
+# controller that stops reading cannot block the main loop of the engine
+# (and with it play and the replies to the launcher). outgoing holds the
+# replies not yet written; writing is whether a write is in progress.
+class Controller:
+    def __init__(self, connection):
+        self.connection = connection
+        self.output_stream = connection.get_output_stream()
+        self.cancellable = Gio.Cancellable()
+        self.outgoing = bytearray()
+        self.writing = False
+
+
 class PlayEngine:
     def __init__(self):
         Gst.init(None)
@@ -64,15 +96,58 @@ class PlayEngine:
 
         input_stream = Gio.UnixInputStream.new(0, True)
         self.data_input_stream = Gio.DataInputStream.new(input_stream)
-        self.queue_read()
+        self.queue_read(self.data_input_stream, LAUNCHER)
+
+        # controllers maps the number of each connected controller to its
+        # Controller.
+        self.controllers = {}
+        self.n_controllers = 0
+        self.controller = self.owner = LAUNCHER
+        self.start_socket_service()
 
         self.loop = GLib.MainLoop()
         self.loop.run()
 
     def on_signal(self, signal, frame):
         self.cancellable.cancel()
+        self.socket_service.stop()
+        SOCKET.unlink(missing_ok=True)
         self.loop.quit()
 
+    def start_socket_service(self):
+        SOCKET.unlink(missing_ok=True)
+        self.socket_service = Gio.SocketService()
+        address = Gio.UnixSocketAddress.new(str(SOCKET))
+        try:
+            self.socket_service.add_address(address, Gio.SocketType.STREAM,
+                    Gio.SocketProtocol.DEFAULT, None)
+        except GLib.Error as e:
+            # Play still works from the launcher.
+            print('start_socket_service():', e, file=sys.stderr)
+            return
+        self.socket_service.connect('incoming', self.on_incoming)
+        self.socket_service.start()
+
+    def on_incoming(self, socket_service, connection, source_object):
+        self.n_controllers += 1
+        controller = self.n_controllers
+
+        self.controllers[controller] = Controller(connection)
+        self.send_to(controller, 'hello', controller)
+
+        data_input_stream = Gio.DataInputStream.new(
+                connection.get_input_stream())
+        self.queue_read(data_input_stream, controller)
+        return True
+
+    def drop_controller(self, controller):
+        ctl = self.controllers.pop(controller)
+        ctl.cancellable.cancel()
+
+        # Close the socket itself, which works even while a read or a
+        # write on the connection is pending.
+        ctl.connection.get_socket().close()
+
     def on_error(self, bus, msg):
         print('on_error():', msg.parse_error(), file=sys.stderr)
         self.playbin.set_state(Gst.State.NULL)
@@ -198,24 +273,80 @@ class PlayEngine:
         success, position = self.playbin.query_position(Gst.Format.TIME)
         return position
 
-    def queue_read(self):
-        self.data_input_stream.read_line_async(GLib.PRIORITY_DEFAULT,
-                self.cancellable, self.on_command_in)
+    def queue_read(self, data_input_stream, controller):
+        data_input_stream.read_line_async(GLib.PRIORITY_DEFAULT,
+                self.cancellable, self.on_command_in, controller)
 
+    # Send the reply to every controller.
     def send_reply(self, *message):
         text = json.dumps(message)
         print(text, flush=True)
+        for controller in list(self.controllers):
+            self.send_to(controller, *message)
+
+    def send_to(self, controller, *message):
+        ctl = self.controllers[controller]
+        ctl.outgoing += (json.dumps(message) + '\n').encode()
+        if len(ctl.outgoing) > MAX_BACKLOG:
+            print(f'send_to(): dropping controller {controller} '
+                    f'(not reading)', file=sys.stderr)
+            self.drop_controller(controller)
+        elif not ctl.writing:
+            self.write_outgoing(controller)
+
+    def write_outgoing(self, controller):
+        ctl = self.controllers[controller]
+        ctl.writing = True
+        data = GLib.Bytes.new(bytes(ctl.outgoing))
+        ctl.output_stream.write_bytes_async(data, GLib.PRIORITY_DEFAULT,
+                ctl.cancellable, self.on_outgoing_written, controller)
+
+    def on_outgoing_written(self, output_stream, result, controller):
+        try:
+            n_written = output_stream.write_bytes_finish(result)
+        except GLib.Error:
+            n_written = None
+
+        # The controller might have been dropped while the write was
+        # pending.
+        if controller not in self.controllers:
+            return
+        if n_written is None:
+            self.drop_controller(controller)
+            return
+
+        ctl = self.controllers[controller]
+        del ctl.outgoing[:n_written]
+        ctl.writing = False
+        if ctl.outgoing:
+            self.write_outgoing(controller)
 
     # -Command handlers--------------------------------------------------------
-    def on_command_in(self, source, result):
-        line, length = source.read_line_finish_utf8(result)
+    def on_command_in(self, source, result, controller):
+        try:
+            line, length = source.read_line_finish_utf8(result)
+        except GLib.Error:
+            line = None
         if not line:
+            # A controller that disconnects does not affect play.
+            if controller in self.controllers:
+                self.drop_controller(controller)
             return
 
         command, *args = json.loads(line)
+        self.controller = controller
         command_map[command](self, *args)
 
-        self.queue_read()
+        self.queue_read(source, controller)
+
+    # EngineLauncher (with metrics on) follows each command with a ping to
+    # time its round trip. Only the controller that pinged gets the pong.
+    @command
+    def on_ping(self, seq):
+        if self.controller == LAUNCHER:
+            print(json.dumps(('pong', seq)), flush=True)
+        elif self.controller in self.controllers:
+            self.send_to(self.controller, 'pong', seq)
 
     @command
     def on_append_queue(self, uuid, trackid: TrackID, duration: float):
@@ -223,6 +354,8 @@ class PlayEngine:
 
     @command
     def on_ready_play(self):
+        self.send_reply('controller', self.owner)
+
         self.set_duration = sum(map(attrgetter('duration'), self.tracks))
         set_duration = self._convert_to_secs(self.set_duration)
         self.send_reply('set-ready', *set_duration)
@@ -282,6 +415,9 @@ class PlayEngine:
         self.tracks = []
         self.segment_start = 0.0
 
+        # The set that gets queued next belongs to this controller.
+        self.owner = self.controller
+
     @command
     def on_volume(self, value):
         self.playbin.set_property('volume', float(value))
@@ -33,6 +33,11 @@ def reply(f):
     reply_map[reply] = f
     return f
 
+# Replies about the set in the engine. They concern us only if we queued
+# the set (another controller, such as MiniWax, might have replaced it).
+SET_REPLIES = {'set-ready', 'set-finished', 'position',
+        'track-started', 'track-finished'}
+
 
 class Player(GObject.Object):
     @GObject.Signal
@@ -70,6 +75,7 @@ class Player(GObject.Object):
         self.do = self.play_engine_launcher.send_command
         self.state = 'NULL'
         self.set_ready = False
+        self.own_set = True
 
         playqueue_model.connect('row-inserted',
                 self.on_playqueue_model_row_inserted)
@@ -130,6 +136,9 @@ class Player(GObject.Object):
 
     def on_play_button_clicked(self, button):
         if button.state == State.STOP:
+            # Take the engine back from another controller.
+            if not self.own_set and len(playqueue_model):
+                self.queue_tracks_of_first_set()
             self.do('play')
         else:
             self.do('pause')
@@ -183,8 +192,15 @@ class Player(GObject.Object):
 
     # -Reply handlers----------------------------------------------------------
     def reply_handler(self, command, args):
+        if command in SET_REPLIES and not self.own_set:
+            return
         reply_map[command](self, *args)
 
+    @reply
+    def on_controller(self, controller):
+        # The engine identifies the launcher (us) as controller 0.
+        self.own_set = (controller == 0)
+
     @reply
     def on_position(self, track_position: float, track_duration: float,
             set_position: float, set_duration: float):
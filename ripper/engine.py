@@ -174,6 +174,12 @@ class Ripper:
 
         self.queue_read()
 
+    # EngineLauncher (with metrics on) follows each command with a ping to
+    # time its round trip.
+    @command
+    def on_ping(self, seq):
+        self.send_reply('pong', seq)
+
     @command
     def on_rip(self, uuid, disc_num):
         self.uuid = uuid
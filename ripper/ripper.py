@@ -19,6 +19,7 @@ from mutagen import id3
 from common.connector import register_connect_request
 from common.constants import IMAGES, DOCUMENTS, SOUND, TRANSFER
 from common.enginelauncher import EngineLauncher
+from common.metrics import ENABLED as METRICS_ENABLED, count, observe
 from common.utilities import debug
 from widgets import options_button
 
@@ -295,6 +296,7 @@ class Ripper(GObject.Object):
 
     @reply
     def on_rip_track_started(self, uuid, n_tracks, track_num):
+        self.track_started_time = time.perf_counter()
         self.emit('rip-track-started', uuid, n_tracks, track_num)
 
     @reply
@@ -303,8 +305,23 @@ class Ripper(GObject.Object):
 
     @reply
     def on_rip_track_finished(self, uuid, disc_num, track_num):
+        if METRICS_ENABLED:
+            self.observe_rip_throughput(uuid, disc_num, track_num)
         self.emit('rip-track-finished', uuid, disc_num, track_num)
 
+    # Record the time to rip the track and the rate at which the engine
+    # wrote the FLAC file.
+    def observe_rip_throughput(self, uuid, disc_num, track_num):
+        elapsed = time.perf_counter() - self.track_started_time
+        track_path = Path(SOUND, uuid, str(disc_num), f'{track_num:02d}.flac')
+        try:
+            n_bytes = track_path.stat().st_size
+        except OSError:
+            return
+        count('rip.tracks')
+        observe('rip.track_seconds', elapsed)
+        observe('rip.kbytes_per_second', n_bytes / 1024 / elapsed)
+
     @reply
     def on_rip_finished(self):
         self.emit('rip-finished')
@@ -2,21 +2,30 @@
 
 import signal
 
-import gi
-gi.require_version('Gio', '2.0')
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, Gio
+from common.startuptrace import trace, report as report_startup_trace
+
+with trace('import gtk'):
+    import gi
+    gi.require_version('Gio', '2.0')
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, Gdk, Gio, GLib
 
 import common.initlogging
+from common.changelog import ChangeLogger
 from common.config import config
 from common.connector import traverse_widgets, connect_signals
 from common.connector import getattr_from_obj_with_name
+from common.playlog import play_log
+from common.thumbnailatlas import thumbnail_atlas
 from common.utilities import debug
-from widgets import top_widget
+with trace('import widgets'):
+    from widgets import top_widget
 
 # Top widgets:
-from player import player
-from ripper import ripper
+with trace('import player'):
+    from player import player
+with trace('import ripper'):
+    from ripper import ripper
 from widgets import control_panel
 
 # Make pickle happy:
@@ -45,12 +54,24 @@ class Wax(Gtk.Window):
 
         self.add(top_widget)
 
-        traverse_widgets([self, control_panel, player, ripper])
-        connect_signals()
+        # Record changes to the catalog for MiniWax.
+        self.changelogger = ChangeLogger()
+
+        with trace('traverse widgets'):
+            traverse_widgets([self, control_panel, player, ripper])
+        with trace('connect signals'):
+            connect_signals()
 
         # Do not initialize the genre selector until we finish configuring
         # the entire GUI.
-        getattr_from_obj_with_name('genre-button.init')()
+        with trace('initialize genre'):
+            getattr_from_obj_with_name('genre-button.init')()
+
+        # Bring the thumbnail atlas up to date in the background.
+        thumbnail_atlas.refresh()
+
+        # The startup trace (if requested) goes out once the window is up.
+        GLib.idle_add(report_startup_trace)
 
     def on_destroy(self, window):
         self.quit()
@@ -59,9 +80,11 @@ class Wax(Gtk.Window):
         self.quit()
 
     def quit(self):
+        play_log.compact_if_due()
         Gtk.main_quit()
 
 Gtk.init(None)
-wax = Wax()
+with trace('construct window'):
+    wax = Wax()
 Gtk.main()
 
@@ -1,5 +1,7 @@
 """Specify the sections of the main display."""
 
+from common.startuptrace import trace
+
 # Control panel.
 from .controlpanel import optionsbutton
 options_button = optionsbutton.OptionsButton()
@@ -9,18 +11,21 @@ control_panel = controlpanel.ControlPanel()
 
 
 # Select mode.
-from .select.left import select_left
-from .select.right import select_right
+with trace('Select mode'):
+    from .select.left import select_left
+    from .select.right import select_right
 
 
 # Play mode.
-from .play.left import play_left
-from .play.right import play_right
+with trace('Play mode'):
+    from .play.left import play_left
+    from .play.right import play_right
 
 
 # Edit mode.
-from .edit.left import edit_left
-from .edit.right import edit_right
+with trace('Edit mode'):
+    from .edit.left import edit_left
+    from .edit.right import edit_right
 
 
 # Create the top widget using the preceding imports.
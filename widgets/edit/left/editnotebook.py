@@ -14,13 +14,15 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib, GObject
 
 import widgets.edit.left.tagextractors as tagextractors
+from common.completers import completers
 from common.config import config
 from common.connector import register_connect_request
 from common.connector import getattr_from_obj_with_name
 from common.constants import SHORT, LONG
 from common.constants import SOUND, DOCUMENTS, IMAGES
-from common.constants import COMPLETERS
 from common.descriptors import QuietProperty
+from common.playlog import play_log
+from common.startuptrace import trace
 from common.types import RecordingTuple, WorkTuple
 from common.types import NameGroup, MetadataItem, MetadataItem_LongShort
 from common.types import TrackTuple, TrackID, GroupTuple
@@ -74,7 +76,8 @@ class EditNotebook(Gtk.Notebook):
                 ['work', 'tracks', 'images', 'docs', 'properties', 'files']
         for page_name in page_names:
             qual_name = f'widgets.edit.left.pages.{page_name}'
-            page = importlib.import_module(qual_name)
+            with trace(f'page {qual_name}'):
+                page = importlib.import_module(qual_name)
             pages[page_name] = page
             page_widget = page.page_widget
             self.append_page(page_widget)
@@ -579,35 +582,29 @@ class EditNotebook(Gtk.Notebook):
             if not any(value):
                 continue
 
-            completer_fn = Path(COMPLETERS, key)
-            if not completer_fn.is_file():
+            completer = completers.get(key)
+            if completer is None:
                 continue
             if not config.completers[key][1]:
                 continue
 
             names = list(value)
-            with open(completer_fn, 'r', encoding='utf-8') as completer_fo:
-                lines = completer_fo.read().splitlines()
 
             self.learning = False
-            for name in set(names) - set(lines):
+            for name in {name for name in names if name not in completer}:
                 dialog = LearnDialog(self)
-                dialog.set_messages(key, name, len(lines))
+                dialog.set_messages(key, name, len(completer))
                 match dialog.run():
                     case Gtk.ResponseType.YES:
-                        lines.append(name)
+                        completer.append(name)
                         self.learning = True
                     case Gtk.ResponseType.CANCEL:
                         pass
                     case Gtk.ResponseType.REJECT:
-                        with config.modify('completers') as completers:
-                            enabled, learn = completers[key]
-                            completers[key] = (enabled, False)
+                        with config.modify('completers') as completers_config:
+                            enabled, learn = completers_config[key]
+                            completers_config[key] = (enabled, False)
                 dialog.destroy()
-            if self.learning:
-                with open(completer_fn, 'w', encoding='utf-8') as completer_fo:
-                    completer_fo.write('\n'.join(lines))
-                    completer_fo.write('\n')
 
     def delete_long_metadata(self, uuid):
         with shelve.open(LONG, 'w') as recording_shelf:
@@ -673,9 +670,13 @@ class EditNotebook(Gtk.Notebook):
         # Replace the metadata file with the tmp file.
         tmp_path.rename(short_path)
 
+    # LONG gets the plays that play_log has pending for the recording (see
+    # PlayLog.refresh), so they are no longer pending.
     def write_long_metadata(self, recording):
+        recording = play_log.refresh(recording, self.work_num)
         with shelve.open(LONG, 'w') as recording_shelf:
             recording_shelf[recording.uuid] = recording
+        play_log.reset(recording.uuid)
 
     def write_short_metadata(self, work_short, genre, uuid, work_num):
         # Read pickles from the short metadata file and write them to
@@ -1,7 +1,8 @@
 """A form for acquiring cover art images."""
 
+import hashlib
 import re
-from contextlib import chdir
+from contextlib import chdir, suppress
 from enum import Enum
 from pathlib import Path
 
@@ -21,6 +22,7 @@ from common.decorators import emission_stopper
 from common.descriptors import QuietProperty
 from common.initlogging import logger
 from common.musicbrainz import MBQuery, MusicBrainzError
+from common.pixbufcache import thumbnail_cache
 from common.utilities import debug
 from ripper import ripper
 from widgets import options_button
@@ -41,6 +43,9 @@ class Provenance(Enum):
             p = Provenance(p)
         return p.name.lower()
 
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
 # It is a shame that Gdk.Rectangle does not provide a method for
 # instantiating a rectangle with specific values for its attributes.
 class Rectangle(Gdk.Rectangle):
@@ -216,6 +221,7 @@ class ImagesEditor(Gtk.Box):
         self.queue_images_changed_message()
 
     @Gtk.Template.Callback()
+    @emission_stopper('row-changed')
     def on_images_liststore_row_changed(self, model, path, treeiter):
         if path[0] == 0:
             image_pb = self.images_liststore[0][0]
@@ -253,19 +259,26 @@ class ImagesEditor(Gtk.Box):
         with stop_emission(self.images_liststore, 'row-deleted'):
             self.images_liststore.clear()
 
-        # Collect all image and thumbnail files.
-        pb_iter_pair = []
-        for image_class in ('image', 'thumbnail'):
-            images_dir = Path(IMAGES, uuid)
-            pattern = f'{image_class}-??.jpg'
-            files_iter = map(str, images_dir.glob(pattern))
-            pb_iter = map(GdkPixbuf.Pixbuf.new_from_file, sorted(files_iter))
-            pb_iter_pair.append(pb_iter)
-
-        # pb_iter_pair contains two iterators, one for 'image' and one for
-        # 'thumbnail'. The zip pairs an image with a thumbnail in a tuple.
-        for i, pb_pair in enumerate(zip(*pb_iter_pair)):
-            row = (*pb_pair, Provenance.SAVED.value, i, -1)
+        # Remember the name and content hash of the file whence each image
+        # came so that write_images can keep the files of images that did
+        # not change instead of encoding them again.
+        images_dir = Path(IMAGES, uuid)
+        for i, image_path in enumerate(sorted(images_dir.glob('image-??.jpg'))):
+            image_data = image_path.read_bytes()
+            pb = self._load_pixbuf(image_data)
+
+            # The thumbnail of an image saved just now might still be in
+            # preparation (see write_images).
+            thumbnail_path = image_path.with_name(
+                    image_path.name.replace('image', 'thumbnail'))
+            try:
+                thumbnail = GdkPixbuf.Pixbuf.new_from_file(str(thumbnail_path))
+            except GLib.Error:
+                thumbnail = pb.scale_simple(*THUMBNAIL_SIZE,
+                        GdkPixbuf.InterpType.BILINEAR)
+
+            row = (pb, thumbnail, Provenance.SAVED.value, i, -1,
+                    image_path.name, content_hash(image_data))
             self.images_liststore.append(row)
 
         # Display the first image.
@@ -279,7 +292,7 @@ class ImagesEditor(Gtk.Box):
             self.image.display_pb(None)
             return
 
-        pb, pb_scaled, prov_value, _, _ = self.images_liststore[0]
+        pb, pb_scaled, prov_value, *_ = self.images_liststore[0]
         self.image.display_pb(pb)
         self.image_provenance_label.set_text(Provenance.get_label(prov_value))
 
@@ -288,17 +301,71 @@ class ImagesEditor(Gtk.Box):
         self.image_download_button.set_sensitive(True)
 
     def write_images(self, uuid):
-        # Some images might have been deleted from images_liststore
-        # after the recording was saved, so delete all existing image
-        # files and save the ones in images_liststore that survive.
-        with chdir(Path(IMAGES, uuid)):
+        # Images that came from a file that is still present with the same
+        # content keep that file (renamed, if the image moved). JPEG is
+        # lossy, so encoding an image again would degrade it. Only new
+        # images get encoded. Some images might have been deleted from
+        # images_liststore after the recording was saved, so delete any
+        # file that no image claims.
+        images_dir = Path(IMAGES, uuid)
+        new_thumbnails = []
+        with chdir(images_dir):
+            # Move the files to keep out of the way first so that renaming
+            # one does not clobber another.
+            kept = {}
+            for row_index, row in enumerate(self.images_liststore):
+                saved_name, saved_hash = row[5], row[6]
+                if saved_name and self._is_unchanged(saved_name, saved_hash):
+                    for size in ('image', 'thumbnail'):
+                        old_path = Path(saved_name.replace('image', size))
+                        if old_path.exists():
+                            old_path.rename(f'{old_path}.keep')
+                    kept[row_index] = saved_name
+
             for file_path in Path('.').iterdir():
-                file_path.unlink()
+                if file_path.suffix != '.keep':
+                    file_path.unlink()
+
+            with stop_emission(self.images_liststore, 'row-changed'):
+                for row_index, row in enumerate(self.images_liststore):
+                    new_name = f'image-{row_index:02d}.jpg'
+                    if row_index in kept:
+                        for size in ('image', 'thumbnail'):
+                            keep_path = Path(
+                                kept[row_index].replace('image', size)
+                                + '.keep')
+                            if keep_path.exists():
+                                keep_path.rename(
+                                        new_name.replace('image', size))
+                            else:
+                                new_thumbnails.append((new_name, row[1]))
+                    else:
+                        row[0].savev(new_name, 'jpeg', [], [])
+                        row[6] = content_hash(Path(new_name).read_bytes())
+                        new_thumbnails.append((new_name, row[1]))
+                    row[5] = new_name
+
+        # The thumbnails of new images are already in images_liststore, so
+        # encode them in the background.
+        def write_thumbnails():
+            for image_name, thumbnail in new_thumbnails:
+                thumbnail_name = image_name.replace('image', 'thumbnail')
+                with suppress(GLib.Error):
+                    thumbnail.savev(str(Path(images_dir, thumbnail_name)),
+                            'jpeg', [], [])
+
+            # The cover thumbnail might have changed.
+            thumbnail_cache.invalidate(uuid)
+        if new_thumbnails:
+            GLib.idle_add(write_thumbnails)
+        else:
+            thumbnail_cache.invalidate(uuid)
 
-            for row_index, row in enumerate(self.images_liststore):
-                for i, size in enumerate(('image', 'thumbnail')):
-                    new_path = Path(f'{size}-{row_index:02d}.jpg')
-                    row[i].savev(str(new_path), 'jpeg', [], [])
+    def _is_unchanged(self, saved_name, saved_hash):
+        try:
+            return content_hash(Path(saved_name).read_bytes()) == saved_hash
+        except OSError:
+            return False
 
     def append_images(self, images):
         for image_data, image_type in images:
@@ -307,7 +374,7 @@ class ImagesEditor(Gtk.Box):
             pb_scaled = pb.scale_simple(width, height,
                     GdkPixbuf.InterpType.BILINEAR)
             provenance = (Provenance.EMBEDDED, Provenance.FILE)[image_type < 0]
-            row = (pb, pb_scaled, provenance.value, 0, -1)
+            row = (pb, pb_scaled, provenance.value, 0, -1, '', '')
             self.images_liststore.append(row)
         if not self.thumbnail_treeview.props.visible:
             self._display_first_image()
@@ -327,7 +394,7 @@ class ImagesEditor(Gtk.Box):
         thumbnail = pb.scale_simple(*THUMBNAIL_SIZE,
                 GdkPixbuf.InterpType.BILINEAR)
         i = len(self.images_liststore)
-        row = (pb, thumbnail, provenance.value, i, disc_num)
+        row = (pb, thumbnail, provenance.value, i, disc_num, '', '')
         treeiter = self.images_liststore.append(row)
         if len(self.images_liststore) > 1:
             self.thumbnail_treeview.show()
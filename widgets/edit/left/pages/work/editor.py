@@ -1,7 +1,6 @@
 """A form (WorkMetadataForm) for entering and editing work metadata."""
 
 import re
-from pathlib import Path
 from collections import defaultdict
 from itertools import chain, groupby
 
@@ -10,10 +9,11 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GObject, GLib
 from fuzzywuzzy import fuzz
 
+from common.completers import completers, first_last
 from common.config import config
 from common.connector import register_connect_request
 from common.connector import getattr_from_obj_with_name
-from common.constants import METADATA_CLASSES, COMPLETERS
+from common.constants import METADATA_CLASSES
 from common.descriptors import QuietProperty
 from common.genrespec import genre_spec
 from common.initlogging import logger
@@ -469,12 +469,9 @@ class WorkMetadataEditor(Gtk.ScrolledWindow):
     def map_metadata(self, mb_metadata: dict[str, list[str]]):
         all_keys = set(genre_spec.all_keys(self.edit_genre))
 
-        completers_path = Path(COMPLETERS)
-        completers = {p.name for p in completers_path.iterdir()}
-
         # match_keys is the set of keys in the genre for which there are
         # also completers.
-        match_keys = all_keys & completers
+        match_keys = all_keys & completers.keys()
 
         # Names in involved_people_list often have a parenthetic phrase
         # attached describing the function of the person. Remove it.
@@ -505,42 +502,28 @@ class WorkMetadataEditor(Gtk.ScrolledWindow):
         # remove the corresponding key from match_keys as we no longer
         # seek a match (perfect or fuzzy) for the key.
         for key in set(match_keys):
-            with Path(completers_path, key).open(encoding='utf-8') as f:
-                while match_name := f.readline().strip():
-                    if match_name.startswith('#'):
-                        continue
-                    for name in all_names:
-                        if name == match_name:
-                            matches[key].add(name)
+            completer = completers[key]
+            for name in all_names:
+                if name in completer:
+                    matches[key].add(name)
 
-                            all_names.remove(name)
-                            artist_names.discard(name)
-                            match_keys.remove(key)
+                    all_names.remove(name)
+                    artist_names.discard(name)
+                    match_keys.remove(key)
 
-                            break
+                    break
 
         # Fuzzy matches consider only the first and last components of names
-        # with more than two components (e.g., First Middle Last).
-        def first_last(name):
-            name_split = name.split()
-            if len(name_split) > 1:
-                if name_split[0] == 'Sir' and len(name_split) > 2:
-                    return f'{name_split[1]} {name_split[-1]}'
-                else:
-                    return f'{name_split[0]} {name_split[-1]}'
-            else:
-                return name
-
+        # with more than two components (e.g., First Middle Last). Only the
+        # candidates from the trigram index of the completer get scored.
         def scanner_fuzzy(key):
-            with Path(completers_path, key).open(encoding='utf-8') as f:
-                while match_name := f.readline().strip():
-                    if match_name.startswith('#'):
-                        continue
-                    for name in all_names:
-                        ratio = fuzz.token_set_ratio(first_last(name),
-                                first_last(match_name))
-                        if ratio > 90:
-                            yield (name, match_name, ratio)
+            completer = completers[key]
+            for name in all_names:
+                for match_name in completer.fuzzy_candidates(name):
+                    ratio = fuzz.token_set_ratio(first_last(name),
+                            first_last(match_name))
+                    if ratio > 90:
+                        yield (name, match_name, ratio)
 
         # If any names remain in all_names and any keys lack a match, iterate
         # over match_keys again seeking fuzzy matches.
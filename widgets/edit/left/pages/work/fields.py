@@ -10,21 +10,31 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GObject, Gdk
 
+from common.completers import completers
 from common.config import config
-from common.constants import COMPLETERS, IMAGES_DIR, NOEXPAND
+from common.constants import IMAGES_DIR, NOEXPAND
 from common.contextmanagers import stop_emission
 from common.decorators import emission_stopper
 from common.types import Name_LongShort
 from common.utilities import debug
 from .abbreviators import abbreviator
 
-# Create Gtk.EntryCompletion models for every file in COMPLETERS.
-completions_models = {}
-for completer_fn in COMPLETERS.iterdir():
-    completions_models[completer_fn.name] = model = Gtk.ListStore(str)
-    with open(completer_fn, 'rt', encoding='utf-8') as completer_fo:
-        for line in completer_fo.read().splitlines():
-            model.append((line,))
+# The Gtk.EntryCompletion model for a key gets filled from its completer
+# the first time an entry with a completion for the key gets focus (see
+# Entry.do_focus_in_event) rather than for every key at startup.
+completions_models: dict[str, Gtk.ListStore] = {}
+
+def get_completions_model(key: str) -> Gtk.ListStore:
+    if (model := completions_models.get(key)) is None:
+        completions_models[key] = model = Gtk.ListStore(str)
+        completer = completers[key]
+        for name in completer:
+            model.append((name,))
+
+        # Names learned later (see EditNotebook.learn_new_completions) go
+        # in the model as well.
+        completer.append_callbacks.append(lambda name: model.append((name,)))
+    return model
 
 class WorkMetadataField(Gtk.Grid):
     @GObject.Signal(flags=GObject.SignalFlags.RUN_FIRST)
@@ -147,8 +157,7 @@ class WorkMetadataField(Gtk.Grid):
             yield tuple(entry.get_text() for entry in entries)
 
     def make_completion(self, key: str):
-        model = completions_models.get(key, None)
-        if model is None:
+        if key not in completers:
             return None
         else:
             enabled = config['completers'][key][0]
@@ -172,7 +181,7 @@ class WorkMetadataField(Gtk.Grid):
                 return any(n.startswith(value) for n in name.split())
 
         completion = Gtk.EntryCompletion()
-        completion.set_model(model)
+        completion.key = key
         completion.set_text_column(0)
         completion.set_match_func(match_func)
         completion.set_popup_completion(True)
@@ -494,6 +503,12 @@ class Entry(Gtk.Entry):
         self.set_can_focus(True)
         Gtk.Entry.do_realize(self)
 
+    def do_focus_in_event(self, event):
+        completion = self.get_completion()
+        if completion is not None and completion.get_model() is None:
+            completion.set_model(get_completions_model(completion.key))
+        return Gtk.Entry.do_focus_in_event(self, event)
+
     def do_key_press_event(self, eventkey):
         match eventkey.keyval:
             case Gdk.KEY_Page_Down:
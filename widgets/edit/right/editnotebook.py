@@ -9,6 +9,7 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
+from common.startuptrace import trace
 from common.utilities import debug
 
 @Gtk.Template.from_file('data/glade/edit/right/notebook.glade')
@@ -28,7 +29,8 @@ class EditNotebook(Gtk.Notebook):
         size_group = Gtk.SizeGroup.new(Gtk.SizeGroupMode.HORIZONTAL)
         for page_module_name in pages:
             qual_name = f'widgets.edit.right.pages.{page_module_name}'
-            page = importlib.import_module(qual_name)
+            with trace(f'page {qual_name}'):
+                page = importlib.import_module(qual_name)
             pages[page_module_name] = page
             page_widget = page.page_widget
             self.append_page(page_widget)
@@ -0,0 +1,69 @@
+"""A notebook page that constructs its content when it first appears.
+
+Some pages are costly to construct (the Wikipedia page starts WebKit, the
+docs page loads Poppler) but rarely used. LazyPage stands in for such a
+page in its notebook. The module of the page gets imported (which
+constructs page_widget) only when the LazyPage first gets mapped, that is,
+when the user first switches to it.
+
+Until then, calls to methods of page_widget go through call, which keeps
+the most recent arguments for each method and makes the calls once the
+page exists (so the page shows the current selection when it appears).
+The widgets of the page get added to the objects that the connector
+knows, so connection requests registered by the page (or waiting for it)
+get connected then. The name of page_widget gets declared lazy to the
+connector so that requests for it wait instead of failing."""
+
+import importlib
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+
+from common.connector import declare_lazy_names, traverse_widgets
+from common.constants import EXPAND
+from common.startuptrace import trace
+
+class LazyPage(Gtk.Box):
+    def __init__(self, module_name: str, tab_text: str, object_name: str):
+        super().__init__()
+        declare_lazy_names(object_name)
+        self.module_name = module_name
+        self.tab_text = tab_text
+        self.page = None
+        self.pending_calls: dict[str, tuple] = {}
+        self.show()
+
+        self.map_handler_id = self.connect('map', self.on_map)
+
+    @property
+    def page_widget(self):
+        self.construct()
+        return self.page.page_widget
+
+    def on_map(self, widget):
+        self.construct()
+
+    def construct(self):
+        if self.page is not None:
+            return
+
+        self.disconnect(self.map_handler_id)
+        with trace(f'page {self.module_name}'):
+            self.page = importlib.import_module(self.module_name)
+            page_widget = self.page.page_widget
+            self.pack_start(page_widget, *EXPAND)
+            traverse_widgets([page_widget])
+
+        for method_name, args in self.pending_calls.items():
+            getattr(page_widget, method_name)(*args)
+        self.pending_calls.clear()
+
+    # Call method_name of page_widget with args now if the page exists or
+    # else when it gets constructed.
+    def call(self, method_name: str, *args):
+        if self.page is None:
+            self.pending_calls.pop(method_name, None)
+            self.pending_calls[method_name] = args
+        else:
+            getattr(self.page.page_widget, method_name)(*args)
@@ -1,10 +1,15 @@
 """A viewer and a treemodel for acquiring documents. Used by docs in
 edit mode and docs in play mode."""
 
+import queue
+import threading
+from collections import OrderedDict
+
+import cairo
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Poppler', '0.18')
-from gi.repository import Gtk, Poppler
+from gi.repository import Gtk, GLib, Poppler
 
 from common.decorators import UniqObjectName
 from common.utilities import debug
@@ -54,17 +59,116 @@ class MyDocsListstore:
     def name_iter(self):
         return (r[0] for r in self.pdfviewer_liststore)
 
+# Rendered pages are bitmaps at the size of the viewer, so each takes a
+# couple of megabytes.
+MAX_CACHE_BYTES = 24 * 1024 * 1024
+
+# uri, mtime_ns, page_num, width, height. mtime_ns distinguishes a
+# document from a later version of it with the same uri.
+type PageKey = tuple[str, int, int, int, int]
+
+# Render page to a new surface of the given size. Fill the background with
+# white in case pdf has transparent background.
+def render_page(page, width, height, scale):
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+    context = cairo.Context(surface)
+    context.set_source_rgb(1, 1, 1)
+    context.paint()
+    context.scale(scale, scale)
+    page.render(context)
+    return surface
+
+# Rendered pages keyed by PageKey. The least recently used pages get
+# evicted once the surfaces occupy more than max_bytes.
+class SurfaceCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.surfaces: OrderedDict[PageKey, cairo.ImageSurface] = \
+                OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.surfaces
+
+    def get(self, key):
+        try:
+            self.surfaces.move_to_end(key)
+        except KeyError:
+            return None
+        return self.surfaces[key]
+
+    def put(self, key, surface):
+        if key in self.surfaces:
+            return
+        self.surfaces[key] = surface
+        self.n_bytes += surface.get_stride() * surface.get_height()
+        while self.n_bytes > self.max_bytes and len(self.surfaces) > 1:
+            old_key, old_surface = self.surfaces.popitem(last=False)
+            self.n_bytes -= old_surface.get_stride() * old_surface.get_height()
+
+# PageRenderer renders pages in a background thread so that the pages
+# adjacent to the one on display are ready by the time the user turns to
+# them. A Poppler.Document must not be used from two threads at once, so
+# the thread opens its own copy of the document.
+class PageRenderer(threading.Thread):
+    def __init__(self, callback):
+        super().__init__(daemon=True)
+        self.callback = callback
+        self.requests = queue.Queue()
+        self.doc_id = None
+        self.document = None
+        self.start()
+
+    def request(self, key: PageKey, scale: float):
+        self.requests.put((key, scale))
+
+    def run(self):
+        while True:
+            key, scale = self.requests.get()
+            uri, mtime_ns, page_num, width, height = key
+            try:
+                if (uri, mtime_ns) != self.doc_id:
+                    self.document = Poppler.Document.new_from_file(uri, None)
+                    self.doc_id = (uri, mtime_ns)
+                page = self.document.get_page(page_num)
+                surface = render_page(page, width, height, scale)
+            except GLib.Error:
+                surface = None
+
+            # Hand the surface to the main thread.
+            GLib.idle_add(self.callback, key, surface)
+
 @UniqObjectName
 class PdfViewer(Gtk.EventBox):
     def __init__(self):
         drawing_area = Gtk.DrawingArea.new()
         self.add(drawing_area)
 
+        self.surfaces = SurfaceCache(MAX_CACHE_BYTES)
+        self.prefetching: set[PageKey] = set()
+        self.renderer = PageRenderer(self.on_page_rendered)
+
     def do_draw(self, context):
         alloc = self.get_allocation()
-        alloc_width, alloc_height = (alloc.width, alloc.height)
-
-        image_width, image_height = self.page.get_size()
+        key, scale = self.get_page_key(self.page_num,
+                alloc.width, alloc.height)
+
+        surface = self.surfaces.get(key)
+        if surface is None:
+            uri, mtime_ns, page_num, width, height = key
+            surface = render_page(self.page, width, height, scale)
+            self.surfaces.put(key, surface)
+        context.set_source_surface(surface, 0, 0)
+        context.paint()
+
+        # Get the neighbors of this page ready.
+        for page_num in {(self.page_num + 1) % self.n_pages,
+                (self.page_num - 1) % self.n_pages} - {self.page_num}:
+            self.prefetch(page_num, alloc.width, alloc.height)
+
+    def get_page_key(self, page_num, alloc_width, alloc_height):
+        page = self.document.get_page(page_num)
+        image_width, image_height = page.get_size()
         ratio = image_height / image_width
 
         # First scale by width. If the resulting height does not fit, then
@@ -74,17 +178,26 @@ class PdfViewer(Gtk.EventBox):
             scale = float(alloc_height) / image_height
         else:
             scale = float(alloc_width) / image_width
-        context.scale(scale, scale)
-
-        # Fill background with white in case pdf has transparent background.
-        context.set_source_rgb(1, 1, 1)
-        context.rectangle(0, 0, image_width, image_height)
-        context.fill()
-
-        self.page.render(context)
+        width = max(round(image_width * scale), 1)
+        height = max(round(image_height * scale), 1)
+        return (*self.doc_id, page_num, width, height), scale
+
+    def prefetch(self, page_num, alloc_width, alloc_height):
+        key, scale = self.get_page_key(page_num, alloc_width, alloc_height)
+        if key in self.surfaces or key in self.prefetching:
+            return
+        self.prefetching.add(key)
+        self.renderer.request(key, scale)
+
+    def on_page_rendered(self, key, surface):
+        self.prefetching.discard(key)
+        if surface is not None:
+            self.surfaces.put(key, surface)
+        return False
 
     def set_doc(self, filepath):
         fileuri = filepath.absolute().as_uri()
+        self.doc_id = (fileuri, filepath.stat().st_mtime_ns)
         self.document = Poppler.Document.new_from_file(fileuri, None)
         self.n_pages = self.document.get_n_pages()
 
@@ -103,4 +216,3 @@ class PdfViewer(Gtk.EventBox):
         self.page_num = (self.page_num - 1) % self.n_pages
         self.page = self.document.get_page(self.page_num)
         self.queue_draw()
-
@@ -100,10 +100,6 @@ class DocsView(Gtk.Box):
         with open(filename, 'rb') as fo:
             return fo.read()
 
-    def has_docs(self, uuid):
-        documents_dir = Path(DOCUMENTS, uuid)
-        return any(documents_dir.iterdir())
-
     def clear(self):
         self.my_docs_liststore.clear()
         self._docs_changed = False
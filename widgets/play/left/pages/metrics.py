@@ -0,0 +1,64 @@
+"""A page for viewing the metrics that common.metrics collects (present
+only when metrics are on)."""
+
+from datetime import datetime
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk
+
+from common.metrics import metrics, quantile, read_snapshots
+from common.utilities import debug
+
+@Gtk.Template.from_file('data/glade/play/metrics.glade')
+class MetricsView(Gtk.Box):
+    __gtype_name__ = 'metrics_box'
+
+    metrics_treestore = Gtk.Template.Child()
+    metrics_treeview = Gtk.Template.Child()
+    metrics_time_label = Gtk.Template.Child()
+
+    def __init__(self):
+        super().__init__()
+        self.set_name('play-metrics-page')
+        self.tab_text = 'Metrics'
+
+        self.populate()
+
+    @Gtk.Template.Callback()
+    def on_metrics_refresh_button_clicked(self, button):
+        # Write the current metrics of this process first.
+        metrics.flush()
+        self.populate()
+
+    # Show the latest snapshot of each program, its counters and then its
+    # histograms (times in ms unless the name says otherwise).
+    def populate(self):
+        self.metrics_treestore.clear()
+        snapshots = read_snapshots()
+        for snapshot in snapshots:
+            time_str = datetime.fromtimestamp(snapshot['time'] / 1e9) \
+                    .strftime('%H:%M:%S')
+            parent = self.metrics_treestore.append(None,
+                    (f'{snapshot["process"]} ({time_str})',
+                    '', '', '', '', ''))
+
+            for name, n in sorted(snapshot['counters'].items()):
+                self.metrics_treestore.append(parent,
+                        (name, str(n), '', '', '', ''))
+
+            for name, histogram in sorted(snapshot['histograms'].items()):
+                mean = histogram['sum'] / histogram['n']
+                self.metrics_treestore.append(parent,
+                        (name, str(histogram['n']), f'{mean:.2f}',
+                        f'{quantile(histogram, 0.5):.2f}',
+                        f'{quantile(histogram, 0.95):.2f}',
+                        f'{histogram["max"]:.2f}'))
+        self.metrics_treeview.expand_all()
+
+        now = datetime.now().strftime('%H:%M:%S')
+        self.metrics_time_label.set_text(f'Read at {now} '
+                f'({len(snapshots)} programs)')
+
+
+page_widget = MetricsView()
@@ -12,7 +12,14 @@ if __name__ == '__main__':
     sys.path.insert(0, dirname(dirname(sys.path[0])))
 from common.connector import register_connect_request
 from common.decorators import idle_add
-from common.utilities import debug
+from common.metrics import ENABLED as METRICS_ENABLED
+from common.startuptrace import trace
+from common.utilities import debug, has_docs
+from widgets.lazypage import LazyPage
+
+# The pages that get constructed only when the user first switches to them
+# (with their tab text). The object name of each is play-<name>-page.
+LAZY_PAGES = {'wikipedia': 'Wikipedia', 'docs': 'Docs', 'metrics': 'Metrics'}
 
 @Gtk.Template.from_file('data/glade/play/notebook.glade')
 class PlayNotebook(Gtk.Notebook):
@@ -32,11 +39,18 @@ class PlayNotebook(Gtk.Notebook):
         # Import the modules for pages of the notebook. They are located
         # in the 'pages' subdirectory.
         page_names = ['metadata', 'wikipedia', 'docs', 'properties']
+        if METRICS_ENABLED:
+            page_names.append('metrics')
         for page_name in page_names:
             module_name = f'widgets.play.left.pages.{page_name}'
-            page = importlib.import_module(module_name)
+            if page_name in LAZY_PAGES:
+                page = page_widget = LazyPage(module_name,
+                        LAZY_PAGES[page_name], f'play-{page_name}-page')
+            else:
+                with trace(f'page {module_name}'):
+                    page = importlib.import_module(module_name)
+                page_widget = page.page_widget
             pages[page_name] = page
-            page_widget = page.page_widget
             self.append_page(page_widget)
             self.set_tab_label_text(page_widget, page_widget.tab_text)
             tab_label = self.get_tab_label(page_widget)
@@ -76,11 +90,11 @@ class PlayNotebook(Gtk.Notebook):
             props_wrk = model.work.props
 
             self.pages['metadata'].page_widget.populate(metadata, nonce, uuid)
-            self.pages['wikipedia'].page_widget.populate(metadata)
-            if self.pages['docs'].page_widget.has_docs(uuid):
-                self.pages['docs'].page_widget.show()
-                self.pages['docs'].page_widget.populate(uuid)
+            self.pages['wikipedia'].call('populate', metadata)
+            if has_docs(uuid):
+                self.pages['docs'].show()
+                self.pages['docs'].call('populate', uuid)
             else:
-                self.pages['docs'].page_widget.hide()
+                self.pages['docs'].hide()
             self.pages['properties'].page_widget.populate(props_rec, props_wrk)
 
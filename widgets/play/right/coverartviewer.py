@@ -1,21 +1,31 @@
 """Display cover art."""
 
-import os
+import shutil
 from pathlib import Path
 
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('GdkPixbuf', '2.0')
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, Gdk, GLib
 from gi.repository import GdkPixbuf
 
 from common.config import config
 from common.connector import register_connect_request
-from common.constants import IMAGES, IMAGES_DIR
+from common.constants import IMAGES, IMAGES_DIR, COVERS_CACHE
+from common.pixbufcache import PixbufLRU
 from common.utilities import debug
 
 WIDTH = config.geometry['right_panel_width']
 
+# Hardwire image size as self might not be allocated the first time we need
+# to scale an image. Adjust these values if the layout of the right panel
+# changes.
+IMAGE_WIDTH = WIDTH - 9
+IMAGE_HEIGHT = IMAGE_WIDTH - 14
+
+# Enough for a few dozen scaled covers.
+MAX_CACHE_BYTES = 16 * 1024 * 1024
+
 class CoverArtViewer(Gtk.EventBox):
     def __init__(self):
         super().__init__()
@@ -26,15 +36,34 @@ class CoverArtViewer(Gtk.EventBox):
         self.add(self.image)
         self.show_all()
 
+        # Scaled covers (with arrows, if the recording has more than one
+        # image) keyed by (uuid, image index, width, height).
+        self.scaled_pixbufs = PixbufLRU(MAX_CACHE_BYTES)
+
+        # The arrows never change, so load them only once.
+        self.arrow_pbs = [GdkPixbuf.Pixbuf.new_from_file(
+                    str(Path(IMAGES_DIR, arrow_fn)))
+                for arrow_fn in ('arrow_l.png', 'arrow_r.png')]
+
+        self.uuid = None
+        self.file_paths = []
+        self.image_index = 0
+
         register_connect_request('selector.recording_selection', 'changed',
                 self.on_recording_selection_changed)
         register_connect_request('edit-left-notebook', 'recording-saved',
                 self.on_recording_saved)
+        register_connect_request('edit-left-notebook', 'recording-deleted',
+                self.on_recording_deleted)
 
     def on_recording_saved(self, editnotebook, genre):
         uuid = editnotebook.recording.uuid
+        self.invalidate(uuid)
         self.get_images(uuid)
 
+    def on_recording_deleted(self, editnotebook, uuid):
+        self.invalidate(uuid)
+
     def on_recording_selection_changed(self, recording_selection):
         model_filter, selected_row_iter = \
                 recording_selection.get_selected()
@@ -48,23 +77,23 @@ class CoverArtViewer(Gtk.EventBox):
         short, uuid, work_num = recording_model[selected_row_iter]
         self.get_images(uuid)
 
+    # Only the image on display gets decoded now. The others get decoded
+    # when the user clicks through to them.
     def get_images(self, uuid):
         images_path = Path(IMAGES, uuid)
-        file_paths = list(map(str, images_path.glob('image-??.jpg')))
-        file_paths.sort()
-        if not file_paths:
-            file_paths = [str(Path(IMAGES_DIR, 'noimage.jpg'))]
-
-        pixbufs = map(GdkPixbuf.Pixbuf.new_from_file, file_paths)
-        self.scaled_pixbufs = list(map(self.scale_image, pixbufs))
-
-        if len(self.scaled_pixbufs) > 1:
-            list(map(self.composite_arrows, self.scaled_pixbufs))
+        file_paths = sorted(images_path.glob('image-??.jpg'))
+        if file_paths:
+            self.uuid = uuid
+        else:
+            self.uuid = None
+            file_paths = [Path(IMAGES_DIR, 'noimage.jpg')]
+        self.file_paths = file_paths
+        self.image_index = 0
 
-        self.image.set_from_pixbuf(self.scaled_pixbufs[0])
+        self.image.set_from_pixbuf(self.get_scaled_pixbuf(0))
 
     def do_button_press_event(self, eventbutton):
-        n_images = len(self.scaled_pixbufs)
+        n_images = len(self.file_paths)
         if n_images <= 1:
             return
 
@@ -72,44 +101,63 @@ class CoverArtViewer(Gtk.EventBox):
                 and eventbutton.state == 0 \
                 and eventbutton.button == 1:
             if eventbutton.x > 0.8 * WIDTH:
-                self.scaled_pixbufs.append(self.scaled_pixbufs.pop(0))
+                self.image_index = (self.image_index + 1) % n_images
             elif eventbutton.x < 0.2 * WIDTH:
-                self.scaled_pixbufs.insert(0, self.scaled_pixbufs.pop())
-            self.image.set_from_pixbuf(self.scaled_pixbufs[0])
+                self.image_index = (self.image_index - 1) % n_images
+            pb = self.get_scaled_pixbuf(self.image_index)
+            self.image.set_from_pixbuf(pb)
 
         Gtk.EventBox.do_button_press_event(self, eventbutton)
 
-    def scale_image(self, pb):
-        # Hardwire image size as self might not be allocated the first time
-        # we come here. Adjust these values if the layout of the right
-        # panel changes.
-        image_width = WIDTH - 9
-        image_height = image_width - 14
-
-        # Scale pb to fit image (self) preserving the aspect ratio of the
-        # original image. Scale to the width and see whether the height fits.
-        # If it does not, scale to the height.
-        ratio = float(pb.props.height) / pb.props.width
-
-        pb_width = image_width
-        pb_height = round(pb_width * ratio)
-        if pb_height > image_height:
-            pb_height = image_height
-            pb_width = round(pb_height / ratio)
-        pb_scaled = pb.scale_simple(pb_width, pb_height,
-                GdkPixbuf.InterpType.BILINEAR)
-        return pb_scaled
+    def get_scaled_pixbuf(self, index):
+        key = (self.uuid, index, IMAGE_WIDTH, IMAGE_HEIGHT)
+        if (pb := self.scaled_pixbufs.get(key)) is not None:
+            return pb
+
+        pb = self.scale_image(self.file_paths[index], index)
+        if len(self.file_paths) > 1:
+            self.composite_arrows(pb)
+        self.scaled_pixbufs.put(key, pb)
+        return pb
+
+    # Scale the image to fit image (self) preserving the aspect ratio of the
+    # original image. A scaled copy of every cover gets saved in
+    # COVERS_CACHE so that the full-size image gets decoded only once.
+    def scale_image(self, file_path, index):
+        if self.uuid is None:
+            return GdkPixbuf.Pixbuf.new_from_file_at_scale(str(file_path),
+                    IMAGE_WIDTH, IMAGE_HEIGHT, True)
+
+        cache_path = Path(COVERS_CACHE, self.uuid,
+                f'image-{index:02d}-{IMAGE_WIDTH}x{IMAGE_HEIGHT}.jpg')
+        try:
+            if cache_path.stat().st_mtime >= file_path.stat().st_mtime:
+                return GdkPixbuf.Pixbuf.new_from_file(str(cache_path))
+        except (OSError, GLib.Error):
+            pass
+
+        pb = GdkPixbuf.Pixbuf.new_from_file_at_scale(str(file_path),
+                IMAGE_WIDTH, IMAGE_HEIGHT, True)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            pb.savev(str(cache_path), 'jpeg', ['quality'], ['95'])
+        except (OSError, GLib.Error):
+            # The cache is only an optimization.
+            pass
+        return pb
 
     def composite_arrows(self, pb):
-        images_dir = os.path.join('data', 'images')
-        for arrow_fn, x_func in [
-                ('arrow_l.png', lambda a: 3),
-                ('arrow_r.png', lambda a: pb.props.width - a.props.width - 3)]:
-            arrow_pb = GdkPixbuf.Pixbuf.new_from_file(
-                    os.path.join(images_dir, arrow_fn))
-            x = x_func(arrow_pb)
+        for arrow_pb, x in [
+                (self.arrow_pbs[0], 3),
+                (self.arrow_pbs[1],
+                    pb.props.width - self.arrow_pbs[1].props.width - 3)]:
             y = round((pb.props.height - arrow_pb.props.height) / 2.0)
             arrow_pb.composite(pb, x, y,
                     arrow_pb.props.width, arrow_pb.props.height,
                     x, y, 1.0, 1.0, GdkPixbuf.InterpType.BILINEAR, 0xaf)
 
+    # Forget scaled covers for uuid, both in memory and on disk, after its
+    # images change.
+    def invalidate(self, uuid):
+        self.scaled_pixbufs.invalidate(uuid)
+        shutil.rmtree(Path(COVERS_CACHE, uuid), ignore_errors=True)
@@ -1,21 +1,121 @@
+import logging
 import pickle
 import shelve
+import time
 from pathlib import Path
 
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('GdkPixbuf', '2.0')
-from gi.repository import Gtk, GLib
-from gi.repository.GdkPixbuf import PixbufLoader
+from gi.repository import Gtk
+from gi.repository.GdkPixbuf import Pixbuf, PixbufLoader
 
 from common.config import config
-from common.constants import SOUND, IMAGES, IMAGES_DIR, QUEUEFILES, LONG
-from common.types import GroupTuple
+from common.constants import SOUND, QUEUEFILES, LONG
+from common.pixbufcache import thumbnail_cache
+from common.types import GroupTuple, RecordingTuple
 from common.utilities import debug
 from common.utilities import make_time_str
 from widgets.select.right import playqueue_model_with_attrs, PlayqueueModelRow
 from widgets.select.right import select_right as playqueue_select
 
+# A queue file starts with a header, a dict with the version of the format
+# and the stats that the page displays, so that listing the queue files
+# reads only the header of each one:
+#
+#     {'version': 2, 'duration': seconds, 'n_sets': n, 'saved': time.time()}
+#
+# A pickled PlayqueueModelRow tuple follows for each set. The image of a set
+# is the uuid of its recording, whose thumbnail comes from thumbnail_cache.
+# Only the set of a recording that no longer exists keeps the JPEG data of
+# its thumbnail (from a version 1 file) so that the user can still identify
+# it. Version 1 files have no header and embed the JPEG data of every
+# thumbnail; read_queue_file migrates them. Files of any other version
+# (from a newer wax) raise ValueError rather than being misread.
+QUEUEFILE_VERSION = 2
+
+def make_header(rows: list[PlayqueueModelRow]) -> dict:
+    duration = sum(track.duration for row in rows for track in row.tracks)
+    return {'version': QUEUEFILE_VERSION, 'duration': duration,
+            'n_sets': len(rows), 'saved': time.time()}
+
+def write_queue_file(path: Path, rows: list[PlayqueueModelRow]):
+    tmp_path = Path(str(path) + '.tmp')
+    with open(tmp_path, 'wb') as queue_fo:
+        pickle.dump(make_header(rows), queue_fo)
+        for row in rows:
+            pickle.dump(tuple(row), queue_fo)
+    tmp_path.replace(path)
+
+def migrate_row(row: PlayqueueModelRow) -> PlayqueueModelRow:
+    # The recording exists if the sound file exists.
+    if Path(SOUND, row.uuid).exists():
+        return row._replace(image=row.uuid)
+    return row
+
+# Return the row of playqueue_model to save in a queue file. The set of a
+# recording that no longer exists keeps the JPEG data of its thumbnail.
+def file_row(row) -> PlayqueueModelRow:
+    row = PlayqueueModelRow._make(row)
+    if isinstance(row.image, Pixbuf) and not Path(SOUND, row.uuid).exists():
+        success, data = row.image.save_to_bufferv('jpeg', [], [])
+        row = row._replace(image=bytes(data) if success else None)
+    return migrate_row(row)
+
+def check_version(header: dict, path: Path):
+    if header.get('version') != QUEUEFILE_VERSION:
+        raise ValueError(f'{path}: unsupported queue file version '
+                f'{header.get("version")}')
+
+# Return the header and the rows of the queue file at path, migrating a
+# version 1 file to the current version.
+def read_queue_file(path: Path) -> tuple[dict, list[PlayqueueModelRow]]:
+    header, rows = None, []
+    with open(path, 'rb') as queue_fo:
+        while True:
+            try:
+                queue_file_data = pickle.load(queue_fo)
+            except EOFError:
+                break
+            if header is None and isinstance(queue_file_data, dict):
+                header = queue_file_data
+                check_version(header, path)
+            else:
+                rows.append(PlayqueueModelRow._make(queue_file_data))
+
+    if header is None:
+        rows = [migrate_row(row) for row in rows]
+        write_queue_file(path, rows)
+        header = make_header(rows)
+    return header, rows
+
+def read_header(path: Path) -> dict:
+    with open(path, 'rb') as queue_fo:
+        try:
+            queue_file_data = pickle.load(queue_fo)
+        except EOFError:
+            queue_file_data = None
+    if isinstance(queue_file_data, dict):
+        check_version(queue_file_data, path)
+        return queue_file_data
+    header, rows = read_queue_file(path)
+    return header
+
+# Return the recordings with uuids from LONG, opening the shelf once.
+def read_recordings(uuids: set[str]) -> dict[str, RecordingTuple]:
+    recordings = {}
+    with shelve.open(LONG, 'r') as long_shelf:
+        for uuid in uuids:
+            if (recording := long_shelf.get(uuid)) is not None:
+                recordings[uuid] = recording
+    return recordings
+
+# The values of a row for comparison. TrackTuples compare equal when their
+# track_ids are equal, so compare their fields instead.
+def row_values(row: PlayqueueModelRow) -> tuple:
+    return row._replace(tracks=[tuple(t) for t in row.tracks],
+            play_tracks=[tuple(t) for t in row.play_tracks])
+
 @Gtk.Template.from_file('data/glade/select/queuefiles.glade')
 class QueueFiles(Gtk.ScrolledWindow):
     __gtype_name__ = 'queuefiles_scrolledwindow'
@@ -41,10 +141,14 @@ class QueueFiles(Gtk.ScrolledWindow):
         # Initialize queuefiles_liststore with any queue files already
         # present.
         for fp in QUEUEFILES.iterdir():
-            # Ignore .nfs files.
-            if fp.name.startswith('.nfs'):
+            # Ignore .nfs files and queue files left partly written.
+            if fp.name.startswith('.nfs') or fp.name.endswith('.tmp'):
+                continue
+            try:
+                duration, n_works = self.get_stats(fp)
+            except ValueError as e:
+                logging.warning(e)
                 continue
-            duration, n_works = self.get_stats(fp)
             self.queuefiles_liststore.append((fp.name, duration, n_works))
 
         # Sort the queue file names in alphabetic order.
@@ -102,22 +206,10 @@ class QueueFiles(Gtk.ScrolledWindow):
         text = self.queuefiles_name_entry.get_text()
         save_fp = Path(QUEUEFILES, text)
 
-        with open(save_fp, 'wb') as queue_fo:
-            for row in playqueue_model_with_attrs:
-                pb, *metadata = row
-
-                # pb has image data reconstructed from a jpeg. Re-encoding that
-                # data to jpeg format (using Pixbuf.savev) further degrades the
-                # image. Instead, read the original jpeg data from the file
-                # whence it came.
-                thumbnail_fn = Path(IMAGES, row.uuid, 'thumbnail-00.jpg')
-                if not thumbnail_fn.exists():
-                    thumbnail_fn = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
-                with open(thumbnail_fn, 'rb') as fo:
-                    thumbnail_data = fo.read()
-
-                queue_data = (thumbnail_data, *metadata)
-                pickle.dump(queue_data, queue_fo)
+        # The thumbnails stay in IMAGES (or the thumbnail atlas); the queue
+        # file refers to them by uuid.
+        rows = [file_row(row) for row in playqueue_model_with_attrs]
+        write_queue_file(save_fp, rows)
 
         sensitive = text and save_fp.exists()
         self.queuefiles_load_button.set_sensitive(sensitive)
@@ -133,80 +225,78 @@ class QueueFiles(Gtk.ScrolledWindow):
             treeiter = self.queuefiles_liststore.append((text, *stats))
             self.queuefiles_treeselection.select_iter(treeiter)
 
+    # Load all the sets at once: one read of LONG for the recordings of all
+    # the sets, thumbnails from thumbnail_cache, and the rows appended to
+    # the queue with its view detached (see append_sets). The queue file
+    # gets rewritten only if the metadata of some recording changed since
+    # it was saved.
     @Gtk.Template.Callback()
     def on_queuefiles_load_button_clicked(self, button):
         model, treeiter = self.queuefiles_treeselection.get_selected()
         text = self.queuefiles_liststore[treeiter][0]
         load_fn = Path(QUEUEFILES, text)
 
-        queue_fo = open(load_fn, 'rb')
-        tmp_fn = load_fn.with_suffix('.tmp')
-        tmp_fo = open(tmp_fn, 'wb')
-
-        def get_row():
-            try:
-                queue_file_data = pickle.load(queue_fo)
-                queue_file_row = PlayqueueModelRow._make(queue_file_data)
-
-                # The recording exists if the sound file exists.
-                if Path(SOUND, queue_file_row.uuid).exists():
-                    # Aside from random and uuid, use the metadata in the
-                    # queue file only when the recording no longer exists.
-                    new_queue_file_row = self.get_current(queue_file_row)
-
-                    # Keep the same subset of tracks as in the queue file.
-                    new_tracks = self.select_tracks(new_queue_file_row.tracks,
-                            queue_file_row.tracks)
-                    new_queue_file_row = new_queue_file_row._replace(
-                            tracks=new_tracks)
-
-                    pickle.dump(tuple(new_queue_file_row), tmp_fo)
-
-                    # The queue gets the same data except that the
-                    # image is a pixbuf.
-                    new_pixbuf = self.load_pixbuf(new_queue_file_row.image)
-                    new_queue_row = new_queue_file_row._replace(
-                            image=new_pixbuf)
-                else:
-                    # If I remove the unplayable recording from the
-                    # queue file, then the user gets one chance to
-                    # identify the recording. Preserve it instead.
-                    pickle.dump(tuple(queue_file_row), tmp_fo)
-
+        try:
+            header, queue_file_rows = read_queue_file(load_fn)
+        except ValueError as e:
+            logging.warning(e)
+            return
+
+        # The recording exists if the sound file exists.
+        uuids = {row.uuid for row in queue_file_rows
+                if Path(SOUND, row.uuid).exists()}
+        recordings = read_recordings(uuids)
+
+        new_queue_file_rows, new_queue_rows = [], []
+        for queue_file_row in queue_file_rows:
+            recording = recordings.get(queue_file_row.uuid)
+            if recording is not None \
+                    and queue_file_row.work_num in recording.works:
+                # Aside from random, uuid, and the subset of tracks, use
+                # the metadata in the queue file only when the recording
+                # no longer exists.
+                new_queue_file_row = self.get_current(queue_file_row,
+                        recording)
+
+                # The queue gets the same data except that the
+                # image is a pixbuf, which might already be decoded.
+                new_pixbuf = thumbnail_cache.get(new_queue_file_row.uuid)
+                new_queue_row = new_queue_file_row._replace(
+                        image=new_pixbuf)
+            else:
+                # If I remove the unplayable recording from the
+                # queue file, then the user gets one chance to
+                # identify the recording. Preserve it instead.
+                new_queue_file_row = queue_file_row
+
+                if isinstance(queue_file_row.image, bytes):
                     new_pixbuf = self.load_pixbuf(queue_file_row.image)
-                    new_queue_row = queue_file_row._replace(
-                            image=new_pixbuf,
-                            playable=False)
-                playqueue_model_with_attrs.append(new_queue_row)
-                if new_queue_row.playable:
-                    playqueue_select.scroll_last_set()
-                return True
-            except EOFError:
-                queue_fo.close()
-                tmp_fo.close()
-                tmp_fn.rename(load_fn)
-                return False
-
-        get_row()
-        playqueue_select.select_and_scroll_first_set()
-        GLib.timeout_add(500, get_row)
-
-    # Get the current metadata for the recording with uuid.
-    def get_current(self, queue_file_row):
+                else:
+                    new_pixbuf = thumbnail_cache.get(queue_file_row.uuid)
+                new_queue_row = queue_file_row._replace(
+                        image=new_pixbuf,
+                        playable=False)
+            new_queue_file_rows.append(new_queue_file_row)
+            new_queue_rows.append(new_queue_row)
+
+        playqueue_select.append_sets(new_queue_rows)
+        if new_queue_rows:
+            playqueue_select.select_and_scroll_first_set()
+
+        if list(map(row_values, new_queue_file_rows)) \
+                != list(map(row_values, queue_file_rows)):
+            write_queue_file(load_fn, new_queue_file_rows)
+            self.update_stats(text)
+
+    # Get the current metadata for the recording of queue_file_row, keeping
+    # the tracks of the queue file that the recording still has.
+    def get_current(self, queue_file_row, recording):
         genre = queue_file_row.genre
         uuid = queue_file_row.uuid
         work_num = queue_file_row.work_num
-        with shelve.open(LONG, 'r') as long_shelf:
-            recording = long_shelf[queue_file_row.uuid]
         work = recording.works[work_num]
-        track_tuples = queue_file_row.tracks
-
-        # Get thumbnail data for the recording with uuid.
-        thumbnail_fn = Path(IMAGES, uuid, 'thumbnail-00.jpg')
-        if not thumbnail_fn.exists():
-            thumbnail_fn = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
-        with open(thumbnail_fn, 'rb') as fo:
-            thumbnail_data = fo.read()
+        track_tuples = self.select_tracks(recording.tracks,
+                queue_file_row.tracks)
 
         group_map = {t: GroupTuple(g_name, g_metadata)
                 for g_name, g_tracks, g_metadata in work.trackgroups
@@ -217,7 +307,7 @@ class QueueFiles(Gtk.ScrolledWindow):
         primary_vals_str = '\n'.join(primary_metadata)
 
         play_tracks = list(track_tuples)
-        return PlayqueueModelRow(thumbnail_data, (primary_vals_str,),
+        return PlayqueueModelRow(uuid, (primary_vals_str,),
                 track_tuples, group_map, genre, uuid, work_num,
                 queue_file_row.random, recording.props, True, play_tracks)
 
@@ -229,7 +319,8 @@ class QueueFiles(Gtk.ScrolledWindow):
 
     def select_tracks(self, all_tracks, queue_file_tracks):
         t_map = {t.track_id: t for t in all_tracks}
-        return [t_map[t.track_id] for t in queue_file_tracks]
+        return [t_map[t.track_id] for t in queue_file_tracks
+                if t.track_id in t_map]
 
     @Gtk.Template.Callback()
     def on_queuefiles_delete_button_clicked(self, button):
@@ -241,23 +332,16 @@ class QueueFiles(Gtk.ScrolledWindow):
 
         model.remove(treeiter)
 
-    def get_stats(self, path):
-        total_duration = 0.0
-        n_works = 0
-        with open(path, 'rb') as queue_fo:
-            while True:
-                try:
-                    queue_file_data = pickle.load(queue_fo)
-                    queue_file_row = PlayqueueModelRow._make(queue_file_data)
-
-                    item_duration = sum(track.duration
-                            for track in queue_file_row.tracks)
-                    total_duration += item_duration
-                    n_works += 1
-                except EOFError:
-                    break
-        return make_time_str(total_duration), n_works
+    def update_stats(self, text):
+        stats = self.get_stats(Path(QUEUEFILES, text))
+        for row in self.queuefiles_liststore:
+            if row[0] == text:
+                self.queuefiles_liststore[row.iter] = (text, *stats)
+                break
 
+    def get_stats(self, path):
+        header = read_header(path)
+        return make_time_str(header['duration']), header['n_sets']
 
 page_widget = QueueFiles()
 
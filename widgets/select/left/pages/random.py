@@ -9,9 +9,14 @@ from gi.repository import Gtk, GLib
 
 from common.config import config
 from common.constants import SHORT, LONG
+from common.playlog import play_log, months_ago, parse_date_played
 from common.utilities import debug, playable_tracks
 from widgets.select.right import select_right as playqueue_select
 
+# The number of candidates that Rediscover considers in each call from the
+# main loop.
+REDISCOVER_BATCH = 20
+
 
 @Gtk.Template.from_file('data/glade/select/random.glade')
 class Random(Gtk.ScrolledWindow):
@@ -33,6 +38,9 @@ class Random(Gtk.ScrolledWindow):
 
     random_spin_button = Gtk.Template.Child()
 
+    rediscover_months_adjustment = Gtk.Template.Child()
+    rediscover_button = Gtk.Template.Child()
+
     def __init__(self):
         super().__init__()
         self.set_name('playqueue_random')
@@ -69,15 +77,17 @@ class Random(Gtk.ScrolledWindow):
     @Gtk.Template.Callback()
     def on_random_liststore_row_changed(self, model, path, treeiter):
         # If any weight is nonzero, sensitize spin button.
-        self.random_spin_button.props.sensitive = (
-                any(row[1] for row in model)
-                and self.random_duration_adjustment.props.value)
+        self.sensitize_buttons(model)
 
     @Gtk.Template.Callback()
     def on_random_duration_adjustment_value_changed(self, model):
-        self.random_spin_button.props.sensitive = (
-                any(row[1] for row in model)
+        self.sensitize_buttons(model)
+
+    def sensitize_buttons(self, model):
+        sensitive = bool(any(row[1] for row in model)
                 and self.random_duration_adjustment.props.value)
+        self.random_spin_button.props.sensitive = sensitive
+        self.rediscover_button.props.sensitive = sensitive
 
     @Gtk.Template.Callback()
     def on_random_spin_button_clicked(self, button):
@@ -131,6 +141,75 @@ class Random(Gtk.ScrolledWindow):
         playqueue_select.select_and_scroll_first_set()
         GLib.timeout_add(500, queue_random_selection)
 
+    # Queue works (from the genres with a nonzero weight) that have not
+    # played for the number of months in the rediscover spinbutton, until
+    # the queue holds the duration in the duration spinbutton. Unlike
+    # Spin, all the sets get chosen first and then queued at once. Choosing
+    # reads each candidate from LONG, so (as Spin does) it goes a few
+    # candidates at a time from the main loop to keep the interface
+    # responsive.
+    @Gtk.Template.Callback()
+    def on_rediscover_button_clicked(self, button):
+        duration = self.random_duration_adjustment.props.value * 60.0 * 60.0
+        cutoff = months_ago(self.rediscover_months_adjustment.props.value)
+
+        candidates = {genre: play_log.not_played_since(genre, cutoff)
+                for genre, (weight, alltracks)
+                    in config.random_config.items()
+                if weight}
+        selections = []
+
+        def choose_selections():
+            nonlocal duration
+            with shelve.open(LONG, 'r') as recording_shelf:
+                for _ in range(REDISCOVER_BATCH):
+                    genres = [g for g, works in candidates.items() if works]
+                    if duration <= 0 or not genres:
+                        queue_selections()
+                        return False
+                    weights = [config.random_config[g][0] for g in genres]
+                    genre = random.choices(genres, weights)[0]
+
+                    # Remove a random candidate (swapping the last one into
+                    # its place).
+                    works = candidates[genre]
+                    i = random.randrange(len(works))
+                    works[i], works[-1] = works[-1], works[i]
+                    uuid, work_num = works.pop()
+
+                    recording = recording_shelf[uuid]
+                    work = recording.works[work_num]
+
+                    # Works played before the play log began have only the
+                    # date played prop to show when they last played.
+                    props = dict(work.props)
+                    date_played = (props.get('date played') or ('',))[0]
+                    last_played = parse_date_played(date_played)
+                    if last_played is not None and last_played >= cutoff:
+                        continue
+
+                    play_tracks = playable_tracks(recording.tracks,
+                            work.track_ids)
+                    if not play_tracks:
+                        continue
+                    weight, alltracks = config.random_config[genre]
+                    if not alltracks:
+                        play_tracks = [random.choice(play_tracks)]
+                    duration -= sum(track.duration for track in play_tracks)
+                    selections.append(
+                            (genre, recording, work_num, play_tracks))
+            return True
+
+        def queue_selections():
+            for genre, recording, work_num, play_tracks in selections:
+                playqueue_select.enqueue_recording(genre, recording,
+                        work_num, play_tracks)
+            if selections:
+                playqueue_select.select_and_scroll_first_set()
+            self.sensitize_buttons(self.random_liststore)
+
+        self.rediscover_button.props.sensitive = False
+        GLib.idle_add(choose_selections)
 
 page_widget = Random()
 
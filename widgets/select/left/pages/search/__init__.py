@@ -6,6 +6,8 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
+from common.startuptrace import trace
+
 class SearchNotebook(Gtk.Notebook):
     def __init__(self):
         super().__init__()
@@ -15,7 +17,8 @@ class SearchNotebook(Gtk.Notebook):
 
         for page_name in ['incremental', 'sibling']:
             qual_name = f'widgets.select.left.pages.search.{page_name}'
-            page = importlib.import_module(qual_name)
+            with trace(f'page {qual_name}'):
+                page = importlib.import_module(qual_name)
             page_widget = page.page_widget
             label = Gtk.Label.new(page_widget.tab_text)
             label.set_hexpand(True)
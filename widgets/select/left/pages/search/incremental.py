@@ -2,48 +2,32 @@
 
 import os
 import shelve
-import string
-import bisect
 from itertools import product
 from typing import Iterator
 
 import gi
 gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
-from gi.repository import Gtk, Gdk, GLib, GdkPixbuf, GObject
+from gi.repository import Gtk, Gdk, GLib, GObject
 
 from common.connector import getattr_from_obj_with_name
 from common.connector import register_connect_request
-from common.constants import LONG, IMAGES, IMAGES_DIR
+from common.constants import LONG, IMAGES_DIR
 from common.contextmanagers import signal_blocker
 from common.decorators import emission_stopper
 from common.decorators import idle_add
-from common.types import GroupTuple, TrackID
+from common.metrics import span
+from common.pixbufcache import thumbnail_cache
+from common.searchindex import MatchValues, TrackMatchValues, WorkID
+from common.searchindex import match_work, normalize, splitter, work_values
+from common.searchindex import match as match_values
 from common.utilities import debug
 from common.utilities import playable_tracks
-from unidecode import unidecode
 from widgets import control_panel
 
 N_MATCHES_MAX = 299
 
-type WorkID = tuple[str, int]  # (uuid, work_num)
-type MatchValues = list[str]
-type TrackMatchValues = dict[TrackID, MatchValues]
 type MatchValuesDict = dict[WorkID, tuple[MatchValues, TrackMatchValues]]
 
-def normalize(text: str) -> str:
-    text = text.strip()
-    text = text.strip(string.punctuation)
-    text = text.lower()
-    # return unicodedata.normalize('NFKD', text)
-    # Slightly slower, but unidecode will find étude when the user types etude.
-    return unidecode(text)
-
-# Normalize text, split it, and discard short values and numbers.
-def splitter(text: str) -> list:
-    return [t.strip(string.punctuation) for t in normalize(text).split()
-            if len(t) > 2 and not t.isdigit()]
-
 @Gtk.Template.from_file('data/glade/select/search/incremental.glade')
 class SearchIncremental(Gtk.Box):
     __gtype_name__ = 'incremental_box'
@@ -81,9 +65,15 @@ class SearchIncremental(Gtk.Box):
         register_connect_request('playqueue_select.playqueue_treeselection',
                 'changed', self.on_playqueue_select_selection_changed)
 
-        # Each FlowBoxChild is hidden (along with the enclosed image) until
-        # it is needed.
-        for _ in range(N_MATCHES_MAX):
+        filename = os.path.join(IMAGES_DIR, 'overflow.png')
+        self.incremental_overflow_image.set_from_file(filename)
+
+    # Each FlowBoxChild is hidden (along with the enclosed image) until it
+    # is needed. They get created as searches need them (rather than all
+    # N_MATCHES_MAX up front, which slows startup) and then get reused.
+    def add_flowboxchildren(self, n_children: int):
+        for _ in range(n_children
+                - len(self.incremental_flowbox.get_children())):
             image = Gtk.Image.new()
             image.show()
             eventbox = Gtk.EventBox.new()
@@ -103,12 +93,6 @@ class SearchIncremental(Gtk.Box):
             flowboxchild.connect('button-press-event',
                     self.on_button_press_event)
 
-        filename = os.path.join(IMAGES_DIR, 'noimage_thumbnail.jpg')
-        self.noimage_thumbnail_pb = GdkPixbuf.Pixbuf.new_from_file(filename)
-
-        filename = os.path.join(IMAGES_DIR, 'overflow.png')
-        self.incremental_overflow_image.set_from_file(filename)
-
     # If a recording is saved or deleted, redo the search.
     def on_recording_saved(self, editnotebook, genre):
         text = normalize(self.incremental_entry.props.text)
@@ -284,7 +268,8 @@ class SearchIncremental(Gtk.Box):
         self.hide_images()
 
         try:
-            match_values = dict(self.yield_matches(text, N_MATCHES_MAX))
+            with span('search.incremental'):
+                match_values = dict(self.yield_matches(text, N_MATCHES_MAX))
         except ValueError:  # too many matches
             self.show_incremental_overflow_image(True)
             return {}
@@ -325,34 +310,24 @@ class SearchIncremental(Gtk.Box):
         return False
 
     def match(self, values: MatchValues, search_text_values: list) -> bool:
-        def bin_search(values, text):
-            i = bisect.bisect_left(values, text)
-            if i == len(values):
-                return False
-            if values[i].startswith(text):
-                return True
-            return False
-
-        # Every word in search_text_values must match the start of some word
-        # in values.
-        return all(bin_search(values, text) for text in search_text_values)
+        return match_values(values, search_text_values)
 
     def create_images(self, match_values: dict):
+        self.add_flowboxchildren(min(len(match_values), N_MATCHES_MAX))
         self.flowboxchild_map = {}
         for work_id, flowbox_child \
                 in zip(match_values, self.incremental_flowbox.get_children()):
             uuid, work_num = work_id
-            image = self.get_image(flowbox_child)
-            self.show_cover(uuid, image)
 
             # When the user clicks on an image, we need to select the
             # appropriate work in select mode and update the sibling
             # selection, if the work has siblings. To that end, we need
             # to know the work_id of the selected cover. flowboxchild_map
             # provides the necessary mapping from flowbox_child to work_id.
-            values = match_values[work_id]
             self.flowboxchild_map[flowbox_child] = work_id
 
+            self.show_cover(work_id, flowbox_child)
+
         # Now that all the tasks for creating an image have been queued,
         # add a task to show surviving recordings based on the search text
         # present at the time this task runs.
@@ -360,17 +335,17 @@ class SearchIncremental(Gtk.Box):
             self.winnow(splitter(self.incremental_entry.props.text))
         GLib.idle_add(show_visible_images)
 
-    # Run show_cover from the idle loop to read an image file and set the
-    # pixbuf of an image.
-    @idle_add
-    def show_cover(self, uuid, image):
-        # Open the thumbnail version of the cover image.
-        filename = os.path.join(IMAGES, uuid, 'thumbnail-00.jpg')
-        if os.path.exists(filename):
-            pb = GdkPixbuf.Pixbuf.new_from_file(filename)
-        else:
-            pb = self.noimage_thumbnail_pb
-        image.set_from_pixbuf(pb)
+    # Thumbnails that are not already in thumbnail_cache get decoded
+    # asynchronously, so the flowbox fills progressively. By the time a
+    # thumbnail arrives, a new search might have reassigned flowbox_child
+    # to a different work.
+    def show_cover(self, work_id, flowbox_child):
+        def set_cover(pb):
+            if self.flowboxchild_map.get(flowbox_child) == work_id:
+                self.get_image(flowbox_child).set_from_pixbuf(pb)
+        self.get_image(flowbox_child).clear()
+        uuid, work_num = work_id
+        thumbnail_cache.get_async(uuid, set_cover)
 
     def show_incremental_overflow_image(self, visible):
         self.incremental_overflow_image.props.visible = visible
@@ -391,87 +366,27 @@ class SearchIncremental(Gtk.Box):
             if not (n_yields := n_yields - 1):
                 raise ValueError
 
+        search_text_values = splitter(search_text)
         with shelve.open(LONG, 'r') as recording_shelf:
             for uuid, recording in recording_shelf.items():
                 for work_num, work in recording.works.items():
-                    # Assemble values from long work metadata. Any name in
-                    # short metadata will also be in long metadata.
-                    work_values_set = {name for namegroup in work.metadata
-                            for name in namegroup}
-
-                    # work.metadata has only primary and secondary. Add nonce
-                    # names to work_values_set.
-                    for key, namegroup in work.nonce:
-                        work_values_set.update(namegroup)
-
-                    work_values = self.prepare_values(work_values_set)
-
-                    # Assemble values for individual tracks.
-                    group_map = {t: GroupTuple(g_title, g_metadata)
-                        for g_title, track_ids, g_metadata in work.trackgroups
-                            for t in track_ids}
-
-                    track_values = {}
-                    for track in recording.tracks:
-                        values_set = set()
-                        track_ids: list[TrackID] = []
-                        if track.track_id in work.track_ids:
-                            values_set.add(track.title)
-                            if track.metadata:
-                                values_set.update(
-                                    v for k, vals in track.metadata
-                                        for v in vals)
-
-                            # If track in track group, append values_set for
-                            # track group.
-                            group_tuple = group_map.get(track.track_id, None)
-                            if group_tuple:
-                                values_set.add(group_tuple.title)
-                                for key, val in group_tuple.metadata:
-                                    values_set.update(val)
-
-                            values = self.prepare_values(values_set)
-                            track_values[track.track_id] = values
-
-                    # Perform work match test.
-                    search_text_values = splitter(search_text)
-                    search_text_values = [v for v in search_text_values
-                            if not self.match(work_values, [v])]
-
-                    work_id = (uuid, work_num)
-                    if not search_text_values:
-                        # All values in search_text_values matched work_values.
-                        # Select all tracks.
-                        values_tuple = (work_values, track_values)
-                        yield from count_yields(work_id, values_tuple)
-                    else:
-                        # I could yield values for all tracks as winnow does a
-                        # track match (when work match is negative). However,
-                        # excluding tracks already known to be uninvolved in
-                        # the match spares winnow unnecessary effort and
-                        # consumes less memory. Moreover, I need to confirm
-                        # that there is a track match anyway.
-                        track_matches = {}
-                        for t_id, t_vals in track_values.items():
-                            if self.match(t_vals, search_text_values):
-                                track_matches[t_id] = t_vals
-                        if track_matches:
-                            values_tuple = (work_values, track_matches)
-                            yield from count_yields(work_id, values_tuple)
-
-    def prepare_values(self, values_set: set) -> list:
-        values_str = ' '.join(values_set)
-
-        # Normalize names and discard short values and numbers; remove
-        # redundancies; and sort values to permit binary search for matches.
-        values = splitter(values_str)
-        values = list(set(values))
-        values.sort()
-
-        return values
+                    values, track_values = work_values(recording, work)
+                    track_ids = match_work(values, track_values,
+                            search_text_values)
+                    if track_ids is None:
+                        continue
+
+                    # When the work itself does not match, yield values
+                    # only for the tracks that matched. Excluding tracks
+                    # already known to be uninvolved in the match spares
+                    # winnow unnecessary effort and consumes less memory.
+                    track_matches = {t_id: track_values[t_id]
+                            for t_id in track_ids}
+                    yield from count_yields((uuid, work_num),
+                            (values, track_matches))
 
     def get_recording(self, uuid):
-        with shelve.open(LONG, 'r') as recording_shelf:
+        with span('long.read'), shelve.open(LONG, 'r') as recording_shelf:
             return recording_shelf[uuid]
 
     def get_image(self, flowboxchild):
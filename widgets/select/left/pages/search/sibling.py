@@ -1,20 +1,16 @@
 """Sibling search."""
 
-from pathlib import Path
-
 import gi
 gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk, Gdk, GLib, GObject
-from gi.repository.GdkPixbuf import Pixbuf
 
 from common.config import config
 from common.connector import getattr_from_obj_with_name
 from common.connector import register_connect_request
-from common.constants import IMAGES, IMAGES_DIR
 from common.contextmanagers import signal_blocker
 from common.decorators import emission_stopper
 from common.decorators import idle_add
+from common.pixbufcache import thumbnail_cache
 from common.types import GroupTuple
 from common.utilities import playable_tracks
 from common.utilities import debug
@@ -144,11 +140,7 @@ class SearchSibling(Gtk.Box):
         # selector, which accounts for track selection.
         if len(recording.works) > 1:
             # Every work has the same cover.
-            uuid = recording.uuid
-            filename = Path(IMAGES, uuid, 'thumbnail-00.jpg')
-            if not filename.exists():
-                filename = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
-            thumbnail_pb = Pixbuf.new_from_file(str(filename))
+            thumbnail_pb = thumbnail_cache.get(recording.uuid)
 
             # Sort works by the track id of the first track in each work.
             for work_num, work in sorted(recording.works.items(),
@@ -8,7 +8,6 @@ import xml.sax.saxutils
 from bisect import insort_left
 from datetime import datetime
 from itertools import groupby
-from pathlib import Path
 from typing import NamedTuple
 
 import gi
@@ -18,10 +17,13 @@ from gi.repository import Gtk, Gdk, GObject, Pango
 from . import genre_button
 from common.config import config
 from common.connector import register_connect_request
-from common.constants import SHORT, LONG
+from common.constants import LONG
 from common.contextmanagers import stop_emission
 from common.decorators import emission_stopper
 from common.genrespec import genre_spec
+from common.metrics import span
+from common.playlog import play_log
+from common.shortstore import ShortStore
 from common.utilities import debug
 from common.utilities import playable_tracks
 from common.types import NameGroup, RecordingTuple
@@ -54,16 +56,16 @@ def no_model(view):
     for column, setting in zip(columns, sort_indicators):
         column.set_sort_indicator(setting)
 
-    # Restore selection.
+    # Restore selection (if the row is still visible).
     if treeiter is not None:
-        for row in model:
-            _, row_uuid, row_work_num = row
-            if (row_uuid, row_work_num) == (uuid, work_num):
-                treepath = model.get_path(row.iter)
+        row_iter = model.get_model().find_row(uuid, work_num)
+        if row_iter is not None:
+            visible, treeiter = model.convert_child_iter_to_iter(row_iter)
+            if visible:
+                treepath = model.get_path(treeiter)
                 with stop_emission(view.selection, 'changed'):
                     view.selection.select_path(treepath)
                 view.scroll_to_cell(treepath, None, True, 0.5, 0.0)
-                break
 
 class RecordingSelector:
     def __init__(self):
@@ -207,6 +209,33 @@ class RecordingModel(Gtk.ListStore):
         # 0 of the model.
         self.clicked_column_id = 0
 
+        # row_iters maps (uuid, work_num) to the iter of its row so that
+        # selections from the play queue and from searches find their row
+        # without scanning the model. Iters of a ListStore stay valid for as
+        # long as their row exists, so entries survive inserts and sorts
+        # (load_sorted_data); remove and clear drop them. A TreeRowReference
+        # per row (as PlayqueueIndex keeps for the few sets of the play
+        # queue) would instead make every insert and delete walk all the
+        # references, which is quadratic when loading a large genre.
+        self.row_iters: dict[tuple[str, int], Gtk.TreeIter] = {}
+        self.connect('row-inserted', self.on_row_inserted)
+
+    def on_row_inserted(self, model, path, treeiter):
+        row = RecordingModelRow._make(self[treeiter])
+        self.row_iters[(row.uuid, row.work_num)] = treeiter.copy()
+
+    def remove(self, treeiter):
+        row = RecordingModelRow._make(self[treeiter])
+        self.row_iters.pop((row.uuid, row.work_num), None)
+        return super().remove(treeiter)
+
+    def clear(self):
+        self.row_iters.clear()
+        super().clear()
+
+    def find_row(self, uuid: str, work_num: int) -> Gtk.TreeIter | None:
+        return self.row_iters.get((uuid, work_num))
+
     def convert_iter_to_child_iter(self, treeiter):
         if treeiter is None:
             return None
@@ -259,19 +288,13 @@ class RecordingModel(Gtk.ListStore):
 
         return [get_sort_t(row, i) for i in column_indexes]
 
-    def yield_short_data(self, genre):
-        short_path = Path(SHORT, genre)
-        with open(short_path, 'rb') as fo:
-            while True:
-                try:
-                    yield pickle.load(fo)
-                except EOFError:
-                    return
-
+    # Rows come from a ShortStore, so every name group that appears in
+    # several works (a composer, an orchestra) is one shared tuple instead
+    # of a copy per row.
     def load_sorted_data(self, column_id):
         self.clicked_column_id = column_id
 
-        short_data = list(self.yield_short_data(self.genre))
+        short_data = list(ShortStore.load(self.genre))
         short_data.sort(key=self.sort_key)
 
         self.clear()
@@ -307,8 +330,12 @@ class RecordingModel(Gtk.ListStore):
             # Read just the entry we need before closing the shelf because
             # editnotebook might need to write to the shelf.
             row = RecordingModelRow._make(self[treeiter])
-            with shelve.open(LONG, 'r') as recording_shelf:
-                self.recording = recording = recording_shelf[row.uuid]
+            with span('long.read'), \
+                    shelve.open(LONG, 'r') as recording_shelf:
+                recording = recording_shelf[row.uuid]
+
+            # Add the plays that play_log has not yet folded into LONG.
+            self.recording = recording = play_log.apply(recording)
             self.work = work = recording.works[row.work_num]
             self.work_num = row.work_num
 
@@ -331,6 +358,9 @@ class RecordingModel(Gtk.ListStore):
         keys = genre_spec.all_keys(self.genre)
         self.metadata = list(zip(keys, recording.works[work_num].metadata))
 
+    # Count a play of the current work in the props held here. play_log
+    # records the play (so that it is not necessary to rewrite the
+    # recording in LONG).
     def update_work_props(self):
         props_d = dict(self.work.props)
 
@@ -347,9 +377,6 @@ class RecordingModel(Gtk.ListStore):
         new_work = self.work._replace(props=new_props)
         self.recording.works[self.work_num] = self.work = new_work
 
-        with shelve.open(LONG, 'w') as recording_shelf:
-            recording_shelf[self.recording.uuid] = self.recording
-
 class RecordingView(Gtk.TreeView):
     @GObject.Signal
     def column_widths_changed(self, widths: object):
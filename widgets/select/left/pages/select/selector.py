@@ -437,11 +437,12 @@ class Selector(Gtk.Grid):
         return row.path
 
     def get_short_by_uuid(self, uuid, work_num):
-        for row in self.recording_selector.model:
-            short, row_uuid, row_work_num = row
-            if (row_uuid, row_work_num) == (uuid, work_num):
-                return row.iter, short
-        return None, []
+        model = self.recording_selector.model
+        row_iter = model.find_row(uuid, work_num)
+        if row_iter is None:
+            return None, []
+        short, row_uuid, row_work_num = model[row_iter]
+        return row_iter, short
 
     def on_recording_saved(self, editnotebook, genre):
         if genre != genre_button.genre:
@@ -7,6 +7,7 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
+from common.startuptrace import trace
 from common.utilities import debug
 
 @Gtk.Template.from_file('data/glade/select/notebook.glade')
@@ -25,7 +26,8 @@ class SelectNotebook(Gtk.Notebook):
         # in the 'pages' subdirectory.
         for page_module_name in pages:
             module_name = f'widgets.select.left.pages.{page_module_name}'
-            page = importlib.import_module(module_name)
+            with trace(f'page {module_name}'):
+                page = importlib.import_module(module_name)
             page_widget = page.page_widget
             self.append_page(page_widget)
             self.set_tab_label_text(page_widget, page_widget.tab_text)
@@ -31,6 +31,66 @@ playqueue_model = Gtk.ListStore.new(_types)
 from common.types import ModelWithAttrs
 playqueue_model_with_attrs = ModelWithAttrs(playqueue_model, PlayqueueModelRow)
 
+# PlayqueueIndex maps (uuid, work_num) to TreeRowReferences for the sets in
+# playqueue_model, so finding the set for a selection does not scan the
+# queue. References follow their rows when rows are inserted, deleted, or
+# moved by drag and drop (which inserts an empty row and then sets its
+# values, hence row-changed), and they become invalid when their row is
+# deleted, whereupon on_row_deleted drops them. A set can be in the queue
+# more than once. RecordingModel keeps iters instead because its rows go
+# only through remove and clear, but sets leave the queue in ways that only
+# row-deleted reports (with the path of a row already gone). References
+# cost a walk of all of them on every insert and delete, which is nothing
+# for the tens of sets in a queue.
+class PlayqueueIndex:
+    UUID = PlayqueueModelRow._fields.index('uuid')
+    WORK_NUM = PlayqueueModelRow._fields.index('work_num')
+
+    def __init__(self, model):
+        self.model = model
+        self.refs: dict[tuple[str, int], list[Gtk.TreeRowReference]] = {}
+        model.connect('row-inserted', self.on_row_changed)
+        model.connect('row-changed', self.on_row_changed)
+        model.connect_after('row-deleted', self.on_row_deleted)
+
+    def key(self, treeiter) -> tuple[str, int]:
+        return (self.model.get_value(treeiter, self.UUID),
+                self.model.get_value(treeiter, self.WORK_NUM))
+
+    def on_row_changed(self, model, path, treeiter):
+        key = self.key(treeiter)
+        if key[0] is None:
+            return
+        refs = self.refs.setdefault(key, [])
+        if not any(ref.valid() and ref.get_path() == path for ref in refs):
+            refs.append(Gtk.TreeRowReference.new(model, path))
+
+    def on_row_deleted(self, model, path):
+        for key, refs in list(self.refs.items()):
+            refs = [ref for ref in refs if ref.valid()]
+            if refs:
+                self.refs[key] = refs
+            else:
+                del self.refs[key]
+
+    # Return the paths of the sets with uuid and work_num in queue order.
+    def find_paths(self, uuid: str, work_num: int) -> list[Gtk.TreePath]:
+        key = (uuid, work_num)
+        refs = [ref for ref in self.refs.get(key, [])
+                if ref.valid() and self.key(
+                        self.model.get_iter(ref.get_path())) == key]
+        if refs:
+            self.refs[key] = refs
+        else:
+            self.refs.pop(key, None)
+        return sorted(ref.get_path() for ref in refs)
+
+    def find(self, uuid: str, work_num: int) -> Gtk.TreeIter | None:
+        paths = self.find_paths(uuid, work_num)
+        return self.model.get_iter(paths[0]) if paths else None
+
+playqueue_index = PlayqueueIndex(playqueue_model)
+
 from .playqueue import Playqueue
 select_right = Playqueue()
 
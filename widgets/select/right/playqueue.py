@@ -1,22 +1,19 @@
 """The view of the play queue that appears in select mode."""
 
 import pickle
-from pathlib import Path
 
 import gi
 gi.require_version('Gtk', '3.0')
-gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gtk, Gdk
-from gi.repository.GdkPixbuf import Pixbuf
 
 from common.config import config
 from common.connector import register_connect_request
 from common.connector import getattr_from_obj_with_name
-from common.constants import IMAGES, IMAGES_DIR
 from common.contextmanagers import signal_blocker
 from common.contextmanagers import stop_emission
 from common.decorators import emission_stopper
 from common.decorators import idle_add
+from common.pixbufcache import thumbnail_cache
 from common.types import DragCargo, GroupTuple
 from common.utilities import debug
 from common.utilities import make_time_str
@@ -25,6 +22,7 @@ from widgets import options_button
 
 from . import PlayqueueModelRow
 from . import playqueue_model, playqueue_model_with_attrs
+from . import playqueue_index
 
 
 @Gtk.Template.from_file('data/glade/select/playqueue.glade')
@@ -47,6 +45,9 @@ class Playqueue(Gtk.Box):
         self.playqueue_treeview.set_model(playqueue_model)
         self.set_can_focus(False)
 
+        # append_sets is appending rows (and will display the durations).
+        self.appending_sets = False
+
         color = Gdk.RGBA()
         cell = self.playqueue_cellrenderertext
         def func(column, cell, model, treeiter, user):
@@ -129,11 +130,11 @@ class Playqueue(Gtk.Box):
     # Select matching set in playqueue.
     def on_search_incremental_selection_changed(self, searchincremental,
             genre, uuid, work_num, tracks):
-        for row in playqueue_model_with_attrs:
-            if (row.uuid, row.work_num) == (uuid, work_num):
-                with stop_emission(self.playqueue_treeselection, 'changed'):
-                    self.playqueue_treeselection.select_iter(row.iter)
-                return
+        treeiter = playqueue_index.find(uuid, work_num)
+        if treeiter is not None:
+            with stop_emission(self.playqueue_treeselection, 'changed'):
+                self.playqueue_treeselection.select_iter(treeiter)
+            return
 
         # No set matched. If there are any sets in the queue, unselect them.
         if bool(playqueue_model_with_attrs):
@@ -169,6 +170,8 @@ class Playqueue(Gtk.Box):
         self.playqueue_treeselection.unselect_all()
 
     def on_playqueue_model_row_inserted(self, model, path, treeiter):
+        if self.appending_sets:
+            return
         self._display_item_duration(treeiter)
         self._display_total_duration()
         self.playqueue_durations_box.show_all()
@@ -277,10 +280,7 @@ class Playqueue(Gtk.Box):
                     for val in cargo.metadata[:len(primary_keys)])
 
             # Get thumbnail.
-            filename = Path(IMAGES, cargo.uuid, 'thumbnail-00.jpg')
-            if not filename.exists():
-                filename = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
-            thumbnail_pb = Pixbuf.new_from_file(str(filename))
+            thumbnail_pb = thumbnail_cache.get(cargo.uuid)
 
             # Although select playqueue does not need props, play metadata
             # obtains property values from playqueue_model.
@@ -346,10 +346,10 @@ class Playqueue(Gtk.Box):
             uuid = model.recording.uuid
             work_num = model.work_num
 
-            # Traverse the rows of playqueue looking for a matching set.
-            for row in playqueue_model_with_attrs:
-                if (row.uuid, row.work_num, row.play_tracks) \
-                        == (uuid, work_num, tracks):
+            # Look among the sets of the recording for a matching set.
+            for path in playqueue_index.find_paths(uuid, work_num):
+                row = playqueue_model_with_attrs[path]
+                if row.play_tracks == tracks:
                     playqueue_treeselection = self.playqueue_treeselection
                     with stop_emission(playqueue_treeselection, 'changed'):
                         playqueue_treeselection.select_iter(row.iter)
@@ -403,9 +403,8 @@ class Playqueue(Gtk.Box):
                     playqueue_play.update_image(row.path[0], thumbnail)
 
     def on_work_deleted(self, editnotebook, genre, uuid, work_num):
-        for row in reversed(playqueue_model_with_attrs):
-            if (row.uuid, row.work_num) == (uuid, work_num):
-                del playqueue_model[row.path]
+        for path in reversed(playqueue_index.find_paths(uuid, work_num)):
+            del playqueue_model[path]
 
     def on_recording_deleted(self, editnotebook, uuid):
         for row in reversed(playqueue_model_with_attrs):
@@ -419,10 +418,7 @@ class Playqueue(Gtk.Box):
         primary_vals_str = '\n'.join(', '.join(val)
                 for val in work.metadata[:len(primary_keys)])
 
-        filename = Path(IMAGES, recording.uuid, 'thumbnail-00.jpg')
-        if not filename.exists():
-            filename = Path(IMAGES_DIR, 'noimage_thumbnail.jpg')
-        thumbnail_pb = Pixbuf.new_from_file(str(filename))
+        thumbnail_pb = thumbnail_cache.get(recording.uuid)
 
         group_map = {t: GroupTuple(g_name, g_metadata)
                 for g_name, g_tracks, g_metadata in work.trackgroups
@@ -432,6 +428,36 @@ class Playqueue(Gtk.Box):
                 work_num, False, recording.props, True, list(play_tracks))
         playqueue_model.append(source_row)
 
+    # Append the rows of many sets at once. As in recordingselector, the
+    # model is disconnected from the view meanwhile, so the view does not
+    # update for each row, and the durations get displayed once at the end.
+    # The other handlers of row-inserted (the player's) still see each row.
+    def append_sets(self, rows: list[PlayqueueModelRow]):
+        if not rows:
+            return
+        view = self.playqueue_treeview
+        selection = self.playqueue_treeselection
+        model, treeiter = selection.get_selected()
+        path = None if treeiter is None else model.get_path(treeiter)
+
+        with stop_emission(selection, 'changed'):
+            view.set_model(None)
+        self.appending_sets = True
+        try:
+            for row in rows:
+                playqueue_model_with_attrs.append(row)
+        finally:
+            self.appending_sets = False
+            with stop_emission(selection, 'changed'):
+                view.set_model(playqueue_model)
+            if path is not None:
+                with stop_emission(selection, 'changed'):
+                    selection.select_path(path)
+
+        self._display_item_duration(playqueue_model[-1].iter)
+        self._display_total_duration()
+        self.playqueue_durations_box.show_all()
+
     def _display_item_duration(self, treeiter):
         row = playqueue_model_with_attrs[treeiter]
         item_duration_str = make_time_str(row.duration)
@@ -4,12 +4,15 @@ results."""
 import marshal
 import pickle
 import sys
+import time
 
 import gi
 gi.require_version('Gio', '2.0')
 gi.require_version('GLib', '2.0')
 from gi.repository import Gio, GLib
 
+from common.metrics import count, observe
+
 ENGINE = 'worker/engine.py'
 
 
@@ -40,15 +43,19 @@ class Worker:
                 stdin_buf=out_bytes,
                 cancellable=self.cancellable,
                 callback=self.on_communicate_cb,
-                user_data=reply_handler)
+                user_data=(reply_handler, time.perf_counter_ns()))
+        count('worker.tasks')
 
-    def on_communicate_cb(self, source, result, reply_handler):
+    def on_communicate_cb(self, source, result, user_data):
+        reply_handler, start_ns = user_data
         try:
             success, out_buf, err_buf = source.communicate_finish(result)
         except GLib.Error as e:
             if e.code == Gio.IOErrorEnum.CANCELLED:
                 return
 
+        observe('worker.round_trip', (time.perf_counter_ns() - start_ns) / 1e6)
+
         out_bytes = out_buf.get_data()
         try:
             result = pickle.loads(out_bytes)